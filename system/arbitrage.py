@@ -0,0 +1,183 @@
+import heapq
+from datetime import datetime, timezone
+
+from odds_store import parse_time
+
+
+class ArbitrageScanner:
+    """
+    Streaming cross-bookmaker arbitrage detector.
+
+    For every (event, market, outcome) it keeps a max-heap of bookmaker
+    prices. A new quote is an O(log n) push; superseded quotes are discarded
+    lazily when they surface at the top of the heap. After each update the
+    event's book is re-checked from the heap tops: when the sum of inverse
+    best prices across all outcomes falls below 1, backing every outcome at
+    its best price locks in a profit, and an opportunity is emitted.
+
+    process_payload() treats each event in a payload as that event's full
+    book: bookmakers, outcomes and markets missing from it are dropped, and
+    events that are no longer listed or have started are evicted, so memory
+    stays bounded by the events currently on offer.
+    """
+    def __init__(self, min_margin=0.0, on_opportunity=None):
+        self.min_margin = min_margin          # required 1 - sum(1/price) before emitting
+        self.on_opportunity = on_opportunity  # optional callback(opportunity)
+        self.quotes = {}     # (event, market, outcome) -> {bookmaker: price}
+        self.heaps = {}      # (event, market, outcome) -> [(-price, bookmaker), ...]
+        self.outcomes = {}   # (event, market) -> set of outcome names
+        self.markets = {}    # event_id -> set of markets
+        self.names = {}      # event_id -> display name
+        self.emitted = {}    # (event, market) -> legs of the last emitted opportunity
+
+    def update(self, event_id, market, bookmaker, outcome, price, check=True):
+        """
+        Apply one quote and return the opportunity it creates, if any.
+        Pass check=False to apply several quotes before checking the event.
+        """
+        key = (event_id, market, outcome)
+        book = self.quotes.setdefault(key, {})
+        if book.get(bookmaker) == price:
+            return None
+        if price is None or price <= 1.0:
+            book.pop(bookmaker, None)  # withdrawn or invalid price
+        else:
+            book[bookmaker] = price
+            heap = self.heaps.setdefault(key, [])
+            heapq.heappush(heap, (-price, bookmaker))
+            if len(heap) > 2 * len(book) + 8:
+                # Too many superseded entries buried in the heap; rebuild it.
+                heap[:] = [(-p, b) for b, p in book.items()]
+                heapq.heapify(heap)
+        self.outcomes.setdefault((event_id, market), set()).add(outcome)
+        self.markets.setdefault(event_id, set()).add(market)
+        return self._check(event_id, market) if check else None
+
+    def best(self, event_id, market, outcome):
+        """Best (price, bookmaker) currently offered for an outcome, or None."""
+        key = (event_id, market, outcome)
+        heap = self.heaps.get(key)
+        book = self.quotes.get(key, {})
+        while heap:
+            neg_price, bookmaker = heap[0]
+            if book.get(bookmaker) == -neg_price:
+                return -neg_price, bookmaker
+            heapq.heappop(heap)  # stale: that bookmaker has since moved or withdrawn
+        return None
+
+    def _drop_market(self, event_id, market):
+        for outcome in self.outcomes.pop((event_id, market), ()):
+            self.quotes.pop((event_id, market, outcome), None)
+            self.heaps.pop((event_id, market, outcome), None)
+        self.emitted.pop((event_id, market), None)
+
+    def evict(self, event_id):
+        """Forget everything about an event."""
+        for market in self.markets.pop(event_id, ()):
+            self._drop_market(event_id, market)
+        self.names.pop(event_id, None)
+
+    def _replace_book(self, event_id, snapshot):
+        # snapshot: {market: {outcome: {bookmaker: price}}}, the event's full
+        # book. Withdraw every quote it no longer carries, then apply it.
+        for market in list(self.markets.get(event_id, ())):
+            if market not in snapshot:
+                self._drop_market(event_id, market)
+                self.markets[event_id].discard(market)
+                continue
+            for outcome in list(self.outcomes.get((event_id, market), ())):
+                prices = snapshot[market].get(outcome)
+                if prices is None:
+                    self.quotes.pop((event_id, market, outcome), None)
+                    self.heaps.pop((event_id, market, outcome), None)
+                    self.outcomes[(event_id, market)].discard(outcome)
+                    continue
+                for bookmaker in list(self.quotes.get((event_id, market, outcome), ())):
+                    if bookmaker not in prices:
+                        self.update(event_id, market, bookmaker, outcome, None, check=False)
+        for market, outcomes in snapshot.items():
+            for outcome, prices in outcomes.items():
+                for bookmaker, price in prices.items():
+                    self.update(event_id, market, bookmaker, outcome, price, check=False)
+
+    def _check(self, event_id, market):
+        outcomes = self.outcomes[(event_id, market)]
+        if len(outcomes) < 2:
+            return None
+        legs = []
+        for outcome in sorted(outcomes):
+            best = self.best(event_id, market, outcome)
+            if best is None:
+                return None
+            legs.append((outcome, best[1], best[0]))
+
+        inverse_sum = sum(1.0 / price for _, _, price in legs)
+        if inverse_sum >= 1.0 - self.min_margin:
+            self.emitted.pop((event_id, market), None)
+            return None
+        if self.emitted.get((event_id, market)) == legs:
+            return None  # same opportunity as last time
+        self.emitted[(event_id, market)] = legs
+
+        opportunity = {
+            "event_id": event_id,
+            "event_name": self.names.get(event_id),
+            "market": market,
+            "margin": 1.0 - inverse_sum,
+            "return_pct": 1.0 / inverse_sum - 1.0,
+            # Stake split for a unit bankroll: equal payout whichever outcome wins.
+            "legs": [
+                {"outcome": outcome, "bookmaker": bookmaker, "price": price,
+                 "stake_fraction": (1.0 / price) / inverse_sum}
+                for outcome, bookmaker, price in legs
+            ],
+        }
+        if self.on_opportunity:
+            self.on_opportunity(opportunity)
+        return opportunity
+
+    def process_payload(self, odds_data, now=None):
+        """
+        Feed a whole fetch_odds payload through the index and return every
+        opportunity it produced. Unlike the odds table, all outcomes are kept
+        by name, so three-way markets work too. The payload is taken as the
+        complete list of events on offer (fetch_odds returns every event of
+        the sport); events missing from it, or started by `now`, are evicted.
+        """
+        now = now or datetime.now(timezone.utc)
+        opportunities = []
+        listed = set()
+        for event in odds_data:
+            event_id = event.get("id")
+            start = parse_time(event.get("commence_time"))
+            if start is not None and start <= now:
+                continue
+            listed.add(event_id)
+            teams = event.get("teams") or [event.get("home_team"), event.get("away_team")]
+            if all(teams):
+                self.names[event_id] = " vs ".join(teams)
+            # Apply the whole event before checking it, so a half-applied
+            # snapshot never produces a phantom opportunity.
+            snapshot = {}
+            for bookmaker in event.get("bookmakers", []):
+                bookmaker_name = bookmaker.get("title") or bookmaker.get("key")
+                for market in bookmaker.get("markets", []):
+                    outcomes = snapshot.setdefault(market.get("key"), {})
+                    for outcome in market.get("outcomes", []):
+                        outcomes.setdefault(outcome.get("name"), {})[bookmaker_name] = outcome.get("price")
+            self._replace_book(event_id, snapshot)
+            for market_type in snapshot:
+                opportunity = self._check(event_id, market_type)
+                if opportunity:
+                    opportunities.append(opportunity)
+        for event_id in (set(self.markets) | set(self.names)) - listed:
+            self.evict(event_id)
+        return opportunities
+
+    @staticmethod
+    def stakes(opportunity, bankroll):
+        """Concrete stakes per leg and the guaranteed payout for `bankroll`."""
+        legs = [(leg["bookmaker"], leg["outcome"], bankroll * leg["stake_fraction"])
+                for leg in opportunity["legs"]]
+        payout = bankroll * (1.0 + opportunity["return_pct"])
+        return legs, payout
@@ -0,0 +1,325 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import SETTLED_STATUSES
+from odds_retention import rollup_watermark
+from portfolio import KellyOptimizer
+from resolution import EntityResolver
+
+
+class MarketHistory:
+    """
+    Quote history as parallel NumPy arrays, one element per stored odds row.
+
+    event      int32   event code (index into `event_ids` / `event_names`)
+    bookmaker  int32   bookmaker code (index into `bookmakers`)
+    captured   int64   capture time, epoch seconds (falls back to commence time)
+    commence   int64   event start time, epoch seconds
+    price1/2   float64 decimal odds for the first/second named player
+    winner     int8    per *event*: 1 or 2 for the winning side, 0 if unsettled
+    """
+    ARRAYS = ("event", "bookmaker", "captured", "commence", "price1", "price2",
+              "winner", "event_ids", "event_names", "bookmakers")
+
+    def __init__(self, event, bookmaker, captured, commence, price1, price2,
+                 winner, event_ids, event_names, bookmakers):
+        self.event = event
+        self.bookmaker = bookmaker
+        self.captured = captured
+        self.commence = commence
+        self.price1 = price1
+        self.price2 = price2
+        self.winner = winner
+        self.event_ids = event_ids
+        self.event_names = event_names
+        self.bookmakers = bookmakers
+
+    def __len__(self):
+        return len(self.event)
+
+    def save(self, directory):
+        """
+        Write every array as a .npy file so other processes can open the
+        history with open_mmap() instead of receiving a pickled copy.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            values = getattr(self, name)
+            if values.dtype == object:
+                values = values.astype(str)  # fixed-width unicode can be memory-mapped
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+
+    @classmethod
+    def open_mmap(cls, directory):
+        """Open a history written by save() as read-only memory-mapped arrays."""
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS))
+
+    @classmethod
+    def from_frame(cls, quotes, winners=None, event_winners=None):
+        """
+        Build a history from a DataFrame with columns event_id, event_name,
+        bookmaker, captured_at, commence_time, odds_player1, odds_player2.
+        `event_winners` maps event_id -> 1/2 for settled events; events not
+        in it fall back to `winners`, which maps event_name -> 1/2.
+        """
+        quotes = quotes.dropna(subset=["odds_player1", "odds_player2"])
+        event, event_ids = pd.factorize(quotes["event_id"])
+        bookmaker, bookmakers = pd.factorize(quotes["bookmaker"])
+        commence = _epoch_seconds(quotes["commence_time"])
+        captured = _epoch_seconds(quotes["captured_at"])
+        captured = np.where(captured == _MISSING, commence, captured)
+
+        # One name per event code, taken from its first quote.
+        first_row = np.unique(event, return_index=True)[1]
+        event_names = quotes["event_name"].to_numpy()[first_row]
+        winners, event_winners = winners or {}, event_winners or {}
+        winner = np.array([event_winners.get(event_id, winners.get(name, 0))
+                           for event_id, name in zip(event_ids, event_names)], dtype=np.int8)
+
+        return cls(event.astype(np.int32), bookmaker.astype(np.int32), captured, commence,
+                   quotes["odds_player1"].to_numpy(dtype=np.float64),
+                   quotes["odds_player2"].to_numpy(dtype=np.float64),
+                   winner, np.asarray(event_ids), event_names, np.asarray(bookmakers))
+
+
+_MISSING = np.iinfo(np.int64).min
+
+
+def _epoch_seconds(values):
+    parsed = pd.to_datetime(values, utc=True, errors="coerce", format="ISO8601")
+    seconds = parsed.to_numpy(dtype="datetime64[s]").astype(np.int64)
+    return np.where(parsed.isna().to_numpy(), _MISSING, seconds)
+
+
+def load_history(db, granularity=None, resolve=False):
+    """
+    Load the stored odds and settle each event against the sportdevs results
+    in the matches table. Events are settled through their event_matches
+    mapping (see resolution.py; the scheduler resolves events as it ingests
+    them), so name variants between the two APIs do not matter; events
+    without one fall back to matching their "A vs B" name, in either order.
+    Reads go through the read-only connection of `db` (a database.Database),
+    so a backtest never blocks ingest. `resolve=True` first resolves events
+    not mapped yet, which writes to event_matches.
+
+    With `granularity` (seconds, one of odds_retention's bar sizes) the
+    compacted part of history is read from odds_bars, one quote per bar at
+    its close, and only the quotes not yet rolled up from odds. Bar closes
+    carry their exact capture time, so closing prices are unchanged.
+    """
+    if resolve:
+        EntityResolver(db).resolve_stored()
+    conn = db.read_only()
+    query = '''
+        SELECT event_id, event_name, bookmaker, captured_at, timestamp AS commence_time,
+               odds_player1, odds_player2
+        FROM odds
+        WHERE market = 'h2h'
+    '''
+    params = ()
+    if granularity is not None:
+        query += '''
+          AND odds_id > ?
+        UNION ALL
+        SELECT event_id, event_name, bookmaker, close_captured_at, commence_time, close1, close2
+        FROM odds_bars
+        WHERE granularity = ? AND market = 'h2h'
+        '''
+        params = (rollup_watermark(conn), granularity)
+    quotes = pd.read_sql_query(query, conn, params=params)
+
+    winners = {}
+    placeholders = ", ".join("?" for _ in SETTLED_STATUSES)
+    rows = conn.execute(f'''
+        SELECT home_team_name, away_team_name, home_team_score_current, away_team_score_current
+        FROM matches
+        WHERE status_type IN ({placeholders})
+          AND home_team_score_current IS NOT NULL AND away_team_score_current IS NOT NULL
+    ''', SETTLED_STATUSES).fetchall()
+    for home, away, home_score, away_score in rows:
+        if home_score == away_score:
+            continue
+        home_won = home_score > away_score
+        winners[f"{home} vs {away}"] = 1 if home_won else 2
+        winners[f"{away} vs {home}"] = 2 if home_won else 1
+
+    event_winners = {
+        event_id: 1 if (home_score > away_score) == bool(player1_is_home) else 2
+        for event_id, player1_is_home, home_score, away_score in conn.execute(f'''
+            SELECT e.event_id, e.player1_is_home, m.home_team_score_current, m.away_team_score_current
+            FROM event_matches e JOIN matches m ON m.id = e.match_id
+            WHERE m.status_type IN ({placeholders})
+              AND m.home_team_score_current IS NOT NULL AND m.away_team_score_current IS NOT NULL
+              AND m.home_team_score_current != m.away_team_score_current
+        ''', SETTLED_STATUSES)
+    }
+    return MarketHistory.from_frame(quotes, winners, event_winners)
+
+
+def closing_prices(history):
+    """
+    Best price per event and side from each bookmaker's last quote captured
+    before the event started. Returns (events, price1, price2, book1, book2,
+    commence) where events are event codes sorted by start time.
+    """
+    pre_start = history.captured <= history.commence
+    idx = np.flatnonzero(pre_start)
+
+    # Last quote per (event, bookmaker): sort by event, bookmaker, time and
+    # keep the final row of every (event, bookmaker) run.
+    order = idx[np.lexsort((history.captured[idx], history.bookmaker[idx], history.event[idx]))]
+    ev, bk = history.event[order], history.bookmaker[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (ev[1:] != ev[:-1]) | (bk[1:] != bk[:-1])
+    order = order[last]
+    ev = history.event[order]
+
+    # Best price per event across its bookmakers.
+    starts = np.flatnonzero(np.r_[True, ev[1:] != ev[:-1]]) if len(ev) else np.array([], dtype=np.int64)
+    events = ev[starts]
+    p1, p2 = history.price1[order], history.price2[order]
+    price1 = np.maximum.reduceat(p1, starts) if len(starts) else np.array([])
+    price2 = np.maximum.reduceat(p2, starts) if len(starts) else np.array([])
+    # Which bookmaker offered each best price.
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(ev)]))
+    book1 = _argmax_book(p1, group, len(starts), history.bookmaker[order])
+    book2 = _argmax_book(p2, group, len(starts), history.bookmaker[order])
+    commence = history.commence[order][starts] if len(starts) else np.array([], dtype=np.int64)
+
+    by_time = np.argsort(commence, kind="stable")
+    return (events[by_time], price1[by_time], price2[by_time],
+            book1[by_time], book2[by_time], commence[by_time])
+
+
+def _argmax_book(prices, group, n_groups, books):
+    order = np.lexsort((-prices, group))
+    first = np.r_[True, group[order][1:] != group[order][:-1]] if len(order) else np.array([], dtype=bool)
+    result = np.full(n_groups, -1, dtype=np.int64)
+    result[group[order][first]] = books[order][first]
+    return result
+
+
+class BacktestEngine:
+    """
+    Vectorized replay of a strategy over stored market history.
+
+    For every event the strategy sees the closing snapshot (best pre-start
+    price per side) and returns which side to back and its win probability.
+    Bets are settled against the recorded winner in start-time order, and
+    the bankroll evolves without a Python-level loop:
+
+      flat        stake = stake_fraction * initial bankroll
+      fractional  stake = stake_fraction * current bankroll
+      kelly       stake = kelly_multiplier * Kelly fraction * current bankroll,
+                  capped at max_fraction
+      simultaneous  bets starting in the same `window` (seconds, default a
+                  day) are sized together by portfolio.KellyOptimizer on
+                  the bankroll at the start of the window, so their stakes
+                  sum to at most max_exposure
+    """
+    def __init__(self, initial_bankroll=1000.0, staking="fractional", stake_fraction=0.02,
+                 kelly_multiplier=0.5, max_fraction=0.05, min_edge=0.0, signal_options=None,
+                 max_exposure=0.25, window=86400, optimizer=None):
+        self.initial_bankroll = float(initial_bankroll)
+        self.staking = staking
+        self.stake_fraction = stake_fraction
+        self.kelly_multiplier = kelly_multiplier
+        self.max_fraction = max_fraction
+        self.min_edge = min_edge
+        self.signal_options = signal_options or {}  # extra keyword arguments for strategy.signals
+        self.window = window
+        self.optimizer = optimizer or KellyOptimizer(fraction=kelly_multiplier, max_fraction=max_fraction,
+                                                     max_exposure=max_exposure)
+
+    def run(self, history, strategy):
+        """
+        Replay `strategy` over `history`. The strategy must implement
+        signals(snapshot, **signal_options) -> (side, probability), both arrays aligned with the
+        snapshot's events; side is 1 or 2 to back that player, 0 to pass.
+        """
+        events, price1, price2, book1, book2, commence = closing_prices(history)
+        snapshot = {
+            "event": events, "price1": price1, "price2": price2, "commence": commence,
+            "event_id": history.event_ids[events] if len(events) else np.array([]),
+        }
+        side, prob = strategy.signals(snapshot, **self.signal_options)
+        side = np.asarray(side, dtype=np.int8)
+        prob = np.asarray(prob, dtype=np.float64)
+
+        price = np.where(side == 1, price1, price2)
+        winner = history.winner[events]
+        edge = prob * price - 1.0
+        placed = (side > 0) & (winner > 0) & (edge > self.min_edge)
+
+        # Per-bet return on a unit stake.
+        won = placed & (winner == side)
+        unit_return = np.where(won, price - 1.0, -1.0)[placed]
+        fraction = self._fractions(prob[placed], price[placed])
+
+        if self.staking == "flat":
+            stakes = np.full(len(unit_return), self.stake_fraction * self.initial_bankroll)
+            pnl = stakes * unit_return
+            equity = self.initial_bankroll + np.cumsum(pnl)
+        elif self.staking == "simultaneous":
+            # Bets are in start-time order, so each window is a contiguous run;
+            # every bet in it is staked from the bankroll the window opened with.
+            window = commence[placed] // self.window
+            starts = np.flatnonzero(np.r_[True, window[1:] != window[:-1]][:len(window)])
+            bounds = np.r_[starts, len(window)]
+            fraction = np.zeros(len(window))
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                fraction[start:stop] = self.optimizer.solve(prob[placed][start:stop], price[placed][start:stop])
+            growth = 1.0 + np.add.reduceat(fraction * unit_return, starts) if len(starts) else np.array([])
+            opening = self.initial_bankroll * np.r_[1.0, np.cumprod(growth)][:len(starts)]
+            stakes = fraction * np.repeat(opening, np.diff(bounds))
+            pnl = stakes * unit_return
+            equity = self.initial_bankroll + np.cumsum(pnl)
+        else:
+            growth = np.cumprod(1.0 + fraction * unit_return)
+            equity = self.initial_bankroll * growth
+            before = np.r_[self.initial_bankroll, equity[:-1]]
+            stakes = fraction * before
+            pnl = equity - before
+
+        bet_events = events[placed]
+        return {
+            "event_id": history.event_ids[bet_events] if len(bet_events) else np.array([]),
+            "side": side[placed],
+            "price": price[placed],
+            "bookmaker": np.where(side[placed] == 1, book1[placed], book2[placed]),
+            "probability": prob[placed],
+            "stake": stakes,
+            "pnl": pnl,
+            "equity": equity,
+            "commence": commence[placed],
+            "summary": self._summary(stakes, pnl, equity, won[placed], len(events)),
+        }
+
+    def _fractions(self, prob, price):
+        if self.staking == "kelly":
+            kelly = (prob * price - 1.0) / (price - 1.0)
+            return np.clip(kelly * self.kelly_multiplier, 0.0, self.max_fraction)
+        return np.full(len(prob), self.stake_fraction)
+
+    def _summary(self, stakes, pnl, equity, won, n_events):
+        n_bets = len(pnl)
+        total_staked = float(stakes.sum())
+        curve = np.r_[self.initial_bankroll, equity]
+        peaks = np.maximum.accumulate(curve)
+        drawdown = float(((peaks - curve) / peaks).max()) if n_bets else 0.0
+        returns = pnl / np.where(stakes > 0, stakes, 1.0)
+        return {
+            "events": int(n_events),
+            "total_trades": int(n_bets),
+            "profitable_trades": int(won.sum()),
+            "unprofitable_trades": int(n_bets - won.sum()),
+            "hit_rate": float(won.mean()) if n_bets else 0.0,
+            "total_staked": total_staked,
+            "total_profit": float(pnl.sum()),
+            "roi": float(pnl.sum() / total_staked) if total_staked else 0.0,
+            "final_bankroll": float(curve[-1]),
+            "max_drawdown": drawdown,
+            "sharpe_per_bet": float(returns.mean() / returns.std()) if n_bets > 1 and returns.std() > 0 else 0.0,
+        }
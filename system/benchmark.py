@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+
+import synthetic
+from backtest import load_history
+from bulk_writer import BulkWriter
+from data_fetcher import MATCHES_INSERT_QUERY, TennisFetcher
+from data_pipeline import insert_tennis_odds
+from database import Database
+from features import PlayerFeatureStore
+from mock_api import MockApi
+from odds_store import utc_now
+from ratings import EloRatings
+from schema import MATCH_NORMALIZER, iter_json_array
+from script import season_label, store_data_in_sqlite
+from trading_system import TradingSystem
+from walk_forward import WalkForward
+
+# -------------------------------------------------------------------
+# Benchmark suite. Each benchmark has a setup step (not timed) and a run
+# step (timed) that returns how many items it processed. Sizes scale with
+# --scale; data comes from synthetic.py, so runs are reproducible and need
+# no API credentials. Results are written as JSON and can be compared with
+# a baseline file to catch regressions.
+# -------------------------------------------------------------------
+
+
+class FavouriteStrategy:
+    """Backs the market favourite; a cheap stand-in so backtests measure the engine."""
+    capital = 1000.0
+
+    def signals(self, snapshot, edge=0.03):
+        implied1, implied2 = 1.0 / snapshot["price1"], 1.0 / snapshot["price2"]
+        fair1 = implied1 / (implied1 + implied2)
+        side = np.where(fair1 >= 0.5, 1, 2)
+        return side, np.where(side == 1, fair1, 1.0 - fair1) + edge
+
+
+def _fresh_db(workdir, name):
+    path = os.path.join(workdir, name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = Database(path)
+    db.migrate()
+    return db
+
+
+def _loaded_db(workdir, name, matches, odds=None, captured_at=None):
+    db = _fresh_db(workdir, name)
+    with BulkWriter(db, batch_size=5000, label="setup") as writer:
+        writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(matches))
+    if odds:
+        insert_tennis_odds(odds, db=db, batch_size=5000, captured_at=captured_at)
+    return db
+
+
+# Each benchmark: name -> (setup(scale, workdir) -> state, run(state) -> items processed, unit)
+def _setup_matches(scale, workdir):
+    return synthetic.match_payloads(int(50000 * scale))
+
+
+def _run_flatten(matches):
+    deque(MATCH_NORMALIZER.rows(matches), maxlen=0)
+    return len(matches)
+
+
+def _setup_stream(scale, workdir):
+    raw = json.dumps(synthetic.match_payloads(int(20000 * scale))).encode()
+    return [raw[i:i + 65536] for i in range(0, len(raw), 65536)]
+
+
+def _run_stream(chunks):
+    return sum(1 for _ in iter_json_array(chunks))
+
+
+def _setup_ingest_matches(scale, workdir):
+    return _fresh_db(workdir, "ingest_matches.db"), synthetic.match_payloads(int(50000 * scale))
+
+
+def _run_ingest_matches(state):
+    db, matches = state
+    with BulkWriter(db, batch_size=1000, label="bench") as writer:
+        return writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(matches))
+
+
+def _setup_ingest_odds(scale, workdir):
+    matches = synthetic.match_payloads(int(10000 * scale))
+    return _fresh_db(workdir, "ingest_odds.db"), synthetic.odds_payloads(matches)
+
+
+def _run_ingest_odds(state):
+    db, odds = state
+    insert_tennis_odds(odds, db=db)
+    return sum(len(event["bookmakers"]) for event in odds)
+
+
+def _setup_fetch(scale, workdir):
+    matches = synthetic.match_payloads(int(10000 * scale))
+    api = MockApi(matches=matches, throttle_every=10).start()
+    fetcher = TennisFetcher("benchmark", rate_limit=None, cache=False, db=_fresh_db(workdir, "fetch.db"))
+    fetcher.base_url = api.url + "/"
+    fetcher.client.backoff = 0.0
+    return api, fetcher
+
+
+def _run_fetch(state):
+    api, fetcher = state
+    try:
+        return fetcher.get_all_matches(page_size=100, max_in_flight=4)
+    finally:
+        api.stop()
+        fetcher.client.close()
+
+
+def _setup_nba(scale, workdir):
+    seasons = max(1, int(10 * scale))
+    return _fresh_db(workdir, "nba.db"), [(season_label(2010 + i), synthetic.nba_frame(seed=i)) for i in range(seasons)]
+
+
+def _run_nba(state):
+    db, seasons = state
+    for season, frame in seasons:
+        store_data_in_sqlite(frame, season=season, db=db)
+    return sum(len(frame) for _, frame in seasons)
+
+
+def _setup_features(scale, workdir):
+    return _loaded_db(workdir, "features.db", synthetic.match_payloads(int(50000 * scale)))
+
+
+def _run_features(db):
+    return PlayerFeatureStore(db).update()
+
+
+def _run_ratings(db):
+    return EloRatings().replay(db)
+
+
+def _setup_train(scale, workdir):
+    return synthetic.feature_frame(int(5000 * scale))
+
+
+def _run_train(state):
+    X, y = state
+    WalkForward(initial_size=len(y) // 2, step=max(1, len(y) // 20)).run(X, y)
+    return len(y)
+
+
+def _setup_backtest(scale, workdir):
+    matches = synthetic.match_payloads(int(20000 * scale))
+    # Quotes are stamped before the first synthetic start time, so every one
+    # is a pre-start quote and survives closing_prices().
+    captured_at = (synthetic.EPOCH - timedelta(days=1)).isoformat(timespec="seconds")
+    db = _loaded_db(workdir, "backtest.db", matches, synthetic.odds_payloads(matches), captured_at)
+    return load_history(db)
+
+
+def _run_backtest(history):
+    (_, result), = TradingSystem([(1.0, FavouriteStrategy())]).backtest(history=history, capital=1000.0)
+    if not result["summary"]["events"]:
+        raise RuntimeError("backtest benchmark replayed no events; its throughput would be meaningless")
+    return len(history)
+
+
+BENCHMARKS = {
+    "flatten_matches": (_setup_matches, _run_flatten, "matches"),
+    "stream_json": (_setup_stream, _run_stream, "matches"),
+    "ingest_matches": (_setup_ingest_matches, _run_ingest_matches, "rows"),
+    "ingest_odds": (_setup_ingest_odds, _run_ingest_odds, "quotes"),
+    "fetch_matches": (_setup_fetch, _run_fetch, "matches"),
+    "ingest_nba": (_setup_nba, _run_nba, "rows"),
+    "player_features": (_setup_features, _run_features, "matches"),
+    "elo_ratings": (_setup_features, _run_ratings, "matches"),
+    "walk_forward_train": (_setup_train, _run_train, "rows"),
+    "backtest": (_setup_backtest, _run_backtest, "quotes"),
+}
+
+
+def run_benchmarks(names=None, scale=1.0, repeat=3):
+    """Run the selected benchmarks; each result keeps the fastest of `repeat` runs."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as workdir:
+        for name in names or BENCHMARKS:
+            setup, run, unit = BENCHMARKS[name]
+            timings = []
+            for _ in range(repeat):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    state = setup(scale, workdir)
+                    started = time.perf_counter()
+                    items = run(state)
+                    timings.append(time.perf_counter() - started)
+            best = min(timings)
+            results[name] = {"seconds": best, "items": items, "unit": unit,
+                             "per_second": items / best if best > 0 else None, "runs": timings}
+            print(f"{name:20s} {best:8.3f}s  {results[name]['per_second']:>14,.0f} {unit}/s")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance=0.10):
+    """
+    Print throughput against a baseline and return the names of benchmarks
+    that got more than `tolerance` slower.
+    """
+    regressions = []
+    print(f"\n{'benchmark':20s} {'baseline':>14s} {'current':>14s} {'change':>8s}")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("per_second") or not result["per_second"]:
+            continue
+        ratio = result["per_second"] / before["per_second"]
+        flag = ""
+        if ratio < 1.0 - tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:20s} {before['per_second']:>14,.0f} {result['per_second']:>14,.0f} "
+              f"{ratio - 1.0:>+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the SportsAnalysis benchmark suite.")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every dataset size")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the fastest is kept")
+    parser.add_argument("--only", help="comma-separated benchmark names")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput drop")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else None
+    unknown = set(names or ()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(names, scale=args.scale, repeat=args.repeat)
+    report = {
+        "meta": {"timestamp": utc_now(), "commit": _git_commit(), "scale": args.scale, "repeat": args.repeat,
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count()},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print("Warning: baseline was recorded at a different --scale.")
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
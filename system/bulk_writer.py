@@ -0,0 +1,101 @@
+import time
+from itertools import islice
+from database import Database
+from metrics import METRICS
+
+# Pragmas applied for ingest runs. WAL lets readers keep working while we
+# write, and synchronous=NORMAL only fsyncs at checkpoints instead of on
+# every commit, which is safe in WAL mode.
+INGEST_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,  # negative means KiB, so ~64 MB
+}
+
+
+class BulkWriter:
+    """
+    Shared bulk-write layer for the ingest paths.
+
+    Rows are pulled from any iterable (usually a generator), grouped into
+    batches of `batch_size`, and each batch is written with a single
+    executemany inside a single transaction on the calling thread's shared
+    Database connection. Use as a context manager so the throughput summary
+    is printed at the end:
+
+        with BulkWriter(db, label="odds") as writer:
+            writer.write(INSERT_QUERY, rows)
+
+    `db` may also be a file name, in which case the writer opens (and later
+    closes) its own Database.
+    """
+    def __init__(self, db, batch_size=1000, pragmas=None, label="ingest"):
+        self.owns_db = not isinstance(db, Database)
+        self.db = Database(db) if self.owns_db else db
+        self.db_name = self.db.db_name
+        self.batch_size = batch_size
+        self.label = label
+        self.rows_written = 0
+        self.rows_changed = 0  # rows actually inserted/updated, as counted by SQLite
+        self.started = time.perf_counter()
+
+        # Database connections run in autocommit mode, so transactions are ours to manage.
+        self.conn = self.db.connection()
+        for name, value in (INGEST_PRAGMAS if pragmas is None else pragmas).items():
+            self.conn.execute(f"PRAGMA {name}={value}")
+
+    def execute(self, query, params=()):
+        """Run a single statement (DDL, cleanup) outside of a batch."""
+        return self.conn.execute(query, params)
+
+    def write(self, query, rows):
+        """
+        Write every row from `rows` using `query`, one transaction per batch.
+        Returns the number of rows written by this call.
+        """
+        rows = iter(rows)
+        written = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with METRICS.timer("sqlite_batch_seconds", label=self.label):
+                self.conn.execute("BEGIN")
+                try:
+                    cursor = self.conn.executemany(query, batch)
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                self.conn.execute("COMMIT")
+            written += len(batch)
+            # rowcount excludes trigger side effects and upserts that matched no change.
+            changed = max(cursor.rowcount, 0)
+            self.rows_changed += changed
+            METRICS.inc("rows_written_total", len(batch), label=self.label)
+            METRICS.inc("rows_changed_total", changed, label=self.label)
+        self.rows_written += written
+        return written
+
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows_written / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        print(f"[{self.label}] wrote {self.rows_written} rows to '{self.db_name}' "
+              f"in {elapsed:.2f}s ({self.rows_per_second():,.0f} rows/sec, {self.rows_changed} changed)")
+
+    def close(self):
+        # The connection belongs to the Database and is reused by later writers.
+        if self.owns_db:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.report()
+        self.close()
+        return False
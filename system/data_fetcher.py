@@ -1,10 +1,15 @@
-import pandas as pd
-import requests
 import json
-import sqlite3
 from dotenv import load_dotenv
 import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timezone
+from http_client import HttpClient
+from http_cache import ResponseCache
+from bulk_writer import BulkWriter
+from database import Database
+from features import SETTLED_STATUSES
+from metrics import timed
+from schema import MATCH_NORMALIZER, MATCH_SCHEMA, column_names, iter_json_array
 
 load_dotenv()
 
@@ -14,15 +19,52 @@ API_KEY = os.getenv("SPORTS_DEVS_API")
 # Step 0: Configuration and API headers.
 # -------------------------------------------------------------------
 
+# Column order of the matches table, generated from schema.MATCH_SCHEMA.
+MATCH_COLUMNS = column_names(MATCH_SCHEMA)
+
+# Upsert rather than INSERT OR REPLACE: a replace is a delete plus an insert,
+# while this only touches a row when its content hash has changed.
+MATCHES_INSERT_QUERY = f"""
+INSERT INTO matches ({", ".join(MATCH_COLUMNS)})
+VALUES ({", ".join("?" for _ in MATCH_COLUMNS)})
+ON CONFLICT(id) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in MATCH_COLUMNS[1:])}
+WHERE matches.content_hash IS NOT excluded.content_hash;
+"""
+
+# Match statuses that will not change any more: the settled ones, plus
+# matches that ended without a result.
+FINAL_STATUSES = SETTLED_STATUSES + ("canceled", "cancelled", "abandoned")
+
+# Upsert that leaves win_rate/court_win_rate/weather_win_rate alone: those
+# are maintained by features.PlayerFeatureStore, not the players endpoint.
+PLAYER_STATS_INSERT_QUERY = """
+INSERT INTO player_stats (
+    player_id, team_id, team_name, player_name, country_name, player_height, age
+) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(player_id) DO UPDATE SET
+    team_id = excluded.team_id, team_name = excluded.team_name, player_name = excluded.player_name,
+    country_name = excluded.country_name, player_height = excluded.player_height, age = excluded.age
+"""
+
 class TennisFetcher:
-    def __init__(self, API_KEY):
+    def __init__(self, API_KEY, rate_limit=5, pool_size=8, cache=None, db=None):
         self.base_url = "https://tennis.sportdevs.com/"
         self.headers = {
             'Accept': 'application/json',
             'Authorization': f'Bearer {API_KEY}'
         }
+        # One keep-alive session for every request this fetcher makes,
+        # throttled to `rate_limit` requests/second across all threads.
+        # Responses go through the on-disk cache unless cache=False is passed.
+        if cache is None:
+            cache = ResponseCache()
+        self.client = HttpClient(headers=self.headers, pool_size=pool_size, rate_limit=rate_limit,
+                                 cache=cache or None)
+        # Everything is written to the shared storage layer.
+        self.db = db if db is not None else Database()
 
-    def get_matches(self):
+    @timed("fetch_matches")
+    def get_matches(self, batch_size=1000, bus=None):
         matches_url = self.base_url + "matches/"
 
         # We set limit to 10 so that we only fetch ten matches.
@@ -32,202 +74,217 @@ class TennisFetcher:
         }
 
         print("Fetching matches...")
-        response = requests.get(matches_url, headers=self.headers, params=params_matches)
+        response = self.client.get(matches_url, params=params_matches)
         if response.status_code != 200:
-            print(f"Error fetching matches list: {response.status_code} - {response.text}")
-            exit(1)
+            raise RuntimeError(f"Error fetching matches list: {response.status_code} - {response.text}")
 
         matches_data = response.json()
         if not matches_data:
-            print("No matches data returned!")
-            exit(1)
+            raise RuntimeError("No matches data returned!")
 
         print("Fetched Matches List:")
         print(json.dumps(matches_data, indent=2))
 
         # -------------------------------------------------------------------
-        # Step 2: Create an SQLite database and a table for the match data.
+        # Step 2: Insert the matches into the SQLite table in batches, or hand
+        # them to the event bus, whose SqliteSink subscriber stores them.
         # -------------------------------------------------------------------
-        # This example uses a database file named "matches.db".
-        conn = sqlite3.connect("matches.db")
-        cursor = conn.cursor()
-
-        # Create a table named "matches". The table structure below is based on the sample JSON.
-        # Adjust or remove columns as needed.
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS matches (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            first_to_serve INTEGER,
-            ground_type TEXT,
-            tournament_id INTEGER,
-            tournament_name TEXT,
-            tournament_importance INTEGER,
-            season_id INTEGER,
-            season_name TEXT,
-            round_id INTEGER,
-            round_name TEXT,
-            round_round INTEGER,
-            round_end_time TEXT,
-            round_start_time TEXT,
-            status_type TEXT,
-            status_reason TEXT,
-            arena_id INTEGER,
-            arena_name TEXT,
-            arena_hash_image TEXT,
-            home_team_id INTEGER,
-            home_team_name TEXT,
-            home_team_hash_image TEXT,
-            away_team_id INTEGER,
-            away_team_name TEXT,
-            away_team_hash_image TEXT,
-            home_team_score_current INTEGER,
-            home_team_score_display INTEGER,
-            home_team_score_period_1 INTEGER,
-            home_team_score_period_2 INTEGER,
-            home_team_score_default_time INTEGER,
-            away_team_score_current INTEGER,
-            away_team_score_display INTEGER,
-            away_team_score_period_1 INTEGER,
-            away_team_score_period_2 INTEGER,
-            away_team_score_default_time INTEGER,
-            times_period_1 INTEGER,
-            times_period_2 INTEGER,
-            times_specific_start_time TEXT,
-            specific_start_time TEXT,
-            start_time TEXT,
-            duration INTEGER,
-            class_id INTEGER,
-            class_name TEXT,
-            class_hash_image TEXT,
-            league_id INTEGER,
-            league_name TEXT,
-            league_hash_image TEXT
-        );
+        if bus is not None:
+            print(f"Published {bus.publish_matches(matches_data)} match events to the event bus.")
+            return
+
+        with BulkWriter(self.db, batch_size=batch_size, label="matches") as writer:
+            writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(matches_data))
+
+        print(f"Data inserted into SQLite database '{self.db.db_name}' successfully.")
+
+    @timed("fetch_all_matches")
+    def get_all_matches(self, page_size=50, max_in_flight=4, batch_size=1000):
         """
-        cursor.execute(create_table_query)
-        conn.commit()
+        Walk every offset of the matches endpoint concurrently and stream each
+        page into the 'matches' table as soon as it arrives.
 
-        # -------------------------------------------------------------------
-        # Step 3: Insert each match into the SQLite table.
-        # -------------------------------------------------------------------
-        insert_query = """
-        INSERT OR REPLACE INTO matches (
-            id, name, first_to_serve, ground_type, tournament_id, tournament_name, tournament_importance,
-            season_id, season_name, round_id, round_name, round_round, round_end_time, round_start_time,
-            status_type, status_reason, arena_id, arena_name, arena_hash_image,
-            home_team_id, home_team_name, home_team_hash_image, away_team_id, away_team_name, away_team_hash_image,
-            home_team_score_current, home_team_score_display, home_team_score_period_1, home_team_score_period_2, home_team_score_default_time,
-            away_team_score_current, away_team_score_display, away_team_score_period_1, away_team_score_period_2, away_team_score_default_time,
-            times_period_1, times_period_2, times_specific_start_time, specific_start_time, start_time, duration,
-            class_id, class_name, class_hash_image, league_id, league_name, league_hash_image
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?, ?,
-            ?, ?, ?, ?, ?, ?
-        );
+        Pages are fetched on a thread pool sharing the pooled, rate-limited
+        client, with at most `max_in_flight` requests outstanding. The walk
+        stops once a page comes back shorter than `page_size`. Returns the
+        number of matches written.
         """
+        matches_url = self.base_url + "matches/"
 
-        for match in matches_data:
-            # Flatten nested objects
-            # Round object
-            round_obj = match.get("round", {})
-            round_name = round_obj.get("name")
-            round_round = round_obj.get("round")
-            round_end_time = round_obj.get("end_time")
-            round_start_time = round_obj.get("start_time")
-            
-            # Status object
-            status_obj = match.get("status", {})
-            status_reason = status_obj.get("reason")
-            
-            # Home team score object
-            home_score = match.get("home_team_score", {})
-            home_team_score_current = home_score.get("current")
-            home_team_score_display = home_score.get("display")
-            home_team_score_period_1 = home_score.get("period_1")
-            home_team_score_period_2 = home_score.get("period_2")
-            home_team_score_default_time = home_score.get("default_time")
-            
-            # Away team score object
-            away_score = match.get("away_team_score", {})
-            away_team_score_current = away_score.get("current")
-            away_team_score_display = away_score.get("display")
-            away_team_score_period_1 = away_score.get("period_1")
-            away_team_score_period_2 = away_score.get("period_2")
-            away_team_score_default_time = away_score.get("default_time")
-            
-            # Times object
-            times_obj = match.get("times", {})
-            times_period_1 = times_obj.get("period_1")
-            times_period_2 = times_obj.get("period_2")
-            times_specific_start_time = times_obj.get("specific_start_time")
-            
-            # Build the record tuple. Note that some fields are taken directly from the top-level JSON,
-            # while others come from the nested objects.
-            record = (
-                match.get("id"),
-                match.get("name"),
-                match.get("first_to_serve"),
-                match.get("ground_type"),
-                match.get("tournament_id"),
-                match.get("tournament_name"),
-                match.get("tournament_importance"),
-                match.get("season_id"),
-                match.get("season_name"),
-                match.get("round_id"),  # top-level round_id field (may be redundant)
-                round_name,
-                round_round,
-                round_end_time,
-                round_start_time,
-                match.get("status_type"),  # top-level field
-                status_reason,
-                match.get("arena_id"),
-                match.get("arena_name"),
-                match.get("arena_hash_image"),
-                match.get("home_team_id"),
-                match.get("home_team_name"),
-                match.get("home_team_hash_image"),
-                match.get("away_team_id"),
-                match.get("away_team_name"),
-                match.get("away_team_hash_image"),
-                home_team_score_current,
-                home_team_score_display,
-                home_team_score_period_1,
-                home_team_score_period_2,
-                home_team_score_default_time,
-                away_team_score_current,
-                away_team_score_display,
-                away_team_score_period_1,
-                away_team_score_period_2,
-                away_team_score_default_time,
-                times_period_1,
-                times_period_2,
-                times_specific_start_time,
-                match.get("specific_start_time"),
-                match.get("start_time"),
-                match.get("duration"),
-                match.get("class_id"),
-                match.get("class_name"),
-                match.get("class_hash_image"),
-                match.get("league_id"),
-                match.get("league_name"),
-                match.get("league_hash_image")
-            )
-            
-            cursor.execute(insert_query, record)
+        with BulkWriter(self.db, batch_size=batch_size, label="matches") as writer:
+            def store_page(page):
+                return writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(page))
 
-        conn.commit()
-        conn.close()
+            print(f"Fetching all matches ({max_in_flight} requests in flight, page size {page_size})...")
+            written = self._walk_pages(matches_url, {}, page_size, max_in_flight, store_page)
 
-        print("Data inserted into SQLite database 'matches.db' successfully.")
-    
-    def get_players(self):
+        print(f"Inserted {written} matches into SQLite database '{self.db.db_name}' "
+              f"({writer.rows_changed} new or changed).")
+        return written
+
+    @timed("sync_matches")
+    def sync_matches(self, page_size=50, max_in_flight=4, batch_size=1000):
+        """
+        Incrementally sync the 'matches' table instead of reloading it.
+
+        The watermark for the matches endpoint is the latest start_time of a
+        match already seen in a final state. Each run requests only
+          - matches starting at or after the watermark (new and upcoming ones), and
+          - matches before the watermark that are stored but not yet finished,
+        and the content-hash upsert skips every row that did not change.
+        Returns the number of rows that were actually inserted or updated.
+        """
+        matches_url = self.base_url + "matches/"
+
+        with BulkWriter(self.db, batch_size=batch_size, label="matches-sync") as writer:
+            def store_page(page):
+                return writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(page))
+
+            watermark = self._get_watermark(writer, "matches")
+            requests_before = self.client.requests_sent
+
+            # New matches, plus anything scheduled or in play after the watermark.
+            params = {'order': 'start_time.asc'}
+            if watermark:
+                params['start_time'] = f'gte.{watermark}'
+            self._walk_pages(matches_url, params, page_size, max_in_flight, store_page)
+
+            # Older matches we still hold in a non-final state.
+            placeholders = ", ".join("?" for _ in FINAL_STATUSES)
+            stale_ids = [row[0] for row in writer.execute(
+                f"SELECT id FROM matches WHERE start_time < ? "
+                f"AND COALESCE(status_type, '') NOT IN ({placeholders})",
+                (watermark or "", *FINAL_STATUSES)
+            )]
+            self._fetch_ids(matches_url, stale_ids, page_size, store_page)
+
+            new_watermark = writer.execute(
+                f"SELECT MAX(start_time) FROM matches WHERE status_type IN ({placeholders})",
+                FINAL_STATUSES
+            ).fetchone()[0]
+            if new_watermark and new_watermark != watermark:
+                self._set_watermark(writer, "matches", new_watermark)
+
+        print(f"Synced matches since {watermark or 'the beginning'}: "
+              f"{self.client.requests_sent - requests_before} requests, "
+              f"{writer.rows_changed} rows written.")
+        return writer.rows_changed
+
+    @timed("refresh_matches")
+    def refresh_matches(self, match_ids, page_size=50, batch_size=1000, bus=None):
+        """
+        Re-fetch specific matches by id (page_size ids per request) and
+        upsert them. Used by the polling scheduler for matches that are about
+        to start or in play. Returns the number of rows that changed, or with
+        an event bus, the number of status/score change events published.
+        """
+        if bus is not None:
+            published = []
+            self._fetch_ids(self.base_url + "matches/", list(match_ids), page_size,
+                            lambda page: published.append(bus.publish_matches(page)))
+            return sum(published)
+        with BulkWriter(self.db, batch_size=batch_size, label="matches-refresh") as writer:
+            self._fetch_ids(self.base_url + "matches/", list(match_ids), page_size,
+                            lambda page: writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(page)))
+        return writer.rows_changed
+
+    def _fetch_ids(self, url, ids, page_size, on_page):
+        for i in range(0, len(ids), page_size):
+            chunk = ",".join(str(match_id) for match_id in ids[i:i + page_size])
+            response = self.client.get(url, params={'id': f'in.({chunk})'})
+            if response.status_code != 200:
+                raise RuntimeError(f"Error refreshing matches: {response.status_code} - {response.text}")
+            on_page(response.json() or [])
+
+    @timed("backfill_matches")
+    def backfill_matches(self, page_size=10000, batch_size=1000, chunk_size=1 << 16):
+        """
+        Load the whole matches endpoint with a few very large pages. Each
+        page is streamed: JSON elements are parsed as the bytes arrive and
+        flattened straight into the bulk writer, so memory stays bounded by
+        one write batch however large the page is. Pages are fetched one
+        after another, which suits a one-off backfill; use get_all_matches()
+        for concurrent small pages. Returns the number of matches written.
+        """
+        matches_url = self.base_url + "matches/"
+        written = 0
+        with BulkWriter(self.db, batch_size=batch_size, label="matches-backfill") as writer:
+            offset = 0
+            while True:
+                response = self.client.get(matches_url, params={'offset': offset, 'limit': page_size}, stream=True)
+                with response:
+                    if response.status_code != 200:
+                        raise RuntimeError(f"Error fetching {matches_url} at offset {offset}: "
+                                           f"{response.status_code} - {response.text}")
+                    matches = iter_json_array(response.iter_content(chunk_size=chunk_size))
+                    count = writer.write(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.rows(matches))
+                written += count
+                if count < page_size:
+                    break
+                offset += page_size
+
+        print(f"Backfilled {written} matches into SQLite database '{self.db.db_name}' "
+              f"({writer.rows_changed} new or changed).")
+        return written
+
+    def _walk_pages(self, url, params, page_size, max_in_flight, on_page):
+        """
+        Fetch every page of `url` concurrently and pass each page to
+        `on_page` (on the calling thread) as soon as it arrives. At most
+        `max_in_flight` requests are outstanding; the walk stops once a page
+        comes back shorter than `page_size`. Returns the number of items seen.
+        """
+        def fetch_page(offset):
+            response = self.client.get(url, params={**params, 'offset': offset, 'limit': page_size})
+            if response.status_code != 200:
+                raise RuntimeError(f"Error fetching {url} at offset {offset}: "
+                                   f"{response.status_code} - {response.text}")
+            return offset, response.json() or []
+
+        seen = 0
+        next_offset = 0
+        end_offset = None  # first offset known to be past the last page
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            pending = set()
+            for _ in range(max_in_flight):
+                pending.add(pool.submit(fetch_page, next_offset))
+                next_offset += page_size
+
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        offset, page = future.result()
+                        if page:
+                            on_page(page)
+                            seen += len(page)
+                        if len(page) < page_size:
+                            end_offset = offset if end_offset is None else min(end_offset, offset)
+
+                        if end_offset is None or next_offset < end_offset:
+                            pending.add(pool.submit(fetch_page, next_offset))
+                            next_offset += page_size
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+        return seen
+
+    @staticmethod
+    def _get_watermark(writer, endpoint):
+        row = writer.execute("SELECT watermark FROM sync_state WHERE endpoint = ?", (endpoint,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_watermark(writer, endpoint, watermark):
+        writer.execute(
+            "INSERT INTO sync_state (endpoint, watermark, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(endpoint) DO UPDATE SET watermark = excluded.watermark, updated_at = excluded.updated_at",
+            (endpoint, watermark, datetime.now(timezone.utc).isoformat())
+        )
+
+    @timed("fetch_players")
+    def get_players(self, team_id, batch_size=1000):
         """
         Fetch player data for a given team_id from the players-by-team endpoint,
         extract key fields, compute the player's age, and insert the data into
@@ -245,10 +302,7 @@ class TennisFetcher:
         - court_win_rate (empty for now)
         - weather_win_rate (empty for now)
         """
-        url = "https://tennis.sportdevs.com/players-by-team"
-        headers = {
-            'Accept': 'application/json'
-        }
+        url = self.base_url + "players-by-team"
         params = {
             'team_id': f'eq.{team_id}',
             'limit': 50,
@@ -257,7 +311,7 @@ class TennisFetcher:
         }
         
         print(f"Fetching player data for team_id {team_id} ...")
-        response = requests.get(url, headers=headers, params=params)
+        response = self.client.get(url, params=params)
         if response.status_code != 200:
             print(f"Error fetching players for team {team_id}: {response.status_code} - {response.text}")
             return
@@ -267,77 +321,42 @@ class TennisFetcher:
             print(f"No player data returned for team {team_id}")
             return
         
-        cursor = db_conn.cursor()
-        
-        # Create the player_stats table if it doesn't exist
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS player_stats (
-            player_id INTEGER PRIMARY KEY,
-            team_id INTEGER,
-            team_name TEXT,
-            player_name TEXT,
-            country_name TEXT,
-            player_height INTEGER,
-            age INTEGER,
-            win_rate REAL,
-            court_win_rate REAL,
-            weather_win_rate REAL
-        );
-        """
-        cursor.execute(create_table_query)
-        db_conn.commit()
-        
+        with BulkWriter(self.db, batch_size=batch_size, label="player_stats") as writer:
+            written = writer.write(PLAYER_STATS_INSERT_QUERY, self._player_records(teams_data))
+        print(f"Inserted/Updated {written} players for team {team_id}.")
+
+    def _player_records(self, teams_data):
         # Each team record contains team information and an array of player objects.
         for team_record in teams_data:
             current_team_id = team_record.get("team_id")
             team_name = team_record.get("team_name")
-            players = team_record.get("players", [])
             
-            for player in players:
-                player_id = player.get("id")
-                player_name = player.get("name")
-                country_name = player.get("country_name")
-                player_height = player.get("player_height")
+            for player in team_record.get("players", []):
                 dob_str = player.get("date_of_birth")
                 age = self.calculate_age(dob_str) if dob_str else None
                 
-                # Additional columns to be filled later are set to None for now.
-                win_rate = None
-                court_win_rate = None
-                weather_win_rate = None
-                
-                insert_query = """
-                INSERT OR REPLACE INTO player_stats (
-                    player_id, team_id, team_name, player_name, country_name, player_height, age,
-                    win_rate, court_win_rate, weather_win_rate
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                cursor.execute(insert_query, (
-                    player_id,
+                yield (
+                    player.get("id"),
                     current_team_id,
                     team_name,
-                    player_name,
-                    country_name,
-                    player_height,
-                    age,
-                    win_rate,
-                    court_win_rate,
-                    weather_win_rate
-                ))
-                db_conn.commit()
-                print(f"Inserted/Updated player '{player_name}' (ID: {player_id}) from team '{team_name}'.")
+                    player.get("name"),
+                    player.get("country_name"),
+                    player.get("player_height"),
+                    age
+                )
     
+    @staticmethod
     def calculate_age(dob_str):
-    """
-    Given an ISO 8601 date string (e.g., "1998-08-31T00:00:00+00:00"),
-    return the age in years.
-    """
-    try:
-        # Replace "Z" if present and parse the ISO formatted date.
-        dob = datetime.fromisoformat(dob_str.replace("Z", "+00:00"))
-        now = datetime.now(timezone.utc)
-        age = now.year - dob.year - ((now.month, now.day) < (dob.month, dob.day))
-        return age
-    except Exception as e:
-        print(f"Error calculating age from '{dob_str}': {e}")
-        return None
\ No newline at end of file
+        """
+        Given an ISO 8601 date string (e.g., "1998-08-31T00:00:00+00:00"),
+        return the age in years.
+        """
+        try:
+            # Replace "Z" if present and parse the ISO formatted date.
+            dob = datetime.fromisoformat(dob_str.replace("Z", "+00:00"))
+            now = datetime.now(timezone.utc)
+            age = now.year - dob.year - ((now.month, now.day) < (dob.month, dob.day))
+            return age
+        except Exception as e:
+            print(f"Error calculating age from '{dob_str}': {e}")
+            return None
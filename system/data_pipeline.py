@@ -1,66 +1,44 @@
-import sqlite3
-import requests
 import os
 from dotenv import load_dotenv
+from arbitrage import ArbitrageScanner
+from bulk_writer import BulkWriter
+from http_cache import ResponseCache
+from http_client import HttpClient
+from database import Database
+from metrics import timed
+from odds_store import ODDS_INSERT_QUERY, parse_time, utc_now
 
 # Load environment variables from .env file
 load_dotenv()
 
-def initialize_db():
-    # This function creates the necessary tables in our tennis database.
-    conn = sqlite3.connect('tennis_data.db')
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS players (
-        player_id INTEGER PRIMARY KEY,
-        full_name TEXT,
-        country TEXT
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS matches (
-        match_id INTEGER PRIMARY KEY,
-        match_date TEXT,
-        player1_id INTEGER,
-        player2_id INTEGER,
-        score TEXT,
-        winner_id INTEGER,
-        FOREIGN KEY (player1_id) REFERENCES players (player_id),
-        FOREIGN KEY (player2_id) REFERENCES players (player_id),
-        FOREIGN KEY (winner_id) REFERENCES players (player_id)
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS odds (
-        odds_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        sport_key TEXT,
-        event_id TEXT,
-        event_name TEXT,
-        bookmaker TEXT,
-        market TEXT,
-        odds_player1 REAL,
-        odds_player2 REAL,
-        region TEXT,
-        timestamp TEXT
-    )
-    ''')
-
-    print("Database and tables initialized successfully.")
-    conn.commit()
-    conn.close()
+def initialize_db(db=None):
+    # This function creates (or migrates) the tables in our tennis database.
+    db = db if db is not None else Database()
+    db.initialize()
+    return db
+
+_client = None
+
+def get_client():
+    # Shared pooled client with the on-disk response cache. Remaining
+    # the-odds-api credits are available as get_client().quota.
+    global _client
+    if _client is None:
+        _client = HttpClient(cache=ResponseCache())
+    return _client
 
 def fetch_data(url, params=None):
-    response = requests.get(url, params=params)
+    response = get_client().get(url, params=params)
     if response.status_code == 200:
         return response.json()
     else:
         print(f"Failed to fetch data. Status code: {response.status_code}")
         return None
 
-def fetch_odds():
+@timed("fetch_odds")
+def fetch_odds(client=None):
+    # `client` defaults to the shared cached client; pass an uncached
+    # HttpClient when every call must reach the API (see scheduler.py).
     API_KEY = os.getenv("ODDS_API_KEY")
     BASE_URL = "https://api.the-odds-api.com/v4/sports"
     # For tennis, use the appropriate sport key.
@@ -80,8 +58,12 @@ def fetch_odds():
         "dateFormat": DATE_FORMAT,
     }
 
-    response = requests.get(url, params=params)
-    print(f"Status Code: {response.status_code}")
+    client = client if client is not None else get_client()
+    response = client.get(url, params=params)
+    print(f"Status Code: {response.status_code}"
+          f"{' (cached)' if getattr(response, 'from_cache', False) else ''}")
+    if client.quota.remaining is not None:
+        print(f"Odds API quota: {client.quota.remaining} requests remaining, {client.quota.used} used")
 
     try:
         data = response.json()
@@ -95,53 +77,78 @@ def fetch_odds():
         print(f"Error fetching odds: {response.status_code} - {response.text}")
         return None
 
-def insert_tennis_odds(odds_data):
+@timed("ingest_odds")
+def insert_tennis_odds(odds_data, db=None, batch_size=1000, bus=None, captured_at=None):
     """
     Inserts tennis odds into the database. Assumes each event corresponds to a match with two players.
-    """
-    conn = sqlite3.connect('tennis_data.db')
-    cursor = conn.cursor()
+    Every quote is stamped with the capture time of this call (or `captured_at`, an ISO-8601
+    timestamp, when loading historical snapshots); quotes whose prices have not changed since
+    the previous snapshot for the same event/bookmaker/market are skipped.
+
+    odds_id order must follow capture order (odds_retention relies on it), so historical
+    snapshots have to be loaded oldest first into a database holding nothing newer; a
+    `captured_at` earlier than the newest stored quote raises ValueError.
 
+    With an event_bus.EventBus as `bus` the quotes are published instead, and
+    its SqliteSink subscriber persists them. Call from a worker thread.
+    """
+    if captured_at is not None:
+        newest = (db if db is not None else Database()).read_only().execute(
+            "SELECT captured_at FROM odds ORDER BY odds_id DESC LIMIT 1").fetchone()
+        if newest and newest[0] and parse_time(captured_at) < parse_time(newest[0]):
+            raise ValueError(f"captured_at {captured_at} is older than the newest stored quote ({newest[0]}); "
+                             f"backfills must be loaded in capture order")
+    captured_at = captured_at or utc_now()
+    if bus is not None:
+        quotes = bus.publish_odds(_odds_records(odds_data, captured_at))
+        print(f"Published {quotes} tennis odds quotes to the event bus.")
+        return
+    db = db if db is not None else Database()
+    with BulkWriter(db, batch_size=batch_size, label="odds") as writer:
+        quotes = writer.write(ODDS_INSERT_QUERY, _odds_records(odds_data, captured_at))
+    print(f"Tennis odds data inserted successfully ({writer.rows_changed} of {quotes} quotes changed).")
+
+def _odds_records(odds_data, captured_at):
+    # Flatten each event -> bookmaker -> market into one odds row.
     for event in odds_data:
         sport_key = event.get("sport_key")
         event_id = event.get("id", None)  # if provided by the API
         commence_time = event.get("commence_time")
 
-        # Construct an event name. Many tennis events list competitors in a "teams" field.
-        teams = event.get("teams", [])
-        if len(teams) == 2:
+        # The Odds API v4 names the players in home_team/away_team; older
+        # payloads list them in a "teams" field.
+        teams = event.get("teams") or [event.get("home_team"), event.get("away_team")]
+        if len(teams) == 2 and all(teams):
             event_name = " vs ".join(teams)
         else:
+            teams = None
             event_name = "Unknown vs Unknown"
 
         for bookmaker in event.get("bookmakers", []):
             bookmaker_name = bookmaker.get("title")
+            region = bookmaker.get("region", "unknown")
             for market in bookmaker.get("markets", []):
                 market_type = market.get("key")
                 outcomes = market.get("outcomes", [])
                 odds_player1 = None
                 odds_player2 = None
-                if len(outcomes) == 2:
+                if teams:
+                    # Outcomes are not guaranteed to come in event order.
+                    prices = {outcome.get("name"): outcome.get("price") for outcome in outcomes}
+                    odds_player1 = prices.get(teams[0])
+                    odds_player2 = prices.get(teams[1])
+                elif len(outcomes) == 2:
                     odds_player1 = outcomes[0].get("price")
                     odds_player2 = outcomes[1].get("price")
 
-                # Insert the odds record into the database
-                cursor.execute('''
-                    INSERT INTO odds (
-                        sport_key, event_id, event_name, bookmaker, market, odds_player1, odds_player2, region, timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+                yield (
                     sport_key, event_id, event_name, bookmaker_name, market_type,
-                    odds_player1, odds_player2, bookmaker.get("region", "unknown"), commence_time
-                ))
-
-    conn.commit()
-    print("Tennis odds data inserted successfully.")
-    conn.close()
+                    odds_player1, odds_player2, region, commence_time, captured_at
+                )
 
 if __name__ == "__main__":
     # Optionally, initialize the DB (if not already done via database.py)
-    initialize_db()
+    db = initialize_db()
 
     odds_data = fetch_odds()
     if odds_data is None or len(odds_data) == 0:
@@ -149,4 +156,10 @@ if __name__ == "__main__":
     else:
         print("Fetched odds data:")
         print(odds_data)
-        insert_tennis_odds(odds_data)
+        insert_tennis_odds(odds_data, db)
+
+        # Check the fresh snapshot for cross-bookmaker sure bets.
+        for opportunity in ArbitrageScanner().process_payload(odds_data):
+            legs = ", ".join(f"{leg['outcome']} @ {leg['price']} ({leg['bookmaker']}, {leg['stake_fraction']:.1%})"
+                             for leg in opportunity["legs"])
+            print(f"Arbitrage {opportunity['event_name']}: {opportunity['return_pct']:.2%} -> {legs}")
@@ -1,53 +1,553 @@
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+
+# -------------------------------------------------------------------
+# Schema. Every table the system uses lives in this one database file, so
+# odds, matches, players and NBA stats can be joined directly.
+#
+# The schema is built by the migrations below, applied in order. Each
+# migration's SQL is frozen here as it was when the migration shipped: it
+# must not follow later changes to the modules that use the tables (schema.py,
+# features.py, ...), or databases created before and after such a change
+# would differ. Schema changes go in a new migration.
+# -------------------------------------------------------------------
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+
+
+# --- Migration 1: unified storage (matches, players, sync state, odds) ---
+
+PLAYERS_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    full_name TEXT,
+    country TEXT
+)
+'''
+
+# The columns of schema.MATCH_SCHEMA when this migration shipped.
+MATCHES_CREATE_QUERY = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    first_to_serve INTEGER,
+    ground_type TEXT,
+    tournament_id INTEGER,
+    tournament_name TEXT,
+    tournament_importance INTEGER,
+    season_id INTEGER,
+    season_name TEXT,
+    round_id INTEGER,
+    round_name TEXT,
+    round_round INTEGER,
+    round_end_time TEXT,
+    round_start_time TEXT,
+    status_type TEXT,
+    status_reason TEXT,
+    arena_id INTEGER,
+    arena_name TEXT,
+    arena_hash_image TEXT,
+    home_team_id INTEGER,
+    home_team_name TEXT,
+    home_team_hash_image TEXT,
+    away_team_id INTEGER,
+    away_team_name TEXT,
+    away_team_hash_image TEXT,
+    home_team_score_current INTEGER,
+    home_team_score_display INTEGER,
+    home_team_score_period_1 INTEGER,
+    home_team_score_period_2 INTEGER,
+    home_team_score_default_time INTEGER,
+    away_team_score_current INTEGER,
+    away_team_score_display INTEGER,
+    away_team_score_period_1 INTEGER,
+    away_team_score_period_2 INTEGER,
+    away_team_score_default_time INTEGER,
+    times_period_1 INTEGER,
+    times_period_2 INTEGER,
+    times_specific_start_time TEXT,
+    specific_start_time TEXT,
+    start_time TEXT,
+    duration INTEGER,
+    class_id INTEGER,
+    class_name TEXT,
+    class_hash_image TEXT,
+    league_id INTEGER,
+    league_name TEXT,
+    league_hash_image TEXT,
+    content_hash TEXT
+);
+"""
+
+SYNC_STATE_CREATE_QUERY = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    endpoint TEXT PRIMARY KEY,
+    watermark TEXT,
+    updated_at TEXT
+);
+"""
+
+PLAYER_STATS_CREATE_QUERY = """
+CREATE TABLE IF NOT EXISTS player_stats (
+    player_id INTEGER PRIMARY KEY,
+    team_id INTEGER,
+    team_name TEXT,
+    player_name TEXT,
+    country_name TEXT,
+    player_height INTEGER,
+    age INTEGER,
+    win_rate REAL,
+    court_win_rate REAL,
+    weather_win_rate REAL
+);
+"""
+
+# Odds history (see odds_store.py): every distinct quote, plus the latest
+# quote per (event, bookmaker, market) maintained by a trigger.
+ODDS_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS odds (
+    odds_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sport_key TEXT,
+    event_id TEXT,
+    event_name TEXT,
+    bookmaker TEXT,
+    market TEXT,
+    odds_player1 REAL,
+    odds_player2 REAL,
+    region TEXT,
+    timestamp TEXT,
+    captured_at TEXT
+)
+'''
+
+ODDS_INDEX_QUERY = '''
+CREATE INDEX IF NOT EXISTS idx_odds_event_book_market_time
+ON odds (event_id, bookmaker, market, captured_at)
+'''
+
+ODDS_LATEST_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS odds_latest (
+    event_id TEXT,
+    bookmaker TEXT,
+    market TEXT,
+    odds_player1 REAL,
+    odds_player2 REAL,
+    captured_at TEXT,
+    odds_id INTEGER,
+    PRIMARY KEY (event_id, bookmaker, market)
+)
+'''
+
+ODDS_LATEST_TRIGGER_QUERY = '''
+CREATE TRIGGER IF NOT EXISTS odds_latest_after_insert AFTER INSERT ON odds
+BEGIN
+    INSERT INTO odds_latest (event_id, bookmaker, market, odds_player1, odds_player2, captured_at, odds_id)
+    VALUES (NEW.event_id, NEW.bookmaker, NEW.market, NEW.odds_player1, NEW.odds_player2, NEW.captured_at, NEW.odds_id)
+    ON CONFLICT (event_id, bookmaker, market) DO UPDATE SET
+        odds_player1 = excluded.odds_player1,
+        odds_player2 = excluded.odds_player2,
+        captured_at = excluded.captured_at,
+        odds_id = excluded.odds_id;
+END
+'''
+
+# Seeds odds_latest from an existing history (newest row per key by odds_id,
+# which follows insert order), so dedup works from the first poll after upgrading.
+ODDS_LATEST_BACKFILL_QUERY = '''
+INSERT OR REPLACE INTO odds_latest (event_id, bookmaker, market, odds_player1, odds_player2, captured_at, odds_id)
+SELECT o.event_id, o.bookmaker, o.market, o.odds_player1, o.odds_player2, o.captured_at, o.odds_id
+FROM odds AS o
+JOIN (SELECT MAX(odds_id) AS odds_id FROM odds GROUP BY event_id, bookmaker, market) AS newest
+  ON o.odds_id = newest.odds_id
+'''
+
+def _migration_1_unified_schema(conn):
+    # The original tennis_data.db schema had a placeholder matches table keyed
+    # by match_id; the sportdevs matches table replaces it.
+    if "match_id" in _columns(conn, "matches"):
+        conn.execute("ALTER TABLE matches RENAME TO legacy_matches")
+    conn.execute(PLAYERS_CREATE_QUERY)
+    conn.execute(MATCHES_CREATE_QUERY)
+    if "content_hash" not in _columns(conn, "matches"):
+        conn.execute("ALTER TABLE matches ADD COLUMN content_hash TEXT")
+    conn.execute(SYNC_STATE_CREATE_QUERY)
+    conn.execute(PLAYER_STATS_CREATE_QUERY)
+    # Odds tables created before captured_at existed are upgraded in place.
+    conn.execute(ODDS_CREATE_QUERY)
+    if "captured_at" not in _columns(conn, "odds"):
+        conn.execute("ALTER TABLE odds ADD COLUMN captured_at TEXT")
+    conn.execute(ODDS_INDEX_QUERY)
+    has_latest = _table_exists(conn, "odds_latest")
+    conn.execute(ODDS_LATEST_CREATE_QUERY)
+    if not has_latest:
+        conn.execute(ODDS_LATEST_BACKFILL_QUERY)
+    conn.execute(ODDS_LATEST_TRIGGER_QUERY)
+
+
+# --- Migration 2: covering indexes for the typed match queries ---
+
+# Columns the typed match queries (queries.py) read. The indexes below
+# include them, so those queries never have to visit the 47-column table
+# rows. Adding a column here needs a new migration to extend the indexes.
+MATCH_SUMMARY_COLUMNS = (
+    "id", "start_time", "status_type", "ground_type", "tournament_id",
+    "home_team_id", "away_team_id", "home_team_score_current", "away_team_score_current",
+)
+
+QUERY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_matches_start_time ON matches (start_time, id, status_type, ground_type, "
+    "tournament_id, home_team_id, away_team_id, home_team_score_current, away_team_score_current)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_home_team ON matches (home_team_id, start_time, id, status_type, "
+    "ground_type, tournament_id, away_team_id, home_team_score_current, away_team_score_current)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_away_team ON matches (away_team_id, start_time, id, status_type, "
+    "ground_type, tournament_id, home_team_id, home_team_score_current, away_team_score_current)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_tournament ON matches (tournament_id, start_time, id, status_type, "
+    "ground_type, home_team_id, away_team_id, home_team_score_current, away_team_score_current)",
+    "CREATE INDEX IF NOT EXISTS idx_matches_ground_type ON matches (ground_type, start_time, id, status_type, "
+    "tournament_id, home_team_id, away_team_id, home_team_score_current, away_team_score_current)",
+    "CREATE INDEX IF NOT EXISTS idx_player_stats_team ON player_stats (team_id)",
+)
+
+def _migration_2_query_indexes(conn):
+    for query in QUERY_INDEXES:
+        conn.execute(query)
+    conn.execute("ANALYZE")
+
+
+# --- Migration 3: player feature store (features.py) ---
+
+FEATURE_LOG_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS feature_log (
+    match_id INTEGER PRIMARY KEY,
+    applied_at TEXT
+)
+'''
+
+FEATURE_LOG_PENDING_INDEX_QUERY = '''
+CREATE INDEX IF NOT EXISTS idx_feature_log_pending ON feature_log (match_id) WHERE applied_at IS NULL
+'''
+
+FEATURE_PLAYERS_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS feature_players (
+    player_id INTEGER PRIMARY KEY,
+    matches INTEGER,
+    wins INTEGER,
+    recent TEXT
+)
+'''
+
+FEATURE_SURFACES_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS feature_surfaces (
+    player_id INTEGER,
+    ground_type TEXT,
+    matches INTEGER,
+    wins INTEGER,
+    PRIMARY KEY (player_id, ground_type)
+) WITHOUT ROWID
+'''
+
+# player_a < player_b; a_wins counts wins of player_a.
+FEATURE_HEAD_TO_HEAD_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS feature_head_to_head (
+    player_a INTEGER,
+    player_b INTEGER,
+    matches INTEGER,
+    a_wins INTEGER,
+    PRIMARY KEY (player_a, player_b)
+) WITHOUT ROWID
+'''
+
+# Queue a match once it is settled (replaced by migration 7).
+FEATURE_SETTLED_TRIGGER_QUERIES = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS matches_settled_after_insert AFTER INSERT ON matches
+    WHEN NEW.status_type IN ('finished', 'retired', 'walkover')
+    BEGIN
+        INSERT OR IGNORE INTO feature_log (match_id) VALUES (NEW.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS matches_settled_after_update AFTER UPDATE OF status_type ON matches
+    WHEN NEW.status_type IN ('finished', 'retired', 'walkover')
+    BEGIN
+        INSERT OR IGNORE INTO feature_log (match_id) VALUES (NEW.id);
+    END
+    ''',
+)
+
+def _migration_3_player_features(conn):
+    # Queue every match already settled, so the first update() builds the
+    # aggregates from history.
+    for query in (FEATURE_LOG_CREATE_QUERY, FEATURE_LOG_PENDING_INDEX_QUERY, FEATURE_PLAYERS_CREATE_QUERY,
+                  FEATURE_SURFACES_CREATE_QUERY, FEATURE_HEAD_TO_HEAD_CREATE_QUERY,
+                  *FEATURE_SETTLED_TRIGGER_QUERIES):
+        conn.execute(query)
+    conn.execute("INSERT OR IGNORE INTO feature_log (match_id) "
+                 "SELECT id FROM matches WHERE status_type IN ('finished', 'retired', 'walkover')")
+
+
+# --- Migration 4: per-season NBA player stats ---
+
+def _migration_4_nba_seasons(conn):
+    # nba_player_stats used to be replaced wholesale by pandas.to_sql and held
+    # one unlabeled season. script.py now creates it keyed by (season,
+    # PLAYER_ID); the old table is kept aside under a legacy name.
+    existing = _columns(conn, "nba_player_stats")
+    if existing and "season" not in existing:
+        conn.execute("ALTER TABLE nba_player_stats RENAME TO legacy_nba_player_stats")
+
+
+# --- Migration 5: odds event -> match resolution (resolution.py) ---
+
+EVENT_MATCHES_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS event_matches (
+    event_id TEXT PRIMARY KEY,
+    match_id INTEGER,
+    player1_is_home INTEGER,
+    score REAL,
+    resolved_at TEXT
+)
+'''
+
+EVENT_MATCHES_INDEX_QUERY = '''
+CREATE INDEX IF NOT EXISTS idx_event_matches_match ON event_matches (match_id)
+'''
+
+PLAYER_ALIASES_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS player_aliases (
+    alias TEXT PRIMARY KEY,
+    team_id INTEGER,
+    score REAL,
+    resolved_at TEXT
+)
+'''
+
+def _migration_5_entity_resolution(conn):
+    conn.execute(EVENT_MATCHES_CREATE_QUERY)
+    conn.execute(EVENT_MATCHES_INDEX_QUERY)
+    conn.execute(PLAYER_ALIASES_CREATE_QUERY)
+
+
+# --- Migration 6: OHLC rollups of expired odds (odds_retention.py) ---
+
+ODDS_BARS_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS odds_bars (
+    event_id TEXT,
+    bookmaker TEXT,
+    market TEXT,
+    granularity INTEGER,
+    bar_start TEXT,
+    in_play INTEGER,
+    sport_key TEXT,
+    event_name TEXT,
+    commence_time TEXT,
+    open1 REAL, high1 REAL, low1 REAL, close1 REAL,
+    open2 REAL, high2 REAL, low2 REAL, close2 REAL,
+    quotes INTEGER,
+    open_captured_at TEXT,
+    close_captured_at TEXT,
+    PRIMARY KEY (event_id, bookmaker, market, granularity, bar_start, in_play)
+) WITHOUT ROWID
+'''
+
+ODDS_BARS_GRANULARITY_INDEX_QUERY = '''
+CREATE INDEX IF NOT EXISTS idx_odds_bars_granularity ON odds_bars (granularity, market, event_id)
+'''
+
+def _migration_6_odds_rollups(conn):
+    conn.execute(ODDS_BARS_CREATE_QUERY)
+    conn.execute(ODDS_BARS_GRANULARITY_INDEX_QUERY)
+
+
+# --- Migration 7: apply feature results only once their scores are in ---
+
+# Queue a match once it is settled and both scores are in, whichever arrives last.
+FEATURE_READY_TRIGGER_QUERIES = (
+    '''
+    CREATE TRIGGER matches_settled_after_insert AFTER INSERT ON matches
+    WHEN NEW.status_type IN ('finished', 'retired', 'walkover')
+         AND NEW.home_team_score_current IS NOT NULL AND NEW.away_team_score_current IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO feature_log (match_id) VALUES (NEW.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER matches_settled_after_update
+    AFTER UPDATE OF status_type, home_team_score_current, away_team_score_current ON matches
+    WHEN NEW.status_type IN ('finished', 'retired', 'walkover')
+         AND NEW.home_team_score_current IS NOT NULL AND NEW.away_team_score_current IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO feature_log (match_id) VALUES (NEW.id);
+    END
+    ''',
+)
+
+def _migration_7_feature_scores(conn):
+    # Matches marked applied before their scores arrived are forgotten, so
+    # they are queued again when the scores come in (or now, if they have).
+    conn.execute("DROP TRIGGER IF EXISTS matches_settled_after_insert")
+    conn.execute("DROP TRIGGER IF EXISTS matches_settled_after_update")
+    conn.execute(
+        "DELETE FROM feature_log WHERE match_id IN (SELECT f.match_id FROM feature_log f "
+        "JOIN matches m ON m.id = f.match_id "
+        "WHERE m.home_team_score_current IS NULL OR m.away_team_score_current IS NULL)"
+    )
+    for query in FEATURE_READY_TRIGGER_QUERIES:
+        conn.execute(query)
+    conn.execute("INSERT OR IGNORE INTO feature_log (match_id) SELECT id FROM matches "
+                 "WHERE status_type IN ('finished', 'retired', 'walkover') "
+                 "AND home_team_score_current IS NOT NULL AND away_team_score_current IS NOT NULL")
+
+
+# Applied in order; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    _migration_1_unified_schema,
+    _migration_2_query_indexes,
+    _migration_3_player_features,
+    _migration_4_nba_seasons,
+    _migration_5_entity_resolution,
+    _migration_6_odds_rollups,
+    _migration_7_feature_scores,
+]
+
+# Pragmas for every read/write connection. WAL lets read-only analytics
+# connections run alongside ingest without blocking it.
+CONNECTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
 
 class Database:
-    def __init__(self, db_name="tennis_data.db"):
+    """
+    Storage subsystem shared by the fetchers, the pipeline, the backtester
+    and the NBA script.
+
+    Each thread gets one long-lived read/write connection (and, on request,
+    one read-only connection), reused across calls. Connections keep a
+    large prepared-statement cache so repeated queries skip re-parsing.
+    Read/write connections run in autocommit mode; use transaction() or
+    BulkWriter for multi-statement writes.
+    """
+    def __init__(self, db_name="tennis_data.db", statement_cache=256):
         self.db_name = db_name
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    def _connect(self, read_only=False):
+        if read_only:
+            uri = f"file:{os.path.abspath(self.db_name)}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, cached_statements=self.statement_cache,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn = sqlite3.connect(self.db_name, isolation_level=None,
+                                   cached_statements=self.statement_cache, check_same_thread=False)
+            for name, value in CONNECTION_PRAGMAS.items():
+                conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self):
+        """The calling thread's read/write connection; migrations run on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            if not self._migrated:
+                self.migrate(conn)
+        return conn
+
+    def read_only(self):
+        """
+        The calling thread's read-only connection, for analytics and
+        backtests. In WAL mode it reads a consistent snapshot without ever
+        blocking writers.
+        """
+        conn = getattr(self._local, "ro_conn", None)
+        if conn is None:
+            self.connection()  # make sure the file exists and is migrated
+            conn = self._local.ro_conn = self._connect(read_only=True)
+        return conn
+
+    def execute(self, query, params=()):
+        return self.connection().execute(query, params)
+
+    def executemany(self, query, rows):
+        return self.connection().executemany(query, rows)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        # BEGIN IMMEDIATE takes the write lock up front (waiting up to
+        # busy_timeout), for transactions that read before they write.
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def migrate(self, conn=None):
+        """Apply any migrations this database has not seen yet."""
+        conn = conn or self.connection()
+        with self._lock:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                conn.execute("BEGIN")
+                try:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version={number}")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            self._migrated = True
+
+    def schema_version(self):
+        return self.execute("PRAGMA user_version").fetchone()[0]
 
     def initialize(self):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-
-        # Create players table (for tennis players)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS players (
-            player_id INTEGER PRIMARY KEY,
-            full_name TEXT,
-            country TEXT
-        )
-        ''')
-
-        # Create matches table (for tennis matches)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS matches (
-            match_id INTEGER PRIMARY KEY,
-            match_date TEXT,
-            player1_id INTEGER,
-            player2_id INTEGER,
-            score TEXT,
-            winner_id INTEGER,
-            FOREIGN KEY (player1_id) REFERENCES players (player_id),
-            FOREIGN KEY (player2_id) REFERENCES players (player_id),
-            FOREIGN KEY (winner_id) REFERENCES players (player_id)
-        )
-        ''')
-
-        # Create odds table (for tennis betting odds)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS odds (
-            odds_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sport_key TEXT,
-            event_id TEXT,
-            event_name TEXT,
-            bookmaker TEXT,
-            market TEXT,
-            odds_player1 REAL,
-            odds_player2 REAL,
-            region TEXT,
-            timestamp TEXT
-        )
-        ''')
-
-        conn.commit()
-        conn.close()
-        print("Database initialized with tables for tennis data.")
+        self.migrate()
+        print(f"Database '{self.db_name}' initialized at schema version {self.schema_version()}.")
+
+    def import_database(self, path, tables=("matches", "player_stats", "sync_state")):
+        """
+        One-off merge of a database written before storage was unified (for
+        example the old matches.db) into this one. Existing rows win.
+        """
+        conn = self.connection()
+        conn.execute("ATTACH DATABASE ? AS legacy", (path,))
+        try:
+            legacy_tables = {row[0] for row in conn.execute(
+                "SELECT name FROM legacy.sqlite_master WHERE type = 'table'")}
+            with self.transaction():
+                for table in tables:
+                    if table not in legacy_tables:
+                        continue
+                    legacy_columns = [row[1] for row in conn.execute(f"PRAGMA legacy.table_info({table})")]
+                    columns = ", ".join(c for c in legacy_columns if c in _columns(conn, table))
+                    conn.execute(f"INSERT OR IGNORE INTO main.{table} ({columns}) "
+                                 f"SELECT {columns} FROM legacy.{table}")
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
@@ -0,0 +1,284 @@
+import json
+import os
+import shutil
+import sqlite3
+
+from metrics import timed
+
+# -------------------------------------------------------------------
+# Columnar export of the SQLite history.
+#
+# Each exported table is split into partitions by sport and season and
+# written under <root>/<table>/sport=<sport>/season=<season>/. A partition
+# is rewritten only when its signature (cheap aggregates over its rows)
+# changes, so re-running the export after an ingest touches just the
+# seasons that received data. The default format is the Arrow IPC file
+# format, which load_dataset() memory-maps without copying; Parquet is
+# available for handing data to other tools.
+#
+# Raw odds are kept only for the retention window (odds_retention.py), so
+# the odds export shrinks as quotes expire; odds_bars carries the full,
+# compacted history.
+# -------------------------------------------------------------------
+
+def _hash_sum(column, digits=8):
+    # Sum over rows of the first `digits` hex digits of a hash column, as an
+    # integer: changes whenever any row's content does, whatever the order.
+    # (SQLite before 3.41 has no unhex().)
+    return "TOTAL(" + " + ".join(
+        f"(instr('0123456789abcdef', substr({column}, {i + 1}, 1)) - 1) * {16 ** (digits - 1 - i)}"
+        for i in range(digits)) + ")"
+
+
+# table -> SQL expressions for the partition keys and the change signature.
+EXPORTS = {
+    "matches": {
+        "sport": "'tennis'",
+        "season": "substr(start_time, 1, 4)",
+        # content_hash covers every column, so in-place upserts count too.
+        "signature": f"COUNT(*), MAX(rowid), {_hash_sum('content_hash')}",
+    },
+    "odds": {
+        "sport": "sport_key",
+        "season": "substr(timestamp, 1, 4)",
+        "signature": "COUNT(*), MAX(odds_id)",
+    },
+    "odds_bars": {
+        "sport": "sport_key",
+        "season": "substr(commence_time, 1, 4)",
+        # Bars are merged in place as chunks roll up, which moves these.
+        "signature": "COUNT(*), TOTAL(quotes), MAX(close_captured_at)",
+    },
+    "nba_player_stats": {
+        "sport": "'nba'",
+        "season": "season",
+        "signature": "COUNT(*), MAX(rowid), TOTAL(PTS), TOTAL(GP)",
+    },
+}
+
+EXTENSIONS = {"arrow": "data.arrow", "parquet": "data.parquet"}
+
+# Declared SQLite type affinity -> Arrow type name.
+_ARROW_TYPES = {"INTEGER": "int64", "INT": "int64", "BIGINT": "int64", "REAL": "float64",
+                "FLOAT": "float64", "DOUBLE": "float64", "TEXT": "string"}
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("Dataset export needs pyarrow; install it with `pip install pyarrow`.") from exc
+    return pyarrow
+
+
+def _to_arrow(pa, values, arrow_type):
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite does not enforce declared types; coerce stray values.
+        if pa.types.is_string(arrow_type):
+            return pa.array([None if v is None else str(v) for v in values], type=arrow_type)
+        return pa.array(values, type=arrow_type, from_pandas=True, safe=False)
+
+
+def _partition_keys(spec):
+    # Partition keys as text, with rows missing a key grouped under "unknown".
+    return ", ".join(f"IFNULL(CAST({spec[key]} AS TEXT), 'unknown')" for key in ("sport", "season"))
+
+
+def _partition_dir(root, table, sport, season):
+    return os.path.join(root, table, f"sport={sport}", f"season={season}")
+
+
+class DatasetExporter:
+    """
+    Writes EXPORTS tables from a database.Database to partitioned Arrow (or
+    Parquet) files and keeps them current. Reads go through the read-only
+    connection; a manifest.json under `root` records each partition's
+    signature so unchanged partitions are skipped.
+    """
+    def __init__(self, db, root="datasets", file_format="arrow", chunk_size=65536):
+        if file_format not in EXTENSIONS:
+            raise ValueError(f"Unknown format {file_format!r}; expected one of {sorted(EXTENSIONS)}")
+        self.db = db
+        self.root = root
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.manifest_path = os.path.join(root, "manifest.json")
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        return manifest if manifest.get("format") == self.file_format else {}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def _schema(self, conn, table):
+        pa = _arrow()
+        fields = []
+        for _, name, declared, *_ in conn.execute(f"PRAGMA table_info({table})"):
+            affinity = _ARROW_TYPES.get((declared or "").split("(")[0].upper(), "string")
+            fields.append(pa.field(name, getattr(pa, affinity)()))
+        return pa.schema(fields)
+
+    @timed("export")
+    def export(self, tables=None):
+        """
+        Bring the files for `tables` (default: every EXPORTS table present in
+        the database) up to date. Returns {table: partitions rewritten}.
+        """
+        conn = self.db.read_only()
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        manifest = self._load_manifest()
+        manifest["format"] = self.file_format
+        rewritten = {}
+        for table in tables or EXPORTS:
+            if table not in existing:
+                continue
+            spec = EXPORTS[table]
+            try:
+                current = {
+                    f"{sport}|{season}": list(signature)
+                    for sport, season, *signature in conn.execute(
+                        f"SELECT {_partition_keys(spec)}, {spec['signature']} FROM {table} GROUP BY 1, 2")
+                }
+            except sqlite3.OperationalError as exc:
+                # e.g. an nba_player_stats table written before it had a season column
+                print(f"Skipping export of '{table}': {exc}")
+                continue
+            known = manifest.get(table, {})
+            changed = [key for key, signature in current.items() if known.get(key) != signature]
+            for key in set(known) - set(current):
+                shutil.rmtree(_partition_dir(self.root, table, *key.split("|")), ignore_errors=True)
+            if changed:
+                self._write_partitions(conn, table, spec, [key.split("|") for key in changed])
+            manifest[table] = current
+            rewritten[table] = len(changed)
+        self._save_manifest(manifest)
+        return rewritten
+
+    def _write_partitions(self, conn, table, spec, partitions):
+        # One pass over the table; rows are routed to an open writer per partition.
+        pa = _arrow()
+        schema = self._schema(conn, table)
+        wanted = {(sport, season) for sport, season in partitions}
+        # SQLite filters out the unchanged partitions before any row reaches Python.
+        values = ", ".join("(?, ?)" for _ in wanted)
+        cursor = conn.execute(
+            f"SELECT {_partition_keys(spec)}, * FROM {table} WHERE ({_partition_keys(spec)}) IN (VALUES {values})",
+            [key for pair in wanted for key in pair])
+        writers = {}
+        try:
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                buckets = {}
+                for row in rows:
+                    buckets.setdefault((row[0], row[1]), []).append(row[2:])
+                for key, bucket in buckets.items():
+                    columns = list(zip(*bucket))
+                    batch = pa.record_batch(
+                        [_to_arrow(pa, values, field.type) for values, field in zip(columns, schema)],
+                        schema=schema)
+                    if key not in writers:
+                        writers[key] = self._open_writer(table, key, schema)
+                    writers[key][0].write_batch(batch)
+        except Exception:
+            for writer, tmp, _ in writers.values():
+                writer.close()
+                os.remove(tmp)
+            raise
+
+        for key in wanted:
+            if key not in writers:  # every row in it is gone
+                shutil.rmtree(_partition_dir(self.root, table, *key), ignore_errors=True)
+        for writer, tmp, path in writers.values():
+            writer.close()
+            os.replace(tmp, path)
+
+    def _open_writer(self, table, key, schema):
+        pa = _arrow()
+        directory = _partition_dir(self.root, table, *key)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, EXTENSIONS[self.file_format])
+        tmp = path + ".tmp"
+        if self.file_format == "parquet":
+            writer = pa.parquet.ParquetWriter(tmp, schema)
+        else:
+            writer = pa.ipc.new_file(tmp, schema)
+        return writer, tmp, path
+
+
+def _partition_files(root, table, sports=None, seasons=None):
+    table_dir = os.path.join(root, table)
+    if not os.path.isdir(table_dir):
+        return []
+    files = []
+    for sport_dir in sorted(os.listdir(table_dir)):
+        sport = sport_dir.partition("=")[2]
+        if sports is not None and sport not in sports:
+            continue
+        for season_dir in sorted(os.listdir(os.path.join(table_dir, sport_dir))):
+            season = season_dir.partition("=")[2]
+            if seasons is not None and season not in seasons:
+                continue
+            for name in EXTENSIONS.values():
+                path = os.path.join(table_dir, sport_dir, season_dir, name)
+                if os.path.exists(path):
+                    files.append(path)
+    return files
+
+
+def load_dataset(root, table, sports=None, seasons=None, columns=None):
+    """
+    Open the exported partitions of `table` as one pyarrow Table, optionally
+    restricted to some sports/seasons and columns. Arrow files are
+    memory-mapped: the table's buffers point straight into the page cache,
+    so loading is near-instant and no second copy is made on the heap.
+    Parquet partitions have to be decoded and are read normally.
+    """
+    pa = _arrow()
+    tables = []
+    for path in _partition_files(root, table, sports, seasons):
+        if path.endswith(".parquet"):
+            tables.append(pa.parquet.read_table(path, columns=columns, memory_map=True))
+        else:
+            part = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            tables.append(part.select(columns) if columns else part)
+    if not tables:
+        raise FileNotFoundError(f"No exported partitions for '{table}' under '{root}'")
+    return pa.concat_tables(tables)
+
+
+def load_arrays(root, table, columns, sports=None, seasons=None):
+    """
+    {column: NumPy array} for feature building. A column stored in a single
+    partition without nulls is a zero-copy view of the mapped file; columns
+    spanning several partitions are concatenated once.
+    """
+    data = load_dataset(root, table, sports, seasons, columns)
+    arrays = {}
+    for name in columns:
+        column = data.column(name)
+        if column.num_chunks == 1 and column.null_count == 0:
+            arrays[name] = column.chunk(0).to_numpy(zero_copy_only=False)
+        else:
+            arrays[name] = column.to_numpy()
+    return arrays
+
+
+if __name__ == "__main__":
+    from database import Database
+
+    for table, count in DatasetExporter(Database()).export().items():
+        print(f"{table}: {count} partitions rewritten")
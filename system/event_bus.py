@@ -0,0 +1,419 @@
+import asyncio
+import inspect
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from bulk_writer import BulkWriter
+from data_fetcher import MATCHES_INSERT_QUERY
+from metrics import METRICS
+from odds_store import ODDS_INSERT_QUERY
+from schema import MATCH_NORMALIZER
+
+# -------------------------------------------------------------------
+# In-process event bus from ingestion to strategies.
+#
+# Producers publish typed events; every subscriber has its own bounded
+# queue and consumer task. A full queue makes publish() wait, so the
+# slowest subscriber throttles the producers instead of memory growing.
+# Queues that coalesce keep only the newest event per key (a quote
+# superseded before the strategy got to it is dropped); the SQLite sink
+# does not coalesce, so the stored history stays complete. A subscriber
+# subscribed with required=True (the sink) must not lose events: if its
+# handler fails, the next publish() or drain() raises the error.
+# -------------------------------------------------------------------
+
+METRICS.describe("bus_latency_seconds", "Time from publish to handled, by subscriber")
+METRICS.describe("odds_to_signal_seconds", "Time from an odds update to the signal it produced")
+
+
+@dataclass(frozen=True, slots=True)
+class OddsUpdate:
+    """One bookmaker quote, in ODDS_INSERT_QUERY column order (see data_pipeline.insert_tennis_odds)."""
+    sport_key: str
+    event_id: str
+    event_name: str
+    bookmaker: str
+    market: str
+    price1: float
+    price2: float
+    region: str
+    commence_time: str
+    captured_at: str
+    created: float = field(default_factory=time.perf_counter, compare=False)
+
+    @property
+    def key(self):
+        return ("odds", self.event_id, self.bookmaker, self.market)
+
+    def row(self):
+        return (self.sport_key, self.event_id, self.event_name, self.bookmaker, self.market,
+                self.price1, self.price2, self.region, self.commence_time, self.captured_at)
+
+
+@dataclass(frozen=True, slots=True)
+class MatchStatusChange:
+    match_id: int
+    status: str
+    previous: str
+    row: tuple  # flattened matches row, for persistence
+    created: float = field(default_factory=time.perf_counter, compare=False)
+
+    @property
+    def key(self):
+        return ("status", self.match_id)
+
+
+@dataclass(frozen=True, slots=True)
+class ScoreChange:
+    match_id: int
+    home_score: int
+    away_score: int
+    row: tuple
+    created: float = field(default_factory=time.perf_counter, compare=False)
+
+    @property
+    def key(self):
+        return ("score", self.match_id)
+
+
+@dataclass(frozen=True, slots=True)
+class MatchUpdated:
+    """Any other change to a match row (start time, names, tournament...)."""
+    match_id: int
+    row: tuple
+    created: float = field(default_factory=time.perf_counter, compare=False)
+
+    @property
+    def key(self):
+        return ("match", self.match_id)
+
+
+class MatchTracker:
+    """
+    Turns match payloads into events by diffing against the last seen
+    state: status and score changes, and MatchUpdated for any other change
+    of the row's content hash, so every changed row reaches the sink.
+    """
+    def __init__(self):
+        self.status = {}  # match id -> status_type
+        self.scores = {}  # match id -> (home, away)
+        self.hashes = {}  # match id -> content_hash of the last row seen
+
+    def events(self, matches):
+        for match in matches:
+            match_id = match.get("id")
+            row = MATCH_NORMALIZER.row(match)
+            if self.hashes.get(match_id) == row[-1]:
+                continue
+            self.hashes[match_id] = row[-1]
+            changed = False
+            status = match.get("status_type")
+            if match_id not in self.status or self.status[match_id] != status:
+                yield MatchStatusChange(match_id, status, self.status.get(match_id), row)
+                self.status[match_id] = status
+                changed = True
+            home, away = match.get("home_team_score") or {}, match.get("away_team_score") or {}
+            score = (home.get("current"), away.get("current"))
+            if score != (None, None) and self.scores.get(match_id) != score:
+                yield ScoreChange(match_id, score[0], score[1], row)
+                self.scores[match_id] = score
+                changed = True
+            if not changed:
+                yield MatchUpdated(match_id, row)
+
+
+class CoalescingQueue:
+    """
+    Bounded FIFO of events. With coalesce=True an event whose key is
+    already waiting replaces it in place and takes no extra slot.
+    """
+    def __init__(self, maxsize=1000, coalesce=True):
+        self.maxsize = maxsize
+        self.coalesce = coalesce
+        self.order = deque()  # keys, oldest first
+        self.pending = {}     # key -> newest event
+        self.coalesced = 0
+        self.unfinished = 0
+        self._sequence = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def offer(self, event):
+        """Enqueue without waiting; False if the queue is full."""
+        key = event.key if self.coalesce else next(self._sequence)
+        if key in self.pending:
+            self.pending[key] = event
+            self.coalesced += 1
+            return True
+        if len(self.order) >= self.maxsize:
+            return False
+        self.pending[key] = event
+        self.order.append(key)
+        self.unfinished += 1
+        self._idle.clear()
+        self._not_empty.set()
+        return True
+
+    async def put(self, event):
+        while not self.offer(event):
+            self._not_full.clear()
+            await self._not_full.wait()
+
+    async def get_batch(self, max_batch):
+        """Wait for at least one event, then take up to max_batch without waiting."""
+        while not self.order:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        keys = [self.order.popleft() for _ in range(min(max_batch, len(self.order)))]
+        self._not_full.set()
+        return [self.pending.pop(key) for key in keys]
+
+    def task_done(self, count):
+        self.unfinished -= count
+        if not self.unfinished:
+            self._idle.set()
+
+    async def join(self):
+        await self._idle.wait()
+
+    def qsize(self):
+        return len(self.order)
+
+
+class Subscription:
+    def __init__(self, name, handler, types, maxsize, coalesce, max_batch, threaded, required):
+        self.name = name
+        self.handler = handler
+        self.types = tuple(types) if types else None
+        self.queue = CoalescingQueue(maxsize, coalesce)
+        self.max_batch = max_batch
+        self.threaded = threaded
+        self.required = required
+        self.error = None  # first failure of a required subscriber
+        self.handled = 0
+
+
+class EventBus:
+    """
+    Fan-out of events to subscribers, each consumed by its own task.
+
+    Handlers receive a list of events (up to max_batch at a time) and may
+    be plain functions, coroutines, or blocking functions with
+    threaded=True, which run in a worker thread. Producers running in
+    worker threads (the fetchers under asyncio.to_thread) use
+    publish_odds() / publish_matches(), which block until every queue has
+    room. Call start() inside the running loop and drain() or stop() to
+    finish. A failure in a required=True subscriber is raised by the next
+    publish() and by drain(), since the events it was handling are lost.
+    """
+    def __init__(self):
+        self.subscriptions = []
+        self.tracker = MatchTracker()
+        self.loop = None
+        self._tasks = []
+
+    def subscribe(self, handler, types=None, name=None, maxsize=1000, coalesce=True, max_batch=500,
+                  threaded=False, required=False):
+        subscription = Subscription(name or getattr(handler, "__name__", type(handler).__name__), handler,
+                                    types, maxsize, coalesce, max_batch, threaded, required)
+        self.subscriptions.append(subscription)
+        if self.loop is not None:
+            self._tasks.append(self.loop.create_task(self._consume(subscription)))
+        return subscription
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._tasks = [self.loop.create_task(self._consume(s)) for s in self.subscriptions]
+        return self
+
+    async def publish(self, event):
+        # Queues with room get the event first, so a full queue (usually the
+        # SQLite sink) delays the producer but not the other subscribers.
+        self._raise_failed()
+        METRICS.inc("bus_events_total", type=type(event).__name__)
+        full = [subscription for subscription in self.subscriptions
+                if (subscription.types is None or isinstance(event, subscription.types))
+                and not subscription.queue.offer(event)]
+        for subscription in full:
+            await subscription.queue.put(event)
+
+    async def publish_many(self, events):
+        count = 0
+        for event in events:
+            await self.publish(event)
+            count += 1
+        return count
+
+    def publish_threadsafe(self, events):
+        """Publish from another thread, blocking it while queues are full. Returns the count."""
+        if self.loop is None:
+            raise RuntimeError("EventBus.start() has not been called")
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            raise RuntimeError("publish_threadsafe() would deadlock on the event loop thread; await publish()")
+        # Events are built lazily on the loop, so their timestamps are publish times.
+        return asyncio.run_coroutine_threadsafe(self.publish_many(events), self.loop).result()
+
+    def publish_odds(self, rows):
+        """Publish odds rows (as built by data_pipeline.insert_tennis_odds) from a worker thread."""
+        return self.publish_threadsafe(OddsUpdate(*row) for row in rows)
+
+    def publish_matches(self, matches):
+        """Publish the status and score changes in a page of match payloads from a worker thread."""
+        return self.publish_threadsafe(self.tracker.events(matches))
+
+    async def _consume(self, subscription):
+        queue = subscription.queue
+        while True:
+            batch = await queue.get_batch(subscription.max_batch)
+            try:
+                if subscription.threaded:
+                    await asyncio.to_thread(subscription.handler, batch)
+                else:
+                    result = subscription.handler(batch)
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as exc:
+                METRICS.inc("bus_handler_errors_total", subscriber=subscription.name)
+                print(f"Event bus subscriber {subscription.name} failed on {len(batch)} events: {exc}")
+                if subscription.required and subscription.error is None:
+                    subscription.error = exc
+            now = time.perf_counter()
+            for event in batch:
+                METRICS.observe("bus_latency_seconds", now - event.created, subscriber=subscription.name)
+            subscription.handled += len(batch)
+            queue.task_done(len(batch))
+
+    async def drain(self):
+        """Wait until every published event has been handled."""
+        for subscription in self.subscriptions:
+            await subscription.queue.join()
+        self._raise_failed()
+
+    def _raise_failed(self):
+        for subscription in self.subscriptions:
+            if subscription.error is not None:
+                raise RuntimeError(f"required subscriber {subscription.name} failed; "
+                                   f"events were not handled") from subscription.error
+
+    async def stop(self):
+        try:
+            await self.drain()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+    def stats(self):
+        return {s.name: {"handled": s.handled, "queued": s.queue.qsize(), "coalesced": s.queue.coalesced}
+                for s in self.subscriptions}
+
+
+class SqliteSink:
+    """
+    Persistence subscriber: writes odds and match rows through a
+    long-lived BulkWriter per worker thread, each on that thread's own
+    connection. Subscribe it with coalesce=False, threaded=True and
+    required=True so history is complete, writes stay off the loop and a
+    failed write is not silently dropped. A batch whose write fails (e.g.
+    the database is locked past busy_timeout) is retried `retries` times
+    with exponential backoff before the error propagates.
+    """
+    def __init__(self, db, batch_size=1000, retries=3, backoff=0.5):
+        self.db = db
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.writers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _writer(self):
+        # BulkWriter binds the connection of the thread that creates it, so
+        # each to_thread worker gets its own instead of sharing the
+        # constructing thread's connection (and its open transactions).
+        writer = getattr(self._local, "writer", None)
+        if writer is None:
+            writer = self._local.writer = BulkWriter(self.db, batch_size=self.batch_size, label="bus")
+            with self._lock:
+                self.writers.append(writer)
+        return writer
+
+    def __call__(self, batch):
+        odds = [event.row() for event in batch if isinstance(event, OddsUpdate)]
+        matches = {event.row[0]: event.row for event in batch if not isinstance(event, OddsUpdate)}
+        for attempt in range(self.retries + 1):
+            try:
+                writer = self._writer()
+                if odds:
+                    writer.write(ODDS_INSERT_QUERY, odds)
+                if matches:
+                    writer.write(MATCHES_INSERT_QUERY, matches.values())
+                return
+            except Exception:
+                # Matches upsert and odds skip a quote equal to the latest
+                # stored, so re-sending a batch that partly committed is
+                # harmless.
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def close(self):
+        for writer in self.writers:
+            writer.report()
+            writer.close()
+
+
+class SignalSubscriber:
+    """
+    Strategy subscriber: keeps the latest quote per event and bookmaker and,
+    for every batch, runs each strategy's signals() on the best prices of
+    the events that moved, in the snapshot layout BacktestEngine uses.
+    on_signal(signal) receives every non-zero side.
+    """
+    def __init__(self, strategies, on_signal=None, market="h2h", signal_options=None):
+        # A TradingSystem or a list of (proportion, strategy) pairs.
+        self.strategies = getattr(strategies, "strategies", strategies)
+        self.on_signal = on_signal or (lambda signal: None)
+        self.market = market
+        self.signal_options = signal_options or {}
+        self.books = {}  # event id -> {bookmaker: (price1, price2)}
+
+    def __call__(self, batch):
+        moved = {}
+        for event in batch:
+            if isinstance(event, OddsUpdate) and event.market == self.market:
+                book = self.books.setdefault(event.event_id, {})
+                if event.price1 and event.price2:
+                    book[event.bookmaker] = (event.price1, event.price2)
+                else:
+                    book.pop(event.bookmaker, None)  # the book pulled its price
+                moved[event.event_id] = min(moved.get(event.event_id, event.created), event.created)
+        events = [event_id for event_id in moved if self.books.get(event_id)]
+        if not events:
+            return
+        price1 = np.array([max(p1 for p1, _ in self.books[e].values()) for e in events])
+        price2 = np.array([max(p2 for _, p2 in self.books[e].values()) for e in events])
+        snapshot = {"event": np.arange(len(events)), "event_id": np.array(events, dtype=object),
+                    "price1": price1, "price2": price2}
+        for proportion, strategy in self.strategies:
+            side, prob = strategy.signals(snapshot, **self.signal_options)
+            side, prob = np.asarray(side), np.asarray(prob)
+            for i in np.flatnonzero(side):
+                self.on_signal({"strategy": strategy, "proportion": proportion, "event_id": events[i],
+                                "side": int(side[i]), "probability": float(prob[i]),
+                                "price": float(price1[i] if side[i] == 1 else price2[i])})
+        now = time.perf_counter()
+        for event_id in events:
+            METRICS.observe("odds_to_signal_seconds", now - moved[event_id])
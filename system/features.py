@@ -0,0 +1,199 @@
+from collections import deque
+
+from metrics import timed
+from odds_store import utc_now
+
+# Match statuses whose score is final: results used for features and to settle bets.
+SETTLED_STATUSES = ("finished", "retired", "walkover")
+
+# -------------------------------------------------------------------
+# Player feature schema.
+#
+# Aggregates are kept per player, per (player, ground_type) and per player
+# pair. feature_log holds one row per settled match: triggers on matches add
+# a pending row (applied_at NULL) once a match is settled and both scores
+# are in, whichever arrives last, and the store marks it applied once its
+# result is folded into the aggregates, so every match is counted exactly
+# once and nothing is recomputed. The tables and triggers are created by
+# database.py's migrations 3 and 7, which spell out SETTLED_STATUSES.
+# -------------------------------------------------------------------
+
+PENDING_RESULTS_QUERY = '''
+SELECT m.id, m.home_team_id, m.away_team_id, m.ground_type,
+       m.home_team_score_current, m.away_team_score_current
+FROM feature_log f JOIN matches m ON m.id = f.match_id
+WHERE f.applied_at IS NULL
+ORDER BY m.start_time, m.id
+LIMIT ?
+'''
+
+
+def _rate(wins, matches):
+    return wins / matches if matches else None
+
+
+class PlayerFeatureStore:
+    """
+    Incrementally maintained player features derived from settled matches:
+    overall win rate, win rate per ground_type, recent form (win rate over
+    the last `form_window` matches) and head-to-head records. Players are
+    keyed by their sportdevs team id (home_team_id/away_team_id; in tennis
+    the "team" is the player), which is player_stats.team_id.
+
+    Form is over the most recently *settled* matches: a match whose result
+    arrives after later matches were applied is appended last, not slotted
+    in at its start time.
+
+    The aggregates are held in dictionaries, so a lookup for a match about
+    to be scored is a handful of hash probes. update() folds in only the
+    matches settled since the last call, writes back the aggregates it
+    touched, and refreshes win_rate/court_win_rate in player_stats.
+
+    :param db: database.Database holding the matches table.
+    :param form_window: Number of most recent matches that make up "form".
+    """
+    def __init__(self, db, form_window=10):
+        self.db = db
+        self.form_window = form_window
+        self.players = {}    # player_id -> [matches, wins, deque of recent 1/0 results]
+        self.surfaces = {}   # (player_id, ground_type) -> [matches, wins]
+        self.pairs = {}      # (player_a, player_b), a < b -> [matches, a_wins]
+        self.grounds = set()
+        self._loaded = False
+
+    def load(self):
+        """Read the stored aggregates into memory."""
+        conn = self.db.connection()
+        self.players = {
+            player_id: [matches, wins, deque((int(c) for c in recent or ""), maxlen=self.form_window)]
+            for player_id, matches, wins, recent in conn.execute(
+                "SELECT player_id, matches, wins, recent FROM feature_players")
+        }
+        self.surfaces = {
+            (player_id, ground): [matches, wins]
+            for player_id, ground, matches, wins in conn.execute(
+                "SELECT player_id, ground_type, matches, wins FROM feature_surfaces")
+        }
+        self.grounds = {ground for _, ground in self.surfaces}
+        self.pairs = {
+            (a, b): [matches, a_wins]
+            for a, b, matches, a_wins in conn.execute(
+                "SELECT player_a, player_b, matches, a_wins FROM feature_head_to_head")
+        }
+        self._loaded = True
+
+    @timed("features")
+    def update(self, batch_size=1000):
+        """
+        Fold every newly settled match into the aggregates, oldest first.
+        Returns the number of matches applied.
+        """
+        if not self._loaded:
+            self.load()
+        conn = self.db.connection()
+        applied = 0
+        while True:
+            rows = conn.execute(PENDING_RESULTS_QUERY, (batch_size,)).fetchall()
+            if not rows:
+                break
+            players, surfaces, pairs = set(), set(), set()
+            for match_id, home, away, ground, home_score, away_score in rows:
+                # Matches without both players or a decided score are marked
+                # applied without contributing anything.
+                if home is None or away is None or home_score is None or away_score is None \
+                        or home_score == away_score:
+                    continue
+                home_won = home_score > away_score
+                for player, won in ((home, home_won), (away, not home_won)):
+                    stats = self.players.setdefault(player, [0, 0, deque(maxlen=self.form_window)])
+                    stats[0] += 1
+                    stats[1] += won
+                    stats[2].append(int(won))
+                    players.add(player)
+                    if ground:
+                        surface = self.surfaces.setdefault((player, ground), [0, 0])
+                        surface[0] += 1
+                        surface[1] += won
+                        surfaces.add((player, ground))
+                        self.grounds.add(ground)
+                pair = (min(home, away), max(home, away))
+                record = self.pairs.setdefault(pair, [0, 0])
+                record[0] += 1
+                record[1] += home_won if pair[0] == home else not home_won
+                pairs.add(pair)
+            self._write(conn, rows, players, surfaces, pairs)
+            applied += len(rows)
+        return applied
+
+    def _write(self, conn, rows, players, surfaces, pairs):
+        with self.db.transaction():
+            conn.executemany(
+                "INSERT OR REPLACE INTO feature_players VALUES (?, ?, ?, ?)",
+                [(p, self.players[p][0], self.players[p][1], "".join(map(str, self.players[p][2])))
+                 for p in players])
+            conn.executemany(
+                "INSERT OR REPLACE INTO feature_surfaces VALUES (?, ?, ?, ?)",
+                [(p, g, *self.surfaces[(p, g)]) for p, g in surfaces])
+            conn.executemany(
+                "INSERT OR REPLACE INTO feature_head_to_head VALUES (?, ?, ?, ?)",
+                [(a, b, *self.pairs[(a, b)]) for a, b in pairs])
+            # weather_win_rate stays NULL: no source we ingest carries weather.
+            conn.executemany(
+                "UPDATE player_stats SET win_rate = ?, court_win_rate = ? WHERE team_id = ?",
+                [(self.win_rate(p), self._main_surface_rate(p), p) for p in players])
+            now = utc_now()
+            conn.executemany("UPDATE feature_log SET applied_at = ? WHERE match_id = ?",
+                             [(now, row[0]) for row in rows])
+
+    def _main_surface_rate(self, player_id):
+        # player_stats has a single court_win_rate column; it holds the rate
+        # on the player's most played surface.
+        surfaces = [self.surfaces[(player_id, g)] for g in self.grounds if (player_id, g) in self.surfaces]
+        if not surfaces:
+            return None
+        matches, wins = max(surfaces)
+        return _rate(wins, matches)
+
+    def win_rate(self, player_id):
+        stats = self.players.get(player_id)
+        return _rate(stats[1], stats[0]) if stats else None
+
+    def court_win_rate(self, player_id, ground_type):
+        stats = self.surfaces.get((player_id, ground_type))
+        return _rate(stats[1], stats[0]) if stats else None
+
+    def recent_form(self, player_id):
+        stats = self.players.get(player_id)
+        return sum(stats[2]) / len(stats[2]) if stats and stats[2] else None
+
+    def head_to_head(self, player_id, opponent_id):
+        """(matches played, win rate of player_id) against opponent_id."""
+        pair = (min(player_id, opponent_id), max(player_id, opponent_id))
+        matches, a_wins = self.pairs.get(pair, (0, 0))
+        wins = a_wins if pair[0] == player_id else matches - a_wins
+        return matches, _rate(wins, matches)
+
+    def match_features(self, home_id, away_id, ground_type=None):
+        """
+        Features for an upcoming match, from the home player's side.
+        player_form and head_to_head are the differences the strategy model
+        uses; unknown players count as 0.5.
+        """
+        if not self._loaded:
+            self.load()
+
+        def known(value):
+            return 0.5 if value is None else value
+
+        h2h_matches, h2h_rate = self.head_to_head(home_id, away_id)
+        return {
+            "home_win_rate": self.win_rate(home_id),
+            "away_win_rate": self.win_rate(away_id),
+            "home_court_win_rate": self.court_win_rate(home_id, ground_type),
+            "away_court_win_rate": self.court_win_rate(away_id, ground_type),
+            "home_recent_form": self.recent_form(home_id),
+            "away_recent_form": self.recent_form(away_id),
+            "head_to_head_matches": h2h_matches,
+            "player_form": known(self.recent_form(home_id)) - known(self.recent_form(away_id)),
+            "head_to_head": known(h2h_rate) - 0.5,
+        }
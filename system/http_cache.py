@@ -0,0 +1,169 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from requests.structures import CaseInsensitiveDict
+
+# Default freshness per endpoint, matched as a substring of the request URL
+# (the longest matching pattern wins). Values are seconds.
+DEFAULT_TTLS = {
+    "api.the-odds-api.com": 60,
+    "/matches": 300,
+    "/players-by-team": 24 * 3600,
+}
+
+CACHE_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    status_code INTEGER,
+    headers TEXT,
+    body BLOB,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL,
+    last_access REAL,
+    size INTEGER
+)
+'''
+
+
+class CachedResponse:
+    """
+    The subset of requests.Response the fetchers use, rebuilt from a cache entry.
+    """
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.url = url
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    On-disk HTTP response cache keyed by URL and query parameters.
+
+    Entries are fresh for the TTL of their endpoint (see DEFAULT_TTLS). Stale
+    entries that carry an ETag or Last-Modified header are revalidated with a
+    conditional request instead of being refetched. When the stored bodies
+    exceed `max_bytes`, the least recently used entries are evicted.
+    """
+    def __init__(self, path="http_cache.db", ttls=None, default_ttl=60, max_bytes=256 * 1024 * 1024):
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+        # The fetchers share one client across a thread pool.
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(CACHE_CREATE_QUERY)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_last_access ON http_cache (last_access)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(url, params=None):
+        items = sorted((params or {}).items())
+        return hashlib.sha256(json.dumps([url, items], default=str).encode()).hexdigest()
+
+    def ttl_for(self, url):
+        matches = [pattern for pattern in self.ttls if pattern in url]
+        if not matches:
+            return self.default_ttl
+        return self.ttls[max(matches, key=len)]
+
+    def lookup(self, key):
+        """
+        Return (response, fresh) for a stored entry, or (None, False).
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, status_code, headers, body, expires_at FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, False
+            self.conn.execute("UPDATE http_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        url, status_code, headers, body, expires_at = row
+        fresh = expires_at > time.time()
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        response = CachedResponse(status_code, json.loads(headers), body, url)
+        return response, fresh
+
+    def validators(self, response):
+        """Conditional request headers for revalidating a stale entry."""
+        headers = {}
+        if response.headers.get("ETag"):
+            headers["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = response.headers["Last-Modified"]
+        return headers
+
+    def refresh(self, key, url):
+        """Extend the lifetime of an entry after a 304 Not Modified."""
+        with self.lock:
+            self.revalidated += 1
+            self.conn.execute("UPDATE http_cache SET expires_at = ?, last_access = ? WHERE key = ?",
+                              (time.time() + self.ttl_for(url), time.time(), key))
+
+    def store(self, key, url, response):
+        # `url` is the request URL without query parameters, so API keys
+        # passed as params never end up on disk.
+        if response.status_code != 200:
+            return
+        headers = CaseInsensitiveDict(response.headers)
+        body = response.content
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM http_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO http_cache
+                    (key, url, status_code, headers, body, etag, last_modified, expires_at, last_access, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, url, response.status_code, json.dumps(dict(headers)), body,
+                  headers.get("ETag"), headers.get("Last-Modified"),
+                  now + self.ttl_for(url), now, len(body)))
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under 90% of the cap.
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM http_cache ORDER BY last_access")
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM http_cache WHERE key = ?", doomed)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM http_cache")
+            self.total_bytes = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "bytes": self.total_bytes,
+        }
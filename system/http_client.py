@@ -0,0 +1,165 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import METRICS
+
+# Status codes worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket. Each call to acquire() blocks until a request
+    slot is available, so the whole pool stays under `rate` requests/second.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class QuotaTracker:
+    """
+    Remaining API credits as reported by the-odds-api on every live response
+    (x-requests-remaining / x-requests-used / x-requests-last).
+    """
+    def __init__(self):
+        self.remaining = None
+        self.used = None
+        self.last_cost = None
+        self.updated_at = None
+
+    def update(self, headers):
+        if "x-requests-remaining" not in headers:
+            return
+        self.remaining = _to_number(headers.get("x-requests-remaining"))
+        self.used = _to_number(headers.get("x-requests-used"))
+        self.last_cost = _to_number(headers.get("x-requests-last"))
+        self.updated_at = time.time()
+
+    def __repr__(self):
+        return f"QuotaTracker(remaining={self.remaining}, used={self.used}, last_cost={self.last_cost})"
+
+
+def _to_number(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Pooled HTTP client shared by the fetchers. A single requests.Session keeps
+    connections alive across calls, and get() retries 429/5xx responses with
+    exponential backoff (honouring Retry-After when the API sends one).
+
+    Pass a ResponseCache as `cache` to serve repeated queries from disk; fresh
+    hits never reach the network and never count against the API quota.
+    """
+    def __init__(self, headers=None, pool_size=8, rate_limit=None, max_retries=4,
+                 backoff=0.5, timeout=30, cache=None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests_sent = 0
+        self._count_lock = threading.Lock()
+        self.cache = cache
+        self.quota = QuotaTracker()
+
+    def get(self, url, params=None, headers=None, stream=False):
+        """
+        Issue a GET and return the final response. Non-retryable errors are
+        returned as-is so callers can decide how to report them.
+
+        With stream=True the body is left unread for iter_content() and the
+        cache is bypassed, since caching would mean holding the whole body.
+        """
+        if self.cache is None or stream:
+            return self._get(url, params, headers, stream=stream)
+
+        key = self.cache.make_key(url, params)
+        cached, fresh = self.cache.lookup(key)
+        if fresh:
+            METRICS.inc("http_cache_total", result="hit")
+            return cached
+
+        conditional = dict(headers or {})
+        if cached is not None:
+            conditional.update(self.cache.validators(cached))
+        response = self._get(url, params, conditional or None)
+        if response.status_code == 304 and cached is not None:
+            METRICS.inc("http_cache_total", result="revalidated")
+            self.cache.refresh(key, cached.url)
+            return cached
+        METRICS.inc("http_cache_total", result="miss")
+        self.cache.store(key, url, response)
+        return response
+
+    def _get(self, url, params=None, headers=None, stream=False):
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.acquire()
+            with self._count_lock:
+                self.requests_sent += 1
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout,
+                                            stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICS.inc("http_requests_total", host=host, status="error")
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+
+            if response is not None:
+                METRICS.observe("http_request_seconds", time.perf_counter() - started, host=host)
+                METRICS.inc("http_requests_total", host=host, status=response.status_code)
+                # A streamed body has not been read yet; count what the server declared.
+                size = response.headers.get("Content-Length") if stream else len(response.content)
+                METRICS.inc("http_response_bytes_total", int(size or 0), host=host)
+                self.quota.update(response.headers)
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt >= self.max_retries:
+                return response
+
+            if response is not None:
+                response.close()  # hand a streamed connection back to the pool
+            time.sleep(self._retry_delay(response, attempt))
+            attempt += 1
+
+    def _retry_delay(self, response, attempt):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    def close(self):
+        self.session.close()
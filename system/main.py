@@ -1,5 +1,9 @@
 from database import Database
-from strategies import MLStrategy
+from features import PlayerFeatureStore
+from metrics import METRICS
+from resolution import EntityResolver
+from backtest import load_history
+from strategies import XGBoostStrategy
 from trading_system import TradingSystem
 
 def main():
@@ -7,6 +11,15 @@ def main():
     db = Database()
     db.initialize()
 
+    # Fold any matches settled since the last run into the player features.
+    applied = PlayerFeatureStore(db).update()
+    print(f"Player features updated with {applied} newly settled matches.")
+
+    # Map odds events not resolved at ingest to their sportdevs matches, so
+    # the backtest below can settle them.
+    resolved = EntityResolver(db).resolve_stored()
+    print(f"Resolved {resolved} odds events to matches.")
+
     # Define risk and capital
     risk_target = 0.30
     capital = 100
@@ -15,13 +28,20 @@ def main():
     # The tuple (1.0, strategy_instance) allows for scaling strategies later.
     trading_system = TradingSystem(
         strategies=[
-            (1.0, MLStrategy(risk_target=risk_target, capital=capital)),
+            (1.0, XGBoostStrategy(risk_target=risk_target, capital=capital)),
         ]
     )
 
-    # Run backtest simulation
+    # Replay the stored odds history; fall back to the synthetic simulation
+    # while there is no settled history to replay.
+    history = load_history(db)
     print("Running backtest...")
-    results = trading_system.backtest()
+    if history.winner.any():
+        results = trading_system.backtest(history=history, capital=capital)
+        results = [(proportion, result["summary"]) for proportion, result in results]
+    else:
+        print("No settled odds history found; running synthetic simulation instead.")
+        results = trading_system.backtest()
 
     # Display results
     for proportion, result in results:
@@ -29,5 +49,9 @@ def main():
         for key, value in result.items():
             print(f"{key}: {value}")
 
+    # Where the time went, plus a Prometheus-text copy for scraping.
+    METRICS.report()
+    METRICS.write("metrics.prom")
+
 if __name__ == "__main__":
     main()
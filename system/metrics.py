@@ -0,0 +1,200 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms.
+
+    Counters and histograms are keyed by name plus a label set, like
+    Prometheus series. Everything is guarded by one lock; updates are a
+    dictionary lookup and an addition, cheap enough for per-request use.
+    render() produces the Prometheus text exposition format, which can be
+    written to a file (write()) or served over HTTP (serve()).
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}    # name -> {label key: value}
+        self.histograms = {}  # name -> {label key: [bucket counts..., sum, count]}
+        self.help = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def timer(self, name="stage_seconds", **labels):
+        """Context manager and decorator recording elapsed seconds into a histogram."""
+        return Timer(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def render(self):
+        """Prometheus text exposition of every series."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, state):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path="metrics.prom"):
+        """Write render() atomically, e.g. for node_exporter's textfile collector."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """Serve render() at http://host:port/metrics from a daemon thread. Returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def quantile(self, name, q, **labels):
+        """Approximate quantile from the histogram buckets (upper bound of the bucket it falls in)."""
+        with self._lock:
+            state = self.histograms.get(name, {}).get(_label_key(labels))
+            if not state or not state[-1]:
+                return None
+            target = q * state[-1]
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                if cumulative >= target:
+                    return bound
+            return float("inf")
+
+    def summary(self):
+        """
+        Totals for the run: every counter series, and per histogram series
+        the count, total and mean seconds.
+        """
+        with self._lock:
+            counters = {f"{name}{_format_labels(key)}": value
+                        for name, series in self.counters.items() for key, value in series.items()}
+            timings = {
+                f"{name}{_format_labels(key)}": {"count": state[-1], "total": state[-2],
+                                                 "mean": state[-2] / state[-1] if state[-1] else 0.0}
+                for name, series in self.histograms.items() for key, state in series.items()
+            }
+        return {"elapsed": time.time() - self.started, "counters": counters, "timings": timings}
+
+    def report(self):
+        summary = self.summary()
+        print(f"\nRun summary ({summary['elapsed']:.1f}s):")
+        for name, value in sorted(summary["counters"].items()):
+            print(f"  {name}: {value:,.0f}" if float(value).is_integer() else f"  {name}: {value:,.3f}")
+        for series, timing in sorted(summary["timings"].items()):
+            print(f"  {series}: {timing['count']} x {timing['mean']:.3f}s = {timing['total']:.2f}s")
+
+
+class Timer(ContextDecorator):
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self._starts = threading.local()
+
+    def __enter__(self):
+        stack = getattr(self._starts, "stack", None)
+        if stack is None:
+            stack = self._starts.stack = []
+        stack.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._starts.stack.pop()
+        self.metrics.observe(self.name, elapsed, **self.labels)
+        return False
+
+
+# Shared registry used by the fetchers, writers, trainer and backtester.
+METRICS = Metrics()
+METRICS.describe("http_requests_total", "HTTP requests sent, by host and status")
+METRICS.describe("http_response_bytes_total", "Response body bytes received, by host")
+METRICS.describe("http_request_seconds", "HTTP request latency, by host")
+METRICS.describe("http_cache_total", "Response cache lookups, by result")
+METRICS.describe("rows_written_total", "Rows passed to BulkWriter, by label")
+METRICS.describe("rows_changed_total", "Rows SQLite reported as inserted or updated, by label")
+METRICS.describe("sqlite_batch_seconds", "BulkWriter batch write latency, by label")
+METRICS.describe("stage_seconds", "Wall time per pipeline stage")
+
+
+def timed(stage):
+    """Decorator (or context manager) recording wall time as stage_seconds{stage=...}."""
+    return METRICS.timer("stage_seconds", stage=stage)
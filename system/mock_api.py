@@ -0,0 +1,111 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class MockApi:
+    """
+    Local stand-in for the sportdevs tennis API and the-odds-api, serving
+    synthetic payloads (see synthetic.py) on 127.0.0.1.
+
+      /matches/            offset/limit pagination, start_time=gte.<iso>, id=in.(a,b,...)
+      /players-by-team     team_id=eq.<id>
+      /v4/sports/<sport>/odds   with x-requests-* quota headers
+
+    Every `throttle_every`-th request is answered with 429 and Retry-After: 0,
+    so the client's retry path is exercised without slowing the run down.
+    Point a fetcher at it with `fetcher.base_url = api.url + "/"`.
+    """
+    def __init__(self, matches=(), odds=(), players=None, throttle_every=0, port=0):
+        self.matches = list(matches)
+        self.odds = list(odds)
+        self.players = players  # callable team_id -> payload
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._by_id = {match["id"]: match for match in self.matches}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+            throttle = self.throttle_every and self.requests % self.throttle_every == 0
+            if throttle:
+                self.throttled += 1
+            return throttle
+
+    def _matches(self, query):
+        matches = self.matches
+        ids = query.get("id", [""])[0]
+        if ids.startswith("in.("):
+            wanted = [int(i) for i in ids[4:-1].split(",") if i]
+            return [self._by_id[i] for i in wanted if i in self._by_id]
+        since = query.get("start_time", [""])[0]
+        if since.startswith("gte."):
+            matches = [m for m in matches if m["start_time"] >= since[4:]]
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", ["50"])[0])
+        return matches[offset:offset + limit]
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def do_GET(self):
+                if api._count():
+                    return self._send(429, {"message": "Too Many Requests"}, {"Retry-After": "0"})
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                if parts.path.rstrip("/") == "/matches":
+                    return self._send(200, api._matches(query))
+                if parts.path.rstrip("/") == "/players-by-team" and api.players:
+                    team_id = int(query.get("team_id", ["eq.0"])[0].split(".", 1)[1])
+                    return self._send(200, api.players(team_id))
+                if parts.path.startswith("/v4/sports/") and parts.path.endswith("/odds"):
+                    with api._lock:
+                        used = api.requests
+                    return self._send(200, api.odds, {"x-requests-remaining": str(max(0, 500 - used)),
+                                                      "x-requests-used": str(used), "x-requests-last": "1"})
+                return self._send(404, {"message": "Not Found"})
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+
+def fingerprint(X, y, config):
+    """
+    Content hash of the training data and model configuration. Any change to
+    the rows, labels, hyperparameter grid or library versions gives a new key.
+    """
+    import sklearn
+    import xgboost
+
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(X, index=True).values.tobytes())
+    digest.update(np.asarray(list(X.columns), dtype=str).tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    digest.update(f"xgboost={xgboost.__version__};sklearn={sklearn.__version__}".encode())
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Versioned on-disk store for fitted models.
+
+    Each model name gets its own directory under `root` holding one pickle per
+    fingerprint plus an index.json describing every saved version:
+
+        models/xgboost_strategy/index.json
+        models/xgboost_strategy/<fingerprint>.pkl
+    """
+    def __init__(self, root="models"):
+        self.root = root
+
+    def _model_dir(self, name):
+        return os.path.join(self.root, name)
+
+    def _index_path(self, name):
+        return os.path.join(self._model_dir(name), "index.json")
+
+    def versions(self, name):
+        """Metadata for every saved version of `name`, oldest first."""
+        try:
+            with open(self._index_path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def load(self, name, key):
+        """
+        Return (model, metadata) for the version saved under `key`, or
+        (None, None) if there is no such version.
+        """
+        path = os.path.join(self._model_dir(name), f"{key}.pkl")
+        try:
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+        except FileNotFoundError:
+            return None, None
+        metadata = next((v for v in self.versions(name) if v["key"] == key), {"key": key})
+        return model, metadata
+
+    def save(self, name, key, model, metadata=None):
+        os.makedirs(self._model_dir(name), exist_ok=True)
+        # Write to a temp file and rename, so a crash never leaves a truncated model.
+        path = os.path.join(self._model_dir(name), f"{key}.pkl")
+        self._atomic_write(path, pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+        entry = dict(metadata or {})
+        entry["key"] = key
+        entry["created_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        versions = [v for v in self.versions(name) if v["key"] != key]
+        versions.append(entry)
+        self._atomic_write(self._index_path(name), json.dumps(versions, indent=2).encode())
+        return entry
+
+    @staticmethod
+    def _atomic_write(path, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
@@ -0,0 +1,197 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from metrics import timed
+from odds_store import utc_now
+
+# -------------------------------------------------------------------
+# Odds retention: OHLC rollups and raw-quote expiry.
+#
+# Raw quotes older than the retention horizon are folded into odds_bars,
+# one row per (event, bookmaker, market, granularity, bar) with open/high/
+# low/close for both players, and then deleted. Bars never span an event's
+# start: quotes captured before and after commence_time go to separate
+# bars (in_play 0/1), so the close of the last pre-start bar is exactly the
+# closing price, and open/close carry the capture times of the quotes they
+# came from.
+#
+# odds_id grows with captured_at (quotes are stamped at insert time, and
+# insert_tennis_odds refuses backdated snapshots), so progress is tracked as
+# an odds_id watermark in sync_state and every range is a rowid range:
+# rolling up and deleting touch only the rows involved. Each chunk checks
+# that capture times never go backwards before it is rolled up. odds_bars
+# is created by database.py's migration 6.
+# -------------------------------------------------------------------
+
+# Bar sizes in seconds.
+DEFAULT_GRANULARITIES = (60, 3600)
+
+ROLLUP_WATERMARK = "odds_rollup"
+
+# Rolls the raw quotes with odds_id in (?2, ?3] into bars of ?1 seconds.
+# Open and close come from the first and last odds_id of each group. A bar
+# cut in two by a chunk boundary is merged: the later half only extends
+# high/low and replaces the close.
+ROLLUP_QUERY = '''
+INSERT INTO odds_bars
+SELECT g.event_id, g.bookmaker, g.market, ?1, g.bar_start, g.in_play,
+       o.sport_key, o.event_name, o.timestamp,
+       o.odds_player1, g.high1, g.low1, c.odds_player1,
+       o.odds_player2, g.high2, g.low2, c.odds_player2,
+       g.quotes, o.captured_at, c.captured_at
+FROM (
+    SELECT event_id, bookmaker, market,
+           strftime('%Y-%m-%dT%H:%M:%S+00:00',
+                    CAST(strftime('%s', COALESCE(captured_at, timestamp)) AS INTEGER) / ?1 * ?1,
+                    'unixepoch') AS bar_start,
+           COALESCE(julianday(captured_at) > julianday(timestamp), 0) AS in_play,
+           MIN(odds_id) AS open_id, MAX(odds_id) AS close_id,
+           MAX(odds_player1) AS high1, MIN(odds_player1) AS low1,
+           MAX(odds_player2) AS high2, MIN(odds_player2) AS low2,
+           COUNT(*) AS quotes
+    FROM odds
+    WHERE odds_id > ?2 AND odds_id <= ?3
+    GROUP BY event_id, bookmaker, market, bar_start, in_play
+) AS g
+JOIN odds AS o ON o.odds_id = g.open_id
+JOIN odds AS c ON c.odds_id = g.close_id
+WHERE true
+ON CONFLICT (event_id, bookmaker, market, granularity, bar_start, in_play) DO UPDATE SET
+    high1 = MAX(high1, excluded.high1), low1 = MIN(low1, excluded.low1), close1 = excluded.close1,
+    high2 = MAX(high2, excluded.high2), low2 = MIN(low2, excluded.low2), close2 = excluded.close2,
+    quotes = quotes + excluded.quotes,
+    close_captured_at = excluded.close_captured_at
+'''
+
+# Rows in (?1, ?2], and how many of the rows in [?1, ?2] were captured
+# before the row preceding them (the watermark row included, if still there).
+ORDER_CHECK_QUERY = '''
+SELECT COALESCE(SUM(odds_id > ?1), 0), COALESCE(SUM(captured_at < previous), 0)
+FROM (
+    SELECT odds_id, captured_at, LAG(captured_at) OVER (ORDER BY odds_id) AS previous
+    FROM odds
+    WHERE odds_id >= ?1 AND odds_id <= ?2
+)
+'''
+
+
+def rollup_watermark(conn):
+    """Highest odds_id already folded into odds_bars (0 if none)."""
+    row = conn.execute("SELECT watermark FROM sync_state WHERE endpoint = ?", (ROLLUP_WATERMARK,)).fetchone()
+    return int(row[0]) if row and row[0] else 0
+
+
+class OddsCompactor:
+    """
+    Rolls up and expires raw odds history.
+
+    :param db: database.Database holding the odds table.
+    :param retention_days: Raw quotes captured earlier than this are rolled
+        up and deleted. The horizon is aligned down to the largest
+        granularity so every bar is built from complete data.
+    :param granularities: Bar sizes in seconds (default 1 minute and 1 hour).
+    :param chunk_size: odds_id range rolled up per transaction.
+    :param delete_batch: Rows deleted per transaction.
+    :param pause: Seconds to wait between transactions. Every chunk is a
+        short write, and the pause lets concurrent ingest take the write lock.
+    """
+    def __init__(self, db, retention_days=30, granularities=DEFAULT_GRANULARITIES, chunk_size=5000,
+                 delete_batch=5000, pause=0.05):
+        self.db = db
+        self.retention = timedelta(days=retention_days)
+        self.granularities = tuple(sorted(granularities))
+        self.chunk_size = chunk_size
+        self.delete_batch = delete_batch
+        self.pause = pause
+
+    def horizon(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        step = self.granularities[-1]
+        cutoff = int((now - self.retention).timestamp()) // step * step
+        return datetime.fromtimestamp(cutoff, timezone.utc).isoformat(timespec="seconds")
+
+    def _last_id_before(self, conn, horizon):
+        # odds_id order is capture order, so binary-search the rowid for the
+        # last quote captured before the horizon instead of scanning.
+        lo, hi = conn.execute("SELECT COALESCE(MIN(odds_id), 0), COALESCE(MAX(odds_id), 0) FROM odds").fetchone()
+        if not hi:
+            return 0
+        probe = "SELECT odds_id, COALESCE(captured_at, timestamp) FROM odds WHERE odds_id >= ? ORDER BY odds_id LIMIT 1"
+        found = lo - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            row = conn.execute(probe, (mid,)).fetchone()
+            if row is None or row[0] > hi:
+                hi = mid - 1
+            elif row[1] is not None and row[1] < horizon:
+                found = row[0]
+                lo = row[0] + 1
+            else:
+                hi = mid - 1
+        return max(found, 0)
+
+    @timed("odds_rollup")
+    def rollup(self, now=None):
+        """Fold raw quotes older than the horizon into odds_bars. Returns the number of quotes rolled up."""
+        conn = self.db.connection()
+        start = rollup_watermark(conn)
+        end = self._last_id_before(conn, self.horizon(now))
+        rolled = 0
+        while start < end:
+            stop = min(start + self.chunk_size, end)
+            with self.db.transaction(immediate=True):
+                count, backwards = conn.execute(ORDER_CHECK_QUERY, (start, stop)).fetchone()
+                if backwards:
+                    # Bars would merge these quotes in the wrong order, and a
+                    # quote still inside the retention window could be expired.
+                    raise RuntimeError(f"odds {start + 1}..{stop}: {backwards} quotes are older than the quote "
+                                       f"before them; odds_id is out of capture order")
+                rolled += count
+                for granularity in self.granularities:
+                    conn.execute(ROLLUP_QUERY, (granularity, start, stop))
+                conn.execute(
+                    "INSERT INTO sync_state (endpoint, watermark, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(endpoint) DO UPDATE SET watermark = excluded.watermark, "
+                    "updated_at = excluded.updated_at",
+                    (ROLLUP_WATERMARK, str(stop), utc_now())
+                )
+            start = stop
+            if self.pause:
+                time.sleep(self.pause)
+        return rolled
+
+    @timed("odds_expire")
+    def expire(self):
+        """
+        Delete raw quotes that have been rolled up, oldest first, in small
+        batches. Returns the number of rows deleted.
+        """
+        conn = self.db.connection()
+        end = rollup_watermark(conn)
+        start = (conn.execute("SELECT MIN(odds_id) FROM odds").fetchone()[0] or end + 1) - 1
+        deleted = 0
+        while start < end:
+            stop = min(start + self.delete_batch, end)
+            with self.db.transaction(immediate=True):
+                deleted += conn.execute("DELETE FROM odds WHERE odds_id > ? AND odds_id <= ?",
+                                        (start, stop)).rowcount
+            start = stop
+            if self.pause:
+                time.sleep(self.pause)
+        if deleted and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            conn.execute("PRAGMA incremental_vacuum")  # hand freed pages back to the filesystem
+        return deleted
+
+    def compact(self, now=None):
+        """Roll up, then expire. Freed pages are reused by later inserts, so the file stops growing."""
+        rolled = self.rollup(now)
+        deleted = self.expire()
+        print(f"Odds compaction: {rolled} quotes rolled into bars {self.granularities}, "
+              f"{deleted} raw rows deleted.")
+        return rolled, deleted
+
+
+if __name__ == "__main__":
+    from database import Database
+
+    OddsCompactor(Database()).compact()
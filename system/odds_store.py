@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+# -------------------------------------------------------------------
+# Odds history schema.
+#
+# `odds` holds every distinct quote we have seen. `timestamp` is the event's
+# commence_time as sent by the-odds-api; `captured_at` is when we polled it.
+# `odds_latest` keeps the most recent quote per (event, bookmaker, market) and
+# is maintained by a trigger, so suppressing unchanged quotes and answering
+# "latest price" never has to touch the history. The tables are created by
+# database.py's first migration.
+# -------------------------------------------------------------------
+
+# Insert a quote only if it differs from the latest one stored for the same
+# event/bookmaker/market. Parameters are numbered so the row tuple is passed once:
+# (sport_key, event_id, event_name, bookmaker, market, odds_player1, odds_player2,
+#  region, timestamp, captured_at)
+ODDS_INSERT_QUERY = '''
+INSERT INTO odds (
+    sport_key, event_id, event_name, bookmaker, market, odds_player1, odds_player2, region, timestamp, captured_at
+)
+SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10
+WHERE NOT EXISTS (
+    SELECT 1 FROM odds_latest
+    WHERE event_id = ?2 AND bookmaker = ?4 AND market = ?5
+      AND odds_player1 IS ?6 AND odds_player2 IS ?7
+)
+'''
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def parse_time(value):
+    """ISO-8601 timestamp (with or without a trailing Z) -> aware UTC datetime, or None."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class OddsStore:
+    """
+    Read API over the odds history. Both queries are served by index range
+    scans, so their cost depends on the size of one event's history rather
+    than the size of the table.
+
+    :param db: database.Database to read from; queries use its read-only
+        connection so they never block ingest.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def _query(self, query, params):
+        cursor = self.db.read_only().execute(query, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def latest_prices(self, event_id, market="h2h"):
+        """
+        Latest quote per bookmaker for an event, from the odds_latest table.
+        """
+        return self._query('''
+            SELECT bookmaker, market, odds_player1, odds_player2, captured_at
+            FROM odds_latest
+            WHERE event_id = ? AND market = ?
+            ORDER BY bookmaker
+        ''', (event_id, market))
+
+    def price_path(self, event_id, bookmaker=None, market="h2h", since=None, until=None):
+        """
+        Every distinct quote for an event in capture order. Pass `bookmaker`
+        to follow a single book; `since`/`until` bound captured_at.
+        """
+        query = '''
+            SELECT bookmaker, market, odds_player1, odds_player2, captured_at, timestamp AS commence_time
+            FROM odds
+            WHERE event_id = ?
+        '''
+        params = [event_id]
+        if bookmaker is not None:
+            query += " AND bookmaker = ? AND market = ?"
+            params += [bookmaker, market]
+        else:
+            query += " AND market = ?"
+            params.append(market)
+        if since is not None:
+            query += " AND captured_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND captured_at <= ?"
+            params.append(until)
+        query += " ORDER BY captured_at, bookmaker"
+        return self._query(query, params)
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+from metrics import timed
+
+# -------------------------------------------------------------------
+# Simultaneous Kelly sizing for concurrent bets.
+#
+# Sizing every bet on its own Kelly fraction over-bets the bankroll when
+# dozens are open at once. Here all open bets are sized together: the
+# stakes maximize expected log wealth over a fixed set of simulated joint
+# outcomes, subject to per-bet, per-group and total exposure caps.
+# Outcomes within a group (a tournament, a player) can be correlated
+# through a one-factor Gaussian copula. The solver is accelerated
+# projected gradient ascent; every step is a couple of matrix-vector
+# products over the scenarios, so a few hundred markets take milliseconds.
+# -------------------------------------------------------------------
+
+
+def scenario_returns(prob, price, groups=None, correlation=0.0, n_scenarios=2000, seed=0):
+    """
+    (n_scenarios, n_bets) matrix of per-unit-stake returns: price - 1 when
+    a bet wins, -1 when it loses. Bet i wins when its latent normal falls
+    below ndtri(prob[i]); latents share a group factor with weight
+    `correlation`, so bets in the same group win and lose together more
+    often. Assumes at most one side of any event is among the bets.
+    """
+    rng = np.random.default_rng(seed)
+    latent = rng.standard_normal((n_scenarios, len(prob)))
+    if groups is not None and correlation > 0:
+        codes, labels = pd.factorize(np.asarray(groups))
+        common = rng.standard_normal((n_scenarios, len(labels)))
+        latent = np.sqrt(correlation) * common[:, codes] + np.sqrt(1.0 - correlation) * latent
+    won = latent < ndtri(np.clip(prob, 1e-9, 1 - 1e-9))
+    return np.where(won, price - 1.0, -1.0)
+
+
+def _bisect(total, target, lo, hi, iterations=50):
+    # Smallest threshold in [lo, hi] with total(threshold) <= target, for a
+    # non-increasing total(); vectorized over any number of thresholds.
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        over = total(mid) > target
+        lo = np.where(over, mid, lo)
+        hi = np.where(over, hi, mid)
+    return hi
+
+
+def project(values, upper, codes, group_cap, total_cap):
+    """
+    Euclidean projection onto {0 <= f <= upper, per-group sums <= group_cap,
+    sum <= total_cap} for disjoint groups given as integer `codes`.
+
+    The solution is f = clip(values - max(tau, theta[group]), 0, upper):
+    theta is each group's own threshold, tau the total's, both found by
+    bisection.
+    """
+    n_groups = codes.max() + 1 if len(codes) else 0
+    f = np.clip(values, 0.0, upper)
+    theta = np.zeros(n_groups)
+    if group_cap is not None:
+        over = np.bincount(codes, f, n_groups) > group_cap
+        if over.any():
+            high = np.full(n_groups, max(values.max(), 0.0))
+            theta = np.where(over, _bisect(
+                lambda t: np.bincount(codes, np.clip(values - t[codes], 0.0, upper), n_groups),
+                group_cap, np.zeros(n_groups), high), 0.0)
+            f = np.clip(values - theta[codes], 0.0, upper)
+    if total_cap is not None and f.sum() > total_cap:
+        floor = theta[codes]
+        tau = _bisect(lambda t: np.clip(values - np.maximum(t, floor), 0.0, upper).sum(),
+                      total_cap, 0.0, max(values.max(), 0.0))
+        f = np.clip(values - np.maximum(tau, floor), 0.0, upper)
+    return f
+
+
+class KellyOptimizer:
+    """
+    Fractional Kelly stakes for a set of simultaneous bets.
+
+    :param fraction: Kelly multiplier. Full Kelly is solved with every cap
+        divided by `fraction` and the result scaled back, so the returned
+        stakes respect the caps as given.
+    :param max_fraction: Cap per bet, as a fraction of the bankroll.
+    :param max_exposure: Cap on the sum of all stakes.
+    :param group_cap: Cap on the sum of stakes within one group (None: no cap).
+    :param correlation: Outcome correlation within a group, 0 <= rho < 1.
+    :param n_scenarios: Simulated joint outcomes the expectation is taken over.
+    """
+    def __init__(self, fraction=0.5, max_fraction=0.05, max_exposure=0.25, group_cap=None, correlation=0.0,
+                 n_scenarios=2000, max_iter=500, tol=1e-7, seed=0):
+        self.fraction = fraction
+        self.max_fraction = max_fraction
+        self.max_exposure = max_exposure
+        self.group_cap = group_cap
+        self.correlation = correlation
+        self.n_scenarios = n_scenarios
+        self.max_iter = max_iter
+        self.tol = tol
+        self.seed = seed
+        self.iterations = 0
+
+    @timed("kelly")
+    def solve(self, prob, price, groups=None):
+        """
+        Stake per bet as a fraction of the bankroll, aligned with `prob`
+        (model win probabilities) and `price` (best decimal odds). Bets
+        without a positive edge get 0.
+        """
+        prob = np.asarray(prob, dtype=np.float64)
+        price = np.asarray(price, dtype=np.float64)
+        stakes = np.zeros(len(prob))
+        edge = (prob * price > 1.0) & (price > 1.0)
+        if not edge.any():
+            return stakes
+
+        codes = pd.factorize(np.asarray(groups)[edge])[0] if groups is not None else np.arange(edge.sum())
+        # Caps for the full-Kelly problem; total stays below 1 so wealth stays positive.
+        upper = self.max_fraction / self.fraction
+        total_cap = min(self.max_exposure / self.fraction, 0.999)
+        group_cap = self.group_cap / self.fraction if self.group_cap is not None else None
+
+        returns = scenario_returns(prob[edge], price[edge], codes, self.correlation, self.n_scenarios, self.seed)
+        f = self._maximize(returns, upper, codes, group_cap, total_cap)
+        stakes[edge] = f * self.fraction
+        return stakes
+
+    def _maximize(self, returns, upper, codes, group_cap, total_cap):
+        # FISTA with backtracking: L is a local curvature estimate of the
+        # log-growth objective, doubled until the quadratic bound holds and
+        # relaxed a little every step; momentum restarts when growth drops.
+        n = len(returns)
+
+        def growth(f):
+            wealth = 1.0 + returns @ f
+            return np.log(wealth).mean() if wealth.min() > 0 else -np.inf
+
+        L = max(np.square(returns).sum() / n / returns.shape[1], 1e-12)
+        f = project(np.zeros(returns.shape[1]), upper, codes, group_cap, total_cap)
+        y, t, value = f, 1.0, growth(f)
+        for self.iterations in range(1, self.max_iter + 1):
+            wealth = 1.0 + returns @ y
+            if wealth.min() <= 0:  # momentum overshot into ruin; step from f instead
+                y, t, wealth = f, 1.0, 1.0 + returns @ f
+            at_y = np.log(wealth).mean()
+            gradient = returns.T @ (1.0 / wealth) / n
+            while True:
+                f_next = project(y + gradient / L, upper, codes, group_cap, total_cap)
+                step = f_next - y
+                next_value = growth(f_next)
+                if next_value >= at_y + gradient @ step - 0.5 * L * (step @ step):
+                    break
+                L *= 2.0
+            if next_value < value:
+                y, t = f, 1.0  # restart momentum from the better point
+                continue
+            t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+            y = f_next + ((t - 1.0) / t_next) * (f_next - f)
+            converged = np.abs(f_next - f).max() < self.tol
+            f, t, value = f_next, t_next, next_value
+            L *= 0.9
+            if converged:
+                break
+        return f
+
+    def expected_growth(self, stakes, prob, price, groups=None):
+        """Expected log growth of the bankroll for the given stakes, over fresh scenarios."""
+        stakes, prob, price = (np.asarray(a, dtype=np.float64) for a in (stakes, prob, price))
+        returns = scenario_returns(prob, price, groups, self.correlation, self.n_scenarios, self.seed + 1)
+        return float(np.log1p(returns @ stakes).mean())
@@ -0,0 +1,169 @@
+import pandas as pd
+
+from database import MATCH_SUMMARY_COLUMNS
+from odds_store import utc_now
+
+# -------------------------------------------------------------------
+# Typed read queries over matches and player_stats.
+#
+# Each query reads through the read-only connection and returns a pandas
+# DataFrame with fixed column dtypes, so callers get NumPy columns instead
+# of row tuples. Every query is registered in QUERY_PLANS with sample
+# parameters; check_query_plans() runs EXPLAIN QUERY PLAN over them and
+# fails if any one of them falls back to a full table scan.
+# -------------------------------------------------------------------
+
+MATCH_DTYPES = {
+    "id": "int64",
+    "start_time": "datetime64[ns, UTC]",
+    "status_type": "string",
+    "ground_type": "string",
+    "tournament_id": "Int64",
+    "home_team_id": "Int64",
+    "away_team_id": "Int64",
+    "home_team_score_current": "Int64",
+    "away_team_score_current": "Int64",
+}
+
+PLAYER_STATS_DTYPES = {
+    "player_id": "int64",
+    "player_name": "string",
+    "team_id": "Int64",
+    "age": "Int64",
+    "win_rate": "float64",
+    "court_win_rate": "float64",
+    "weather_win_rate": "float64",
+}
+
+_MATCH_SELECT = f"SELECT {', '.join(MATCH_SUMMARY_COLUMNS)} FROM matches"
+
+# The two sides of a match are indexed separately; a UNION ALL lets each
+# half run as a range search on its own index, where an OR would not.
+PLAYER_MATCHES_QUERY = f'''
+{_MATCH_SELECT} WHERE home_team_id = :player_id AND start_time >= :start AND start_time < :end
+UNION ALL
+{_MATCH_SELECT} WHERE away_team_id = :player_id AND start_time >= :start AND start_time < :end
+ORDER BY start_time
+'''
+
+SURFACE_MATCHES_QUERY = f'''
+{_MATCH_SELECT} WHERE ground_type = :ground_type AND start_time >= :start AND start_time < :end
+ORDER BY start_time
+'''
+
+TOURNAMENT_MATCHES_QUERY = f'''
+{_MATCH_SELECT} WHERE tournament_id = :tournament_id
+ORDER BY start_time
+'''
+
+UPCOMING_MATCHES_QUERY = f'''
+{_MATCH_SELECT} WHERE start_time >= :now
+ORDER BY start_time
+LIMIT :limit
+'''
+
+TEAM_PLAYERS_QUERY = f'''
+SELECT {', '.join(PLAYER_STATS_DTYPES)} FROM player_stats WHERE team_id = :team_id
+'''
+
+# name -> (query, sample parameters used for the plan check)
+QUERY_PLANS = {
+    "matches_for_player": (PLAYER_MATCHES_QUERY, {"player_id": 0, "start": "", "end": ""}),
+    "matches_by_surface": (SURFACE_MATCHES_QUERY, {"ground_type": "", "start": "", "end": ""}),
+    "matches_for_tournament": (TOURNAMENT_MATCHES_QUERY, {"tournament_id": 0}),
+    "upcoming_matches": (UPCOMING_MATCHES_QUERY, {"now": "", "limit": 1}),
+    "players_for_team": (TEAM_PLAYERS_QUERY, {"team_id": 0}),
+}
+
+# Bounds used when a date range is left open. ISO timestamps sort as text.
+_MIN_TIME = ""
+_MAX_TIME = "9999"
+
+
+class QueryPlanError(RuntimeError):
+    """A registered query no longer runs off an index."""
+
+
+def _frame(db, query, params, dtypes):
+    cursor = db.read_only().execute(query, params)
+    columns = [c[0] for c in cursor.description]
+    frame = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    for column, dtype in dtypes.items():
+        if dtype.startswith("datetime64"):
+            frame[column] = pd.to_datetime(frame[column], utc=True, errors="coerce", format="ISO8601")
+        else:
+            frame[column] = frame[column].astype(dtype)
+    return frame
+
+
+def _bound(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value
+    return pd.Timestamp(value).isoformat()
+
+
+def matches_for_player(db, player_id, start=None, end=None):
+    """
+    Matches the player took part in on either side, with start_time in
+    [start, end), oldest first. Bounds may be ISO strings or datetimes.
+    """
+    return _frame(db, PLAYER_MATCHES_QUERY, {
+        "player_id": player_id, "start": _bound(start, _MIN_TIME), "end": _bound(end, _MAX_TIME),
+    }, MATCH_DTYPES)
+
+
+def matches_by_surface(db, ground_type, start=None, end=None):
+    """Matches played on `ground_type` with start_time in [start, end), oldest first."""
+    return _frame(db, SURFACE_MATCHES_QUERY, {
+        "ground_type": ground_type, "start": _bound(start, _MIN_TIME), "end": _bound(end, _MAX_TIME),
+    }, MATCH_DTYPES)
+
+
+def matches_for_tournament(db, tournament_id):
+    """Every stored match of a tournament, oldest first."""
+    return _frame(db, TOURNAMENT_MATCHES_QUERY, {"tournament_id": tournament_id}, MATCH_DTYPES)
+
+
+def upcoming_matches(db, now=None, limit=100):
+    """The next `limit` matches starting at or after `now` (default: the current UTC time)."""
+    return _frame(db, UPCOMING_MATCHES_QUERY, {
+        "now": _bound(now, utc_now()), "limit": limit,
+    }, MATCH_DTYPES)
+
+
+def players_for_team(db, team_id):
+    """player_stats rows for a team."""
+    return _frame(db, TEAM_PLAYERS_QUERY, {"team_id": team_id}, PLAYER_STATS_DTYPES)
+
+
+def query_plan(db, name):
+    """EXPLAIN QUERY PLAN detail lines for a registered query."""
+    query, params = QUERY_PLANS[name]
+    return [row[3] for row in db.read_only().execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def check_query_plans(db):
+    """
+    Raise QueryPlanError if any registered query scans matches or
+    player_stats instead of searching an index. Returns the plans checked.
+    """
+    plans = {name: query_plan(db, name) for name in QUERY_PLANS}
+    regressions = {
+        name: detail for name, details in plans.items() for detail in details
+        if detail.startswith(("SCAN matches", "SCAN player_stats"))
+    }
+    if regressions:
+        lines = "\n".join(f"  {name}: {detail}" for name, detail in regressions.items())
+        raise QueryPlanError(f"Queries fell back to a table scan:\n{lines}")
+    return plans
+
+
+if __name__ == "__main__":
+    from database import Database
+
+    db = Database()
+    for name, details in check_query_plans(db).items():
+        print(f"{name}: {'; '.join(details)}")
+    print("All registered queries use an index.")
@@ -0,0 +1,246 @@
+import bisect
+from array import array
+
+import numpy as np
+
+from features import SETTLED_STATUSES
+from metrics import timed
+
+# Matches with a result: settled and both scores in.
+_RESULT_FILTER = f'''
+status_type IN ({", ".join("?" for _ in SETTLED_STATUSES)})
+AND home_team_score_current IS NOT NULL AND away_team_score_current IS NOT NULL
+'''
+
+RESULTS_QUERY = f'''
+SELECT start_time, id, home_team_id, away_team_id, ground_type,
+       home_team_score_current, away_team_score_current
+FROM matches
+WHERE start_time >= ? AND start_time <= ? AND {_RESULT_FILTER}
+ORDER BY start_time, id
+'''
+
+# Results at or before a (start_time, id) position in replay order.
+RESULTS_THROUGH_QUERY = f'''
+SELECT COUNT(*) FROM matches
+WHERE (start_time < ? OR (start_time = ? AND id <= ?)) AND {_RESULT_FILTER}
+'''
+
+
+class EloRatings:
+    """
+    Surface-aware Elo ratings replayed from the matches table.
+
+    Every player gets an overall rating and one rating per ground_type, held
+    in flat typed arrays indexed by a dense slot per player id, so one match
+    is a constant-time update on plain floats. The K-factor shrinks with the
+    number of matches a player has played
+    (K = k_base / (matches + k_offset) ** k_shape), which lets newcomers
+    converge quickly and keeps established ratings stable. A player's
+    surface strength is the mean of the overall and surface ratings, since
+    surface ratings alone are built from fewer matches.
+
+    replay() stores a checkpoint of the full state every `checkpoint_every`
+    matches; ratings_at(timestamp) restores the nearest earlier checkpoint
+    and replays only the matches after it. Checkpoints live in memory only,
+    so a new process starts with a full replay.
+
+    A result can arrive after later matches were applied (a match settled
+    late, or its scores came in late). replay() notices because fewer
+    results were applied than the table now holds up to the last applied
+    position; it then rewinds to the latest checkpoint still consistent
+    with the table and replays from there, so incremental and full replays
+    always agree.
+    """
+    def __init__(self, initial=1500.0, k_base=250.0, k_offset=5.0, k_shape=0.4, checkpoint_every=5000):
+        self.initial = initial
+        self.k_base = k_base
+        self.k_offset = k_offset
+        self.k_shape = k_shape
+        self.checkpoint_every = checkpoint_every
+        self.slots = {}      # player_id -> index into the arrays below
+        self.surfaces = {}   # ground_type -> index into surface_rating / surface_matches
+        self.rating = array("d")
+        self.matches = array("q")
+        self.surface_rating = []   # one array("d") per ground_type
+        self.surface_matches = []  # one array("q") per ground_type
+        self.last_applied = ("", -1)  # (start_time, id) of the last match applied
+        self.checkpoints = []         # [(start_time, id, state, applied)] in time order
+        self.applied = 0              # results read up to last_applied
+        self._since_checkpoint = 0
+        self._k_table = []
+
+    # --- state ---------------------------------------------------------
+
+    def _slot(self, player_id):
+        slot = self.slots.get(player_id)
+        if slot is None:
+            slot = self.slots[player_id] = len(self.rating)
+            self.rating.append(self.initial)
+            self.matches.append(0)
+            for ratings, matches in zip(self.surface_rating, self.surface_matches):
+                ratings.append(self.initial)
+                matches.append(0)
+        return slot
+
+    def _surface(self, ground_type):
+        column = self.surfaces.get(ground_type)
+        if column is None:
+            column = self.surfaces[ground_type] = len(self.surface_rating)
+            self.surface_rating.append(array("d", [self.initial]) * len(self.rating))
+            self.surface_matches.append(array("q", [0]) * len(self.rating))
+        return column
+
+    def _state(self):
+        return self._copy((self.slots, self.surfaces, self.rating, self.matches,
+                           self.surface_rating, self.surface_matches))
+
+    def _restore(self, state, last_applied, applied=0):
+        self.slots, self.surfaces, self.rating, self.matches, self.surface_rating, self.surface_matches = \
+            self._copy(state)
+        self.last_applied = last_applied
+        self.applied = applied
+
+    @staticmethod
+    def _copy(state):
+        slots, surfaces, rating, matches, surface_rating, surface_matches = state
+        return (dict(slots), dict(surfaces), array("d", rating), array("q", matches),
+                [array("d", a) for a in surface_rating], [array("q", a) for a in surface_matches])
+
+    def as_arrays(self):
+        """
+        The current state as NumPy arrays aligned by slot: (player_ids,
+        rating, matches, {ground_type: surface rating}). These are copies;
+        a view would pin the typed arrays and stop them from growing.
+        """
+        player_ids = np.fromiter(self.slots, dtype=np.int64, count=len(self.slots))
+        surface = {ground: np.array(self.surface_rating[column], dtype=np.float64)
+                   for ground, column in self.surfaces.items()}
+        return (player_ids, np.array(self.rating, dtype=np.float64),
+                np.array(self.matches, dtype=np.int64), surface)
+
+    # --- updates -------------------------------------------------------
+
+    def _k(self, played):
+        table = self._k_table
+        while played >= len(table):
+            table.append(self.k_base / (len(table) + self.k_offset) ** self.k_shape)
+        return table[played]
+
+    def update(self, home_id, away_id, ground_type, home_won):
+        """Apply one result. Constant time in the number of players and matches."""
+        h, a = self._slot(home_id), self._slot(away_id)
+        rating, matches = self.rating, self.matches
+        delta = float(home_won) - 1.0 / (1.0 + 10.0 ** ((rating[a] - rating[h]) / 400.0))
+        rating[h] += self._k(matches[h]) * delta
+        rating[a] -= self._k(matches[a]) * delta
+        matches[h] += 1
+        matches[a] += 1
+
+        if ground_type:
+            s = self._surface(ground_type)
+            rating, matches = self.surface_rating[s], self.surface_matches[s]
+            delta = float(home_won) - 1.0 / (1.0 + 10.0 ** ((rating[a] - rating[h]) / 400.0))
+            rating[h] += self._k(matches[h]) * delta
+            rating[a] -= self._k(matches[a]) * delta
+            matches[h] += 1
+            matches[a] += 1
+
+    def _apply_rows(self, rows, checkpoint):
+        for start_time, match_id, home, away, ground, home_score, away_score in rows:
+            self.last_applied = (start_time, match_id)
+            self.applied += 1
+            if home is None or away is None or home_score is None or away_score is None \
+                    or home_score == away_score:
+                continue
+            self.update(home, away, ground, home_score > away_score)
+            if checkpoint:
+                self._since_checkpoint += 1
+                if self._since_checkpoint >= self.checkpoint_every:
+                    self.checkpoints.append((start_time, match_id, self._state(), self.applied))
+                    self._since_checkpoint = 0
+
+    @timed("ratings")
+    def replay(self, db, until="9999", chunk_size=10000):
+        """
+        Apply every settled match after the last one applied, up to `until`,
+        in start-time order, checkpointing along the way. Call it again as
+        new results arrive to update the ratings incrementally. Returns the
+        number of matches read.
+        """
+        if self.applied != self._results_through(db, self.last_applied):
+            self._rewind(db)
+        cursor = db.read_only().execute(RESULTS_QUERY, (self.last_applied[0], until, *SETTLED_STATUSES))
+        # Matches sharing the last applied start_time were read last time.
+        last_time, last_id = self.last_applied
+        count = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return count
+            if last_time and rows[0][0] == last_time:
+                rows = [row for row in rows if row[0] != last_time or row[1] > last_id]
+            self._apply_rows(rows, checkpoint=True)
+            count += len(rows)
+
+    def _results_through(self, db, position):
+        start_time, match_id = position
+        return db.read_only().execute(RESULTS_THROUGH_QUERY,
+                                      (start_time, start_time, match_id, *SETTLED_STATUSES)).fetchone()[0]
+
+    def _rewind(self, db):
+        # Checkpoints before the late result still agree with the table and
+        # those after it do not, so binary-search for the last good one.
+        lo, hi = 0, len(self.checkpoints)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start_time, match_id, _, applied = self.checkpoints[mid]
+            if self._results_through(db, (start_time, match_id)) == applied:
+                lo = mid + 1
+            else:
+                hi = mid
+        del self.checkpoints[lo:]
+        if self.checkpoints:
+            start_time, match_id, state, applied = self.checkpoints[-1]
+            self._restore(state, (start_time, match_id), applied)
+        else:
+            self._restore(({}, {}, array("d"), array("q"), [], []), ("", -1))
+        self._since_checkpoint = 0
+
+    def ratings_at(self, timestamp, db):
+        """
+        A new EloRatings holding every player's ratings as of `timestamp`
+        (ISO string): the nearest checkpoint at or before it, plus the
+        matches between the two.
+        """
+        index = bisect.bisect_right([cp[0] for cp in self.checkpoints], timestamp)
+        snapshot = EloRatings(self.initial, self.k_base, self.k_offset, self.k_shape, self.checkpoint_every)
+        if index:
+            start_time, match_id, state, _ = self.checkpoints[index - 1]
+            snapshot._restore(state, (start_time, match_id))
+        cursor = db.read_only().execute(RESULTS_QUERY, (snapshot.last_applied[0], timestamp, *SETTLED_STATUSES))
+        last_time, last_id = snapshot.last_applied
+        rows = [row for row in cursor if not (row[0] == last_time and row[1] <= last_id)]
+        snapshot._apply_rows(rows, checkpoint=False)
+        return snapshot
+
+    # --- lookups -------------------------------------------------------
+
+    def player_rating(self, player_id, ground_type=None):
+        """Overall rating, or the blended surface rating when ground_type is given."""
+        slot = self.slots.get(player_id)
+        if slot is None:
+            return self.initial
+        if ground_type is None or ground_type not in self.surfaces:
+            return self.rating[slot]
+        return 0.5 * (self.rating[slot] + self.surface_rating[self.surfaces[ground_type]][slot])
+
+    def win_probability(self, home_id, away_id, ground_type=None):
+        """Elo probability that home_id beats away_id."""
+        diff = self.player_rating(away_id, ground_type) - self.player_rating(home_id, ground_type)
+        return 1.0 / (1.0 + 10.0 ** (diff / 400.0))
+
+    def table(self):
+        """Current ratings as {player_id: (rating, matches)}."""
+        return {player_id: (self.rating[slot], self.matches[slot])
+                for player_id, slot in self.slots.items()}
@@ -0,0 +1,253 @@
+import re
+import unicodedata
+from datetime import timedelta
+
+from metrics import timed
+from odds_store import parse_time, utc_now
+
+# -------------------------------------------------------------------
+# Entity resolution between the-odds-api and sportdevs.
+#
+# Odds events carry only an opaque id and two player names; matches and
+# player_stats use sportdevs numeric ids. Names are normalized (accents,
+# case, punctuation, "Last, First") and indexed by token, so resolving a
+# name only scores the players sharing a rare token with it (blocking)
+# rather than every known player. An event resolves to the match between
+# its two players that starts closest to commence_time within a window.
+# Results are cached in event_matches and player_aliases (created by
+# database.py's migration 5), so an event or name is resolved once.
+# -------------------------------------------------------------------
+
+# Every sportdevs (team id, name); in tennis a "team" is the player.
+KNOWN_PLAYERS_QUERY = '''
+SELECT home_team_id, home_team_name FROM matches WHERE home_team_id IS NOT NULL
+UNION
+SELECT away_team_id, away_team_name FROM matches WHERE away_team_id IS NOT NULL
+UNION
+SELECT team_id, player_name FROM player_stats WHERE team_id IS NOT NULL
+'''
+
+WINDOW_MATCHES_QUERY = '''
+SELECT id, home_team_id, away_team_id, start_time FROM matches
+WHERE start_time >= ? AND start_time <= ?
+'''
+
+# Stored odds events without a mapping; names come from each event's latest quote.
+UNRESOLVED_EVENTS_QUERY = '''
+SELECT l.event_id, MAX(o.event_name), MAX(o.timestamp)
+FROM odds_latest AS l
+LEFT JOIN event_matches AS e ON e.event_id = l.event_id
+JOIN odds AS o ON o.odds_id = l.odds_id
+WHERE e.event_id IS NULL AND l.event_id IS NOT NULL
+GROUP BY l.event_id
+'''
+
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name):
+    """'Müller, Jan-Lennard' -> 'jan lennard muller'."""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    if "," in text:
+        last, _, first = text.partition(",")
+        text = f"{first} {last}"
+    return " ".join(_NON_ALNUM.sub(" ", text.lower()).split())
+
+
+def _tokens_match(a, b):
+    # Equal, or one is a one-letter initial of the other, on either side.
+    return a == b or (len(a) == 1 and b[0] == a) or (len(b) == 1 and a[0] == b)
+
+
+def _similarity(query, candidate):
+    # Overlap of the shorter name: the share of its tokens found in the
+    # other name, so "nadal" and "rafael nadal" or "alex de minaur" and
+    # "de minaur a" score 1. At least one full token must agree; initials
+    # alone match nothing.
+    shorter, longer = (query, candidate) if len(query) <= len(candidate) else (candidate, query)
+    matched = sum(1 for token in shorter if any(_tokens_match(token, other) for other in longer))
+    if not any(len(token) > 1 and token in longer for token in shorter):
+        return 0.0
+    return matched / len(shorter)
+
+
+def event_players(event):
+    """The two player names of an odds event (payload dict), in odds order."""
+    teams = event.get("teams") or []
+    if len(teams) == 2:
+        return teams[0], teams[1]
+    if event.get("home_team") and event.get("away_team"):
+        return event["home_team"], event["away_team"]
+    name = event.get("event_name") or ""
+    if " vs " in name:
+        first, _, second = name.partition(" vs ")
+        return first, second
+    return None
+
+
+class EntityResolver:
+    """
+    Maps odds events to matches.id and player names to sportdevs team ids.
+
+    :param db: database.Database with matches/player_stats and the
+        resolution tables.
+    :param window_hours: How far start_time may be from commence_time.
+    :param min_score: Minimum name similarity (0..1) to accept a player. A
+        name that scores equally well for two players (a bare "Murray") is
+        ambiguous and resolves to nothing.
+    :param max_block: Tokens shared by more players than this are too
+        common to block on (e.g. "de"); they still count when scoring.
+    """
+    def __init__(self, db, window_hours=36, min_score=0.75, max_block=200):
+        self.db = db
+        self.window = timedelta(hours=window_hours)
+        self.min_score = min_score
+        self.max_block = max_block
+        self.names = {}     # team id -> normalized name tokens
+        self.exact = {}     # normalized name -> team id
+        self.postings = {}  # token -> set of team ids
+        self.aliases = {}   # normalized alias -> (team id, score)
+        self._loaded = False
+
+    def load(self):
+        """Build the name index from matches/player_stats and read the alias cache."""
+        conn = self.db.read_only()
+        self.names, self.exact, self.postings = {}, {}, {}
+        for team_id, name in conn.execute(KNOWN_PLAYERS_QUERY):
+            self.add_player(team_id, name)
+        self.aliases = {alias: (team_id, score) for alias, team_id, score in
+                        conn.execute("SELECT alias, team_id, score FROM player_aliases")}
+        self._loaded = True
+        return len(self.names)
+
+    def add_player(self, team_id, name):
+        key = normalize_name(name)
+        if not key:
+            return
+        tokens = frozenset(key.split())
+        self.names[team_id] = self.names.get(team_id, frozenset()) | tokens
+        self.exact.setdefault(key, team_id)
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(team_id)
+
+    def resolve_name(self, name):
+        """(team id, score) for a player name, or None if nothing, or more than one player, scores best."""
+        if not self._loaded:
+            self.load()
+        key = normalize_name(name)
+        if not key:
+            return None
+        if key in self.aliases:
+            return self.aliases[key]
+        if key in self.exact:
+            return self.exact[key], 1.0
+        tokens = key.split()
+        blocks = [self.postings[t] for t in tokens if len(t) > 1 and t in self.postings]
+        selective = [block for block in blocks if len(block) <= self.max_block]
+        candidates = set().union(*(selective or blocks)) if blocks else set()
+        best, tied = None, False
+        query = frozenset(tokens)
+        for team_id in candidates:
+            score = _similarity(query, self.names[team_id])
+            if best is None or score > best[1]:
+                best, tied = (team_id, score), False
+            elif score == best[1]:
+                tied = True
+        return best if best and best[1] >= self.min_score and not tied else None
+
+    @timed("resolve")
+    def resolve(self, odds_data):
+        """
+        Resolve every event of an odds payload (the-odds-api JSON, or dicts
+        with id/event_name/commence_time) to a match. Returns {event_id:
+        (match_id, player1_is_home)} for the events that resolved; cached
+        mappings are reused and new ones are stored.
+        """
+        if not self._loaded:
+            self.load()
+        events = {event.get("id"): event for event in odds_data if event.get("id")}
+        if not events:
+            return {}
+        resolved = self._cached(list(events))
+
+        pending = []
+        for event_id, event in events.items():
+            if event_id in resolved:
+                continue
+            players = event_players(event)
+            start = parse_time(event.get("commence_time"))
+            if players is None or start is None:
+                continue
+            first, second = self.resolve_name(players[0]), self.resolve_name(players[1])
+            if first and second and first[0] != second[0]:
+                pending.append((event_id, start, first, second, players))
+        if not pending:
+            return resolved
+
+        # One range scan covers every pending event's window.
+        pairs = self._window_pairs(min(p[1] for p in pending) - self.window,
+                                   max(p[1] for p in pending) + self.window)
+        mappings, aliases = [], []
+        for event_id, start, (team1, score1), (team2, score2), players in pending:
+            found = None
+            for match_id, home, match_start in pairs.get(frozenset((team1, team2)), ()):
+                distance = abs(match_start - start)
+                if distance <= self.window and (found is None or distance < found[0]):
+                    found = (distance, match_id, home == team1)
+            if found is None:
+                continue
+            _, match_id, player1_is_home = found
+            resolved[event_id] = (match_id, player1_is_home)
+            mappings.append((event_id, match_id, int(player1_is_home), min(score1, score2), utc_now()))
+            for name, team_id, score in ((players[0], team1, score1), (players[1], team2, score2)):
+                alias = normalize_name(name)
+                if alias not in self.aliases:
+                    self.aliases[alias] = (team_id, score)
+                    aliases.append((alias, team_id, score, utc_now()))
+        self._store(mappings, aliases)
+        return resolved
+
+    def resolve_stored(self):
+        """
+        Resolve every stored event that has no mapping yet. Returns how many
+        resolved. Events are read from odds_latest (one row per event and
+        bookmaker, not the whole history) anti-joined to event_matches on
+        its primary key.
+        """
+        rows = self.db.read_only().execute(UNRESOLVED_EVENTS_QUERY).fetchall()
+        resolved = self.resolve([{"id": event_id, "event_name": name, "commence_time": commence}
+                                 for event_id, name, commence in rows])
+        return len(resolved)
+
+    def _cached(self, event_ids):
+        conn = self.db.read_only()
+        cached = {}
+        for i in range(0, len(event_ids), 500):
+            chunk = event_ids[i:i + 500]
+            cached.update(
+                (event_id, (match_id, bool(player1_is_home)))
+                for event_id, match_id, player1_is_home in conn.execute(
+                    f"SELECT event_id, match_id, player1_is_home FROM event_matches "
+                    f"WHERE event_id IN ({', '.join('?' for _ in chunk)})", chunk)
+            )
+        return cached
+
+    def _window_pairs(self, start, end):
+        pairs = {}
+        # Bounds without an offset sort correctly against stored '+00:00' and 'Z' times.
+        bounds = (start.strftime("%Y-%m-%dT%H:%M:%S"), end.strftime("%Y-%m-%dT%H:%M:%S~"))
+        for match_id, home, away, start_time in self.db.read_only().execute(WINDOW_MATCHES_QUERY, bounds):
+            moment = parse_time(start_time)
+            if home is not None and away is not None and moment is not None:
+                pairs.setdefault(frozenset((home, away)), []).append((match_id, home, moment))
+        return pairs
+
+    def _store(self, mappings, aliases):
+        conn = self.db.connection()
+        with self.db.transaction():
+            conn.executemany("INSERT OR REPLACE INTO event_matches VALUES (?, ?, ?, ?, ?)", mappings)
+            conn.executemany("INSERT OR IGNORE INTO player_aliases VALUES (?, ?, ?, ?)", aliases)
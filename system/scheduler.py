@@ -0,0 +1,201 @@
+import asyncio
+import calendar
+import functools
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from data_fetcher import API_KEY, FINAL_STATUSES, TennisFetcher
+from data_pipeline import fetch_odds, initialize_db, insert_tennis_odds
+from http_client import HttpClient
+from metrics import METRICS
+from odds_store import parse_time
+from resolution import EntityResolver
+
+# -------------------------------------------------------------------
+# Long-running polling scheduler.
+#
+# Instead of cron at a fixed interval, each event gets its own poll interval:
+# far-off events are polled rarely, events close to their start more often,
+# and events in play at the live interval. The odds endpoint returns every
+# event of the sport in one request, so the most urgent event sets the odds
+# cadence; match refreshes are per match, batched into one id=in.(...)
+# request per poll. The odds cadence is also stretched so the remaining
+# monthly quota lasts until it resets.
+# -------------------------------------------------------------------
+
+
+def poll_interval(seconds_to_start, min_interval=60, max_interval=3600, live_interval=30, lead_factor=0.05):
+    """
+    Seconds until an event should be polled again. Before the start this is
+    `lead_factor` of the time left (24h out -> 72 min, 1h out -> 3 min),
+    clamped to [min_interval, max_interval]; once started it is live_interval.
+    """
+    if seconds_to_start <= 0:
+        return live_interval
+    return min(max_interval, max(min_interval, seconds_to_start * lead_factor))
+
+
+class QuotaBudget:
+    """
+    Spreads the remaining API credits over the time left until the quota
+    resets (on `reset_day` of each month, UTC, or the month's last day if
+    it is shorter), keeping `reserve` of the plan back for manual use.
+    min_gap() is the shortest spacing between requests that stays within
+    budget; 0 when the API reports no quota.
+    """
+    def __init__(self, quota, reset_day=1, reserve=0.05):
+        self.quota = quota
+        self.reset_day = reset_day
+        self.reserve = reserve
+
+    def _reset_in(self, year, month, tzinfo):
+        # A reset_day past the end of a short month falls on its last day.
+        day = min(self.reset_day, calendar.monthrange(year, month)[1])
+        return datetime(year, month, day, tzinfo=tzinfo)
+
+    def next_reset(self, now):
+        reset = self._reset_in(now.year, now.month, now.tzinfo)
+        if reset <= now:
+            month = now.month % 12 + 1
+            reset = self._reset_in(now.year + (month == 1), month, now.tzinfo)
+        return reset
+
+    def min_gap(self, now):
+        remaining = self.quota.remaining
+        if remaining is None:
+            return 0.0
+        seconds_left = (self.next_reset(now) - now).total_seconds()
+        usable = remaining - self.reserve * (remaining + (self.quota.used or 0))
+        if usable < 1:
+            return seconds_left
+        return seconds_left * (self.quota.last_cost or 1) / usable
+
+
+class PollingScheduler:
+    """
+    Polls odds and sportdevs matches at adaptive, quota-aware intervals
+    until stop() is called (or `duration` seconds pass).
+
+    Blocking fetches run in worker threads via asyncio.to_thread, so the
+    two pollers proceed independently. A failed poll (including a 429 that
+    outlasted the client's own retries) backs that poller off exponentially,
+    up to max_backoff seconds; the next success resets it. New matches are
+    discovered with sync_matches() every `discovery_interval` seconds.
+    Every odds poll also maps its events to matches (resolution.py), so
+    backtests can settle them without writing.
+
+    Both default clients bypass the HTTP response cache: its lifetimes
+    (60 s for odds, 300 s for matches) are longer than the live interval,
+    so a cached client would answer most due polls with stale data.
+    """
+    def __init__(self, db=None, fetcher=None, odds_fetch=None, odds_quota=None,
+                 min_interval=60, max_interval=3600, live_interval=30, lead_factor=0.05,
+                 live_window=4 * 3600, discovery_interval=6 * 3600, max_backoff=900,
+                 quota_reset_day=1, quota_reserve=0.05, bus=None):
+        self.db = db if db is not None else initialize_db()
+        self.fetcher = fetcher if fetcher is not None else TennisFetcher(API_KEY, db=self.db, cache=False)
+        self.odds_client = HttpClient()
+        self.odds_fetch = odds_fetch or functools.partial(fetch_odds, client=self.odds_client)
+        self.bus = bus  # event_bus.EventBus: publish instead of writing to SQLite directly
+        self.budget = QuotaBudget(odds_quota if odds_quota is not None else self.odds_client.quota,
+                                  reset_day=quota_reset_day, reserve=quota_reserve)
+        self.intervals = dict(min_interval=min_interval, max_interval=max_interval,
+                              live_interval=live_interval, lead_factor=lead_factor)
+        self.live_window = live_window
+        self.discovery_interval = discovery_interval
+        self.max_backoff = max_backoff
+        self.events = {}     # odds event id -> commence time
+        self.match_due = {}  # match id -> monotonic time of its next refresh
+        self.failures = {}
+        self.resolver = EntityResolver(self.db)
+        self._next_discovery = 0.0
+        self._stopped = None
+
+    def interval(self, start, now):
+        return poll_interval((start - now).total_seconds(), **self.intervals)
+
+    async def poll_odds(self):
+        """One odds poll. Returns the seconds to wait before the next one."""
+        odds = await asyncio.to_thread(self.odds_fetch)
+        if odds is None:
+            raise RuntimeError("odds poll failed")
+        await asyncio.to_thread(insert_tennis_odds, odds, self.db, bus=self.bus)
+        await asyncio.to_thread(self.resolver.resolve, odds)
+        now = datetime.now(timezone.utc)
+        horizon = now - timedelta(seconds=self.live_window)
+        self.events = {event.get("id"): start for event in odds
+                       if (start := parse_time(event.get("commence_time"))) and start > horizon}
+        delay = min((self.interval(start, now) for start in self.events.values()),
+                    default=self.intervals["max_interval"])
+        return max(delay, self.budget.min_gap(now))
+
+    async def poll_matches(self):
+        """Refresh the matches that are due. Returns the seconds until the next one is."""
+        if time.monotonic() >= self._next_discovery:
+            await asyncio.to_thread(self.fetcher.sync_matches)
+            await asyncio.to_thread(self.resolver.load)  # pick up newly discovered players
+            self._next_discovery = time.monotonic() + self.discovery_interval
+
+        now = datetime.now(timezone.utc)
+        tracked = await asyncio.to_thread(self._open_matches, now)
+        # Matches due within half the minimum interval ride along, so refreshes batch up.
+        clock = time.monotonic()
+        slack = self.intervals["min_interval"] / 2
+        due = [match_id for match_id in tracked if self.match_due.get(match_id, 0.0) <= clock + slack]
+        if due:
+            await asyncio.to_thread(self.fetcher.refresh_matches, due, bus=self.bus)
+            METRICS.inc("scheduler_refreshed_total", len(due), source="matches")
+        clock = time.monotonic()
+        for match_id in due:
+            self.match_due[match_id] = clock + self.interval(tracked[match_id], now)
+        self.match_due = {match_id: at for match_id, at in self.match_due.items() if match_id in tracked}
+        next_due = min(self.match_due.values(), default=clock + self.intervals["max_interval"])
+        return max(0.0, min(next_due, self._next_discovery) - clock)
+
+    def _open_matches(self, now):
+        # Unfinished matches that started within the live window or start
+        # within the next day; the start_time index keeps this a range search.
+        placeholders = ", ".join("?" for _ in FINAL_STATUSES)
+        rows = self.db.read_only().execute(
+            f"SELECT id, start_time FROM matches WHERE start_time >= ? AND start_time < ? "
+            f"AND COALESCE(status_type, '') NOT IN ({placeholders})",
+            ((now - timedelta(seconds=self.live_window)).isoformat(),
+             (now + timedelta(days=1)).isoformat(), *FINAL_STATUSES)
+        ).fetchall()
+        return {match_id: parse_time(start) for match_id, start in rows}
+
+    async def _loop(self, source, poll):
+        while not self._stopped.is_set():
+            try:
+                delay = await poll()
+                self.failures[source] = 0
+                METRICS.inc("scheduler_polls_total", source=source, result="ok")
+            except Exception as exc:
+                failures = self.failures[source] = self.failures.get(source, 0) + 1
+                delay = min(self.max_backoff, self.intervals["min_interval"] * 2 ** (failures - 1))
+                METRICS.inc("scheduler_polls_total", source=source, result="error")
+                print(f"{source} poll failed ({exc}); retrying in {delay:.0f}s")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, duration=None):
+        self._stopped = asyncio.Event()
+        loops = asyncio.gather(self._loop("odds", self.poll_odds), self._loop("matches", self.poll_matches))
+        if duration is not None:
+            asyncio.get_running_loop().call_later(duration, self._stopped.set)
+        await loops
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+
+if __name__ == "__main__":
+    duration = os.getenv("SCHEDULER_DURATION")
+    try:
+        asyncio.run(PollingScheduler().run(float(duration) if duration else None))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,192 @@
+import codecs
+import hashlib
+import json
+import pickle
+
+# -------------------------------------------------------------------
+# Declarative mapping from sportdevs JSON to table columns.
+#
+# Each entry is (column, JSON path, SQL type). A dotted path reaches into a
+# nested object ("round.name" is match["round"]["name"]); a path of None
+# marks a column the normalizer computes. The insert column list and the
+# row flattening are both generated from this one list. The table itself is
+# created by database.py's migrations, so a new column here also needs a new
+# migration (tests/test_migrations.py checks that the two agree).
+# -------------------------------------------------------------------
+
+MATCH_SCHEMA = (
+    ("id", "id", "INTEGER PRIMARY KEY"),
+    ("name", "name", "TEXT"),
+    ("first_to_serve", "first_to_serve", "INTEGER"),
+    ("ground_type", "ground_type", "TEXT"),
+    ("tournament_id", "tournament_id", "INTEGER"),
+    ("tournament_name", "tournament_name", "TEXT"),
+    ("tournament_importance", "tournament_importance", "INTEGER"),
+    ("season_id", "season_id", "INTEGER"),
+    ("season_name", "season_name", "TEXT"),
+    ("round_id", "round_id", "INTEGER"),
+    ("round_name", "round.name", "TEXT"),
+    ("round_round", "round.round", "INTEGER"),
+    ("round_end_time", "round.end_time", "TEXT"),
+    ("round_start_time", "round.start_time", "TEXT"),
+    ("status_type", "status_type", "TEXT"),
+    ("status_reason", "status.reason", "TEXT"),
+    ("arena_id", "arena_id", "INTEGER"),
+    ("arena_name", "arena_name", "TEXT"),
+    ("arena_hash_image", "arena_hash_image", "TEXT"),
+    ("home_team_id", "home_team_id", "INTEGER"),
+    ("home_team_name", "home_team_name", "TEXT"),
+    ("home_team_hash_image", "home_team_hash_image", "TEXT"),
+    ("away_team_id", "away_team_id", "INTEGER"),
+    ("away_team_name", "away_team_name", "TEXT"),
+    ("away_team_hash_image", "away_team_hash_image", "TEXT"),
+    ("home_team_score_current", "home_team_score.current", "INTEGER"),
+    ("home_team_score_display", "home_team_score.display", "INTEGER"),
+    ("home_team_score_period_1", "home_team_score.period_1", "INTEGER"),
+    ("home_team_score_period_2", "home_team_score.period_2", "INTEGER"),
+    ("home_team_score_default_time", "home_team_score.default_time", "INTEGER"),
+    ("away_team_score_current", "away_team_score.current", "INTEGER"),
+    ("away_team_score_display", "away_team_score.display", "INTEGER"),
+    ("away_team_score_period_1", "away_team_score.period_1", "INTEGER"),
+    ("away_team_score_period_2", "away_team_score.period_2", "INTEGER"),
+    ("away_team_score_default_time", "away_team_score.default_time", "INTEGER"),
+    ("times_period_1", "times.period_1", "INTEGER"),
+    ("times_period_2", "times.period_2", "INTEGER"),
+    ("times_specific_start_time", "times.specific_start_time", "TEXT"),
+    ("specific_start_time", "specific_start_time", "TEXT"),
+    ("start_time", "start_time", "TEXT"),
+    ("duration", "duration", "INTEGER"),
+    ("class_id", "class_id", "INTEGER"),
+    ("class_name", "class_name", "TEXT"),
+    ("class_hash_image", "class_hash_image", "TEXT"),
+    ("league_id", "league_id", "INTEGER"),
+    ("league_name", "league_name", "TEXT"),
+    ("league_hash_image", "league_hash_image", "TEXT"),
+    # blake2b of the other columns (pickled); lets the upsert skip rows that did not change.
+    ("content_hash", None, "TEXT"),
+)
+
+
+def column_names(schema):
+    return tuple(column for column, _, _ in schema)
+
+
+class Normalizer:
+    """
+    Flattens JSON records into row tuples following a schema.
+
+    The schema is compiled once into a single generated function that reads
+    every nested object a record has exactly once and builds the row tuple
+    in one expression, so flattening costs one Python call per record
+    instead of one .get() round trip per column. When the schema has a
+    content_hash column, the hash of the other values is appended.
+
+    rows() is lazy and can be handed straight to BulkWriter.write();
+    columns() returns a page as columnar tuples.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns_out = column_names(schema)
+        self._row = self._compile(schema)
+
+    @staticmethod
+    def _compile(schema):
+        getters = {"": "_g"}  # dotted prefix -> local bound to that object's .get
+        lines = ["    _g = record.get"]
+        values = []
+        for column, path, _ in schema:
+            if path is None:
+                if column != "content_hash":
+                    raise ValueError(f"Computed column {column!r} is not supported")
+                continue
+            *prefix, leaf = path.split(".")
+            getter = "_g"
+            for depth in range(len(prefix)):
+                key = ".".join(prefix[:depth + 1])
+                if key not in getters:
+                    getters[key] = f"_g{len(getters)}"
+                    lines.append(f"    {getters[key]} = ({getter}({prefix[depth]!r}) or _empty).get")
+                getter = getters[key]
+            values.append(f"{getter}({leaf!r})")
+
+        lines.append(f"    row = ({', '.join(values)},)")
+        if any(column == "content_hash" for column, _, _ in schema):
+            lines.append("    return row + (_blake2b(_dumps(row, 4), digest_size=16).hexdigest(),)")
+        else:
+            lines.append("    return row")
+        source = "def _row(record, _empty={}, _blake2b=hashlib.blake2b, _dumps=pickle.dumps):\n" + "\n".join(lines)
+        namespace = {"hashlib": hashlib, "pickle": pickle}
+        exec(source, namespace)
+        return namespace["_row"]
+
+    def row(self, record):
+        return self._row(record)
+
+    def rows(self, records):
+        """Row tuples for `records` (any iterable, including a stream)."""
+        return map(self._row, records)
+
+    def columns(self, records):
+        """A page as {column: tuple of values}."""
+        flat = list(map(self._row, records))
+        if not flat:
+            return {column: () for column in self.columns_out}
+        return dict(zip(self.columns_out, zip(*flat)))
+
+
+MATCH_NORMALIZER = Normalizer(MATCH_SCHEMA)
+
+
+def iter_json_array(chunks, encoding="utf-8"):
+    """
+    Yield the elements of a top-level JSON array from an iterable of byte
+    (or str) chunks, e.g. response.iter_content(). Only the unparsed tail of
+    the stream is buffered, so memory stays bounded by the chunk size plus
+    the largest single element rather than the whole response.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    started = False
+    finished = False
+
+    def pieces():
+        for chunk in chunks:
+            yield text.decode(chunk) if isinstance(chunk, bytes) else chunk
+        yield None  # end of stream
+
+    for piece in pieces():
+        at_end = piece is None
+        if not at_end:
+            buffer += piece
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if at_end:
+                    raise
+                break  # element continues in the next chunk
+            if end == len(buffer) and not at_end:
+                break  # a scalar may continue in the next chunk; decode it again then
+            yield element
+            pos = end
+        buffer = buffer[pos:]
+        if finished:
+            return
+    if not started or not finished:
+        raise ValueError("Truncated JSON array")
@@ -1,38 +1,128 @@
-import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
 from nba_api.stats.endpoints import leaguedashplayerstats
+from bulk_writer import BulkWriter
+from database import Database
+from http_client import RateLimiter
+
+# One row per (season, player); each season is a partition of this table that
+# is upserted on every fetch, so history accumulates instead of being replaced.
+NBA_TABLE = "nba_player_stats"
+NBA_KEY = ("season", "PLAYER_ID")
+
+_SQL_TYPES = {"i": "INTEGER", "u": "INTEGER", "b": "INTEGER", "f": "REAL"}
+
+
+def season_label(start_year):
+    """2023 -> "2023-24", the season format stats.nba.com expects."""
+    return f"{start_year}-{(start_year + 1) % 100:02d}"
+
 
 # Fetch NBA player stats
 def fetch_nba_data(season="2023-24"):
-    print("Fetching NBA player statistics...")
+    print(f"Fetching NBA player statistics for {season}...")
     stats = leaguedashplayerstats.LeagueDashPlayerStats(season=season)
     df = stats.get_data_frames()[0]  # Convert API response to DataFrame
     return df
 
-# Store data in SQLite
-def store_data_in_sqlite(df, db_name="nba_stats.db"):
-    print("Storing data in SQLite database...")
-    conn = sqlite3.connect(db_name)
-    df.to_sql("player_stats", conn, if_exists="replace", index=False)
-    conn.close()
+
+def fetch_seasons(seasons, max_workers=4, rate_limit=1.0, max_retries=3, backoff=2.0):
+    """
+    Fetch several seasons concurrently and yield (season, DataFrame) as each
+    one arrives. stats.nba.com throttles aggressively, so requests share a
+    token bucket of `rate_limit` calls/second and failed calls are retried
+    with exponential backoff.
+    """
+    limiter = RateLimiter(rate_limit)
+
+    def fetch(season):
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                return season, fetch_nba_data(season)
+            except Exception as exc:
+                if attempt >= max_retries:
+                    raise
+                print(f"Fetching {season} failed ({exc}); retrying...")
+                time.sleep(backoff * (2 ** attempt))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for future in as_completed([pool.submit(fetch, season) for season in seasons]):
+            yield future.result()
+
+
+def _ensure_table(conn, df):
+    # The stats columns come from the API, so the table follows the frame:
+    # created on first use, widened when the API adds a column.
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({NBA_TABLE})")}
+    columns = [c for c in df.columns if c != "season"]
+    if not existing:
+        definitions = ", ".join(f'"{c}" {_SQL_TYPES.get(df[c].dtype.kind, "TEXT")}' for c in columns)
+        conn.execute(f'CREATE TABLE {NBA_TABLE} (season TEXT, {definitions}, '
+                     f'PRIMARY KEY ({", ".join(NBA_KEY)}))')
+        return
+    for c in columns:
+        if c not in existing:
+            conn.execute(f'ALTER TABLE {NBA_TABLE} ADD COLUMN "{c}" {_SQL_TYPES.get(df[c].dtype.kind, "TEXT")}')
+
+
+# Store one season in SQLite (the shared database; the table is nba_player_stats
+# so it does not collide with the tennis player_stats table)
+def store_data_in_sqlite(df, season="2023-24", db=None, batch_size=1000):
+    """Upsert a season's rows, keyed by (season, PLAYER_ID), in batches."""
+    print(f"Storing {len(df)} player rows for {season} in SQLite database...")
+    db = db if db is not None else Database()
+    df = df.assign(season=season)
+    columns = ["season"] + [c for c in df.columns if c != "season"]
+    with BulkWriter(db, batch_size=batch_size, label=f"nba {season}") as writer:
+        _ensure_table(writer.conn, df)
+        quoted = ", ".join(f'"{c}"' for c in columns)
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c not in NBA_KEY)
+        query = (f"INSERT INTO {NBA_TABLE} ({quoted}) VALUES ({', '.join('?' for _ in columns)}) "
+                 f"ON CONFLICT ({', '.join(NBA_KEY)}) DO UPDATE SET {updates}")
+        rows = df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False, name=None)
+        writer.write(query, rows)
     print("Data successfully stored.")
 
+
+def ingest_seasons(first_year, last_year, db=None, max_workers=4, rate_limit=1.0, batch_size=1000):
+    """
+    Fetch every season from first_year to last_year (start years, inclusive)
+    concurrently and upsert each one as soon as it arrives.
+    """
+    db = db if db is not None else Database()
+    seasons = [season_label(year) for year in range(first_year, last_year + 1)]
+    for season, df in fetch_seasons(seasons, max_workers=max_workers, rate_limit=rate_limit):
+        store_data_in_sqlite(df, season=season, db=db, batch_size=batch_size)
+    return seasons
+
+
+def iter_player_stats(db=None, seasons=None, chunk_size=5000):
+    """
+    Stream nba_player_stats as DataFrames of at most `chunk_size` rows,
+    optionally restricted to some seasons, instead of loading it whole.
+    """
+    db = db if db is not None else Database()
+    query = f"SELECT * FROM {NBA_TABLE}"
+    params = ()
+    if seasons:
+        query += f" WHERE season IN ({', '.join('?' for _ in seasons)})"
+        params = tuple(seasons)
+    query += " ORDER BY season, PLAYER_ID"
+    yield from pd.read_sql(query, db.read_only(), params=params, chunksize=chunk_size)
+
+
 # Read the first 100 players from SQLite
-def read_first_100_players(db_name="nba_stats.db"):
+def read_first_100_players(db=None):
     print("Reading first 100 players from SQLite database...")
-    conn = sqlite3.connect(db_name)
-    query = "SELECT * FROM player_stats LIMIT 200"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    return next(iter_player_stats(db, chunk_size=100), pd.DataFrame())
 
 # Main function
 if __name__ == "__main__":
-    # Step 1: Fetch data
-    player_stats_df = fetch_nba_data()
-
-    # Step 2: Store data in SQLite
-    store_data_in_sqlite(player_stats_df)
+    # Step 1 and 2: Fetch the seasons and store each one in SQLite as it arrives
+    ingest_seasons(2019, 2023)
 
     # Step 3: Read first 100 players from SQLite and display
     df = read_first_100_players()
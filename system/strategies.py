@@ -2,9 +2,13 @@
 import numpy as np
 import pandas as pd
 from xgboost import XGBClassifier
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 from sklearn.calibration import CalibratedClassifierCV
+from model_registry import ModelRegistry, fingerprint
+from tuning import Tuner
+from walk_forward import WalkForward
+from metrics import timed
 
 # --- Monkey Patch Start ---
 # Define a simple __sklearn_tags__ function that ignores any parent calls.
@@ -21,14 +25,28 @@ def custom_sklearn_tags(estimator):
 XGBClassifier.__sklearn_tags__ = custom_sklearn_tags
 # --- Monkey Patch End ---
 
+# Hyperparameter grid searched when the model has to be (re)trained.
+PARAM_GRID = {
+    'n_estimators': [50, 100],
+    'max_depth': [3, 5, 10],
+    'learning_rate': [0.01, 0.1, 0.2],
+    'subsample': [0.8, 1.0]
+}
+
 class XGBoostStrategy:
-    def __init__(self, risk_target, capital):
+    MODEL_NAME = "xgboost_strategy"
+
+    def __init__(self, risk_target, capital, registry=None, search="grid", n_jobs=None):
         self.risk_target = risk_target  # Fraction of capital to risk per trade
         self.capital = capital          # Total available capital
+        self.search = search            # "grid" or "halving" (successive halving)
+        self.n_jobs = n_jobs            # Tuning worker processes; None uses every core
+        self.registry = registry if registry is not None else ModelRegistry()
         self.model = None
+        self.model_version = None
         self._prepare_model()
 
-    def _prepare_model(self):
+    def _training_data(self):
         # For demonstration, we create synthetic yet structured data.
         np.random.seed(42)
         data_size = 1000
@@ -44,31 +62,52 @@ class XGBoostStrategy:
         })
         # Define target variable: a trade is profitable if odds_diff > 0.2 and player_form > 0.
         df['profitable'] = ((df['odds_diff'] > 0.2) & (df['player_form'] > 0)).astype(int)
+        return df[['odds_diff', 'player_form', 'head_to_head']], df['profitable']
+
+    def _model_config(self):
+        # Everything that affects the fitted model besides the data itself.
+        return {
+            'param_grid': PARAM_GRID,
+            'grid_cv': 5,
+            'search': self.search,
+            'calibration_cv': 5,
+            'test_size': 0.2,
+            'random_state': 42,
+        }
+
+    @timed("train")
+    def _prepare_model(self):
+        X, y = self._training_data()
+        config = self._model_config()
+
+        # Reuse the fitted model when neither the data nor the config changed.
+        key = fingerprint(X, y, config)
+        model, metadata = self.registry.load(self.MODEL_NAME, key)
+        if model is not None:
+            self.model = model
+            self.model_version = metadata
+            print(f"XGBoostStrategy model loaded from registry (version {key[:12]}, "
+                  f"test accuracy {metadata.get('test_accuracy', float('nan')):.2f}).")
+            return
 
         # Split the data into training and testing sets.
-        X = df[['odds_diff', 'player_form', 'head_to_head']]
-        y = df['profitable']
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=config['test_size'], random_state=config['random_state'])
 
-        # Initialize an XGBoost classifier.
+        # Tune an XGBoost classifier in parallel; scores are cached in tuning.db,
+        # so re-running (or extending the grid) only fits what is new.
         # (Setting use_label_encoder=False and specifying eval_metric avoids warnings.)
-        xgb_model = XGBClassifier(use_label_encoder=False, eval_metric='logloss', random_state=42)
-        
-        # Define a parameter grid for hyperparameter tuning.
-        param_grid = {
-            'n_estimators': [50, 100],
-            'max_depth': [3, 5, 10],
-            'learning_rate': [0.01, 0.1, 0.2],
-            'subsample': [0.8, 1.0]
-        }
-        
-        # Use grid search with cross-validation to find the best model parameters.
-        grid_search = GridSearchCV(xgb_model, param_grid, cv=5, scoring='accuracy')
-        grid_search.fit(X_train, y_train)
-        best_xgb = grid_search.best_estimator_
+        base_params = {'use_label_encoder': False, 'eval_metric': 'logloss', 'random_state': 42}
+        tuner = Tuner(base_params=base_params, cv=config['grid_cv'], n_jobs=self.n_jobs)
+        if config['search'] == 'halving':
+            best_params, best_score, _ = tuner.halving_search(X_train, y_train, config['param_grid'])
+        else:
+            best_params, best_score, _ = tuner.grid_search(X_train, y_train, config['param_grid'])
+        print(f"Best parameters {best_params} (CV accuracy {best_score:.3f})")
+        best_xgb = XGBClassifier(**base_params, **best_params)
         
         # Optionally, calibrate the model so the predicted probabilities are more reliable.
-        self.model = CalibratedClassifierCV(best_xgb, cv=5)
+        self.model = CalibratedClassifierCV(best_xgb, cv=config['calibration_cv'])
         self.model.fit(X_train, y_train)
         
         # Evaluate the model on the test set.
@@ -76,6 +115,54 @@ class XGBoostStrategy:
         accuracy = accuracy_score(y_test, preds)
         print(f"XGBoostStrategy model trained with XGBoost. Test Accuracy: {accuracy:.2f}")
 
+        self.model_version = self.registry.save(self.MODEL_NAME, key, self.model, {
+            'test_accuracy': float(accuracy),
+            'best_params': best_params,
+            'training_rows': int(len(X)),
+        })
+
+    @timed("walk_forward")
+    def walk_forward(self, X=None, y=None, **options):
+        """
+        Walk-forward evaluation (see walk_forward.WalkForward) using the tuned
+        hyperparameters. X/y must be in chronological order; by default the
+        training data is used in its stored row order.
+        """
+        if X is None:
+            X, y = self._training_data()
+        best = (self.model_version or {}).get('best_params', {})
+        params = {
+            'max_depth': best.get('max_depth', 6),
+            'eta': best.get('learning_rate', 0.3),
+            'subsample': best.get('subsample', 1.0),
+            'seed': 42,
+        }
+        options.setdefault('initial_rounds', best.get('n_estimators', 100))
+        result = WalkForward(params=params, **options).run(X, y)
+        print(f"Walk-forward over {result['summary']['windows']} windows: "
+              f"out-of-sample accuracy {result['summary']['accuracy']:.2f}")
+        return result
+
+    def signals(self, snapshot, threshold=0.6):
+        """
+        Backtest hook: decide which side to back for every event in a closing
+        snapshot (see backtest.BacktestEngine). Until real player features
+        exist, odds_diff is the market's normalized implied-probability edge
+        for player 1 and the other features are neutral.
+        """
+        implied1 = 1.0 / snapshot["price1"]
+        implied2 = 1.0 / snapshot["price2"]
+        features = pd.DataFrame({
+            'odds_diff': implied1 / (implied1 + implied2) - 0.5,
+            'player_form': np.zeros(len(implied1)),
+            'head_to_head': np.zeros(len(implied1))
+        })
+        if features.empty:
+            return np.zeros(0, dtype=np.int8), np.zeros(0)
+        prob = self.model.predict_proba(features)[:, 1]
+        side = np.where(prob > threshold, 1, 0).astype(np.int8)
+        return side, prob
+
     def simulate(self):
         # For simulation, generate synthetic data that mimics realistic match scenarios.
         np.random.seed(101)
@@ -109,8 +196,9 @@ class XGBoostStrategy:
         }
         return result
 
-# Initialize the strategy with a risk target (e.g., 5% of capital per trade) and total capital.
-strategy = XGBoostStrategy(risk_target=0.05, capital=1000)
-simulation_result = strategy.simulate()
-print("Simulation Result:")
-print(simulation_result)
+if __name__ == "__main__":
+    # Initialize the strategy with a risk target (e.g., 5% of capital per trade) and total capital.
+    strategy = XGBoostStrategy(risk_target=0.05, capital=1000)
+    simulation_result = strategy.simulate()
+    print("Simulation Result:")
+    print(simulation_result)
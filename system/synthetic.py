@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------------------
+# Deterministic synthetic data shaped like the sportdevs, the-odds-api and
+# stats.nba.com payloads, for benchmarks and offline runs. The same seed
+# and sizes always produce the same data.
+# -------------------------------------------------------------------
+
+GROUND_TYPES = ("Clay", "Hardcourt outdoor", "Hardcourt indoor", "Grass")
+BOOKMAKERS = ("Pinnacle", "Bet365", "William Hill", "Unibet", "Betfair", "DraftKings", "FanDuel", "Betway")
+EPOCH = datetime(2015, 1, 5, tzinfo=timezone.utc)
+
+
+def _iso(moment):
+    return moment.isoformat(timespec="seconds")
+
+
+def player_names(n_players):
+    return [f"Player {i:05d}" for i in range(n_players)]
+
+
+def match_payloads(n_matches, n_players=2000, upcoming=0.02, seed=0):
+    """
+    `n_matches` sportdevs /matches records in start-time order, about every
+    90 minutes from 2015. The last `upcoming` fraction has not started yet.
+    Winners follow a hidden per-player strength so ratings have signal.
+    """
+    rng = np.random.default_rng(seed)
+    names = player_names(n_players)
+    strength = rng.normal(0.0, 1.0, n_players)
+    home = rng.integers(0, n_players, n_matches)
+    away = (home + rng.integers(1, n_players, n_matches)) % n_players
+    home_wins = rng.random(n_matches) < 1.0 / (1.0 + np.exp(strength[away] - strength[home]))
+    third_set = rng.random(n_matches) < 0.35
+    grounds = rng.integers(0, len(GROUND_TYPES), n_matches)
+    tournaments = rng.integers(1, 400, n_matches)
+    first_upcoming = int(n_matches * (1.0 - upcoming))
+
+    matches = []
+    for i in range(n_matches):
+        start = EPOCH + timedelta(minutes=90 * i)
+        h, a = int(home[i]), int(away[i])
+        finished = i < first_upcoming
+        loser_sets = 1 if third_set[i] else 0
+        home_sets, away_sets = (2, loser_sets) if home_wins[i] else (loser_sets, 2)
+        tournament = int(tournaments[i])
+        matches.append({
+            "id": 1_000_000 + i,
+            "name": f"{names[h]} - {names[a]}",
+            "first_to_serve": int(rng.integers(1, 3)),
+            "ground_type": GROUND_TYPES[grounds[i]],
+            "tournament_id": tournament,
+            "tournament_name": f"Tournament {tournament}",
+            "tournament_importance": tournament % 5,
+            "season_id": start.year,
+            "season_name": f"Season {start.year}",
+            "round_id": i % 7,
+            "round": {"name": f"Round {i % 7}", "round": i % 7,
+                      "start_time": _iso(start - timedelta(days=1)), "end_time": _iso(start + timedelta(days=1))},
+            "status_type": "finished" if finished else "upcoming",
+            "status": {"reason": "ended" if finished else None},
+            "arena_id": tournament,
+            "arena_name": f"Arena {tournament}",
+            "arena_hash_image": None,
+            "home_team_id": h,
+            "home_team_name": names[h],
+            "home_team_hash_image": None,
+            "away_team_id": a,
+            "away_team_name": names[a],
+            "away_team_hash_image": None,
+            "home_team_score": {"current": home_sets, "display": home_sets, "period_1": 6, "period_2": 4,
+                                "default_time": home_sets} if finished else None,
+            "away_team_score": {"current": away_sets, "display": away_sets, "period_1": 3, "period_2": 6,
+                                "default_time": away_sets} if finished else None,
+            "times": {"period_1": 2400, "period_2": 2700, "specific_start_time": _iso(start)},
+            "specific_start_time": _iso(start),
+            "start_time": _iso(start),
+            "duration": 5400 if finished else None,
+            "class_id": 1,
+            "class_name": "ATP",
+            "class_hash_image": None,
+            "league_id": tournament,
+            "league_name": f"League {tournament}",
+            "league_hash_image": None,
+        })
+    return matches
+
+
+def odds_payloads(matches, n_bookmakers=6, margin=0.05, seed=0):
+    """
+    the-odds-api /odds events for `matches` (as from match_payloads), each
+    with an h2h market per bookmaker priced around a noisy fair probability.
+    """
+    rng = np.random.default_rng(seed)
+    books = BOOKMAKERS[:n_bookmakers]
+    events = []
+    for match in matches:
+        home, away = match["home_team_name"], match["away_team_name"]
+        fair = float(np.clip(rng.normal(0.5, 0.15), 0.05, 0.95))
+        bookmakers = []
+        for book in books:
+            p = float(np.clip(fair + rng.normal(0.0, 0.02), 0.02, 0.98))
+            bookmakers.append({
+                "key": book.lower().replace(" ", "_"),
+                "title": book,
+                "last_update": match["start_time"],
+                "markets": [{"key": "h2h", "outcomes": [
+                    {"name": home, "price": round(1.0 / (p * (1.0 + margin)), 2)},
+                    {"name": away, "price": round(1.0 / ((1.0 - p) * (1.0 + margin)), 2)},
+                ]}],
+            })
+        events.append({
+            "id": f"evt{match['id']}",
+            "sport_key": "tennis_atp",
+            "sport_title": "ATP",
+            "commence_time": match["start_time"],
+            "home_team": home,
+            "away_team": away,
+            "teams": [home, away],
+            "bookmakers": bookmakers,
+        })
+    return events
+
+
+def players_by_team_payload(team_id, n_players=1):
+    """A sportdevs /players-by-team response; in tennis a "team" is one player."""
+    return [{
+        "team_id": team_id,
+        "team_name": f"Player {team_id:05d}",
+        "players": [{"id": team_id * 10 + i, "name": f"Player {team_id:05d}", "country_name": "Nowhere",
+                     "player_height": 185, "date_of_birth": "1998-08-31T00:00:00+00:00"}
+                    for i in range(n_players)],
+    }]
+
+
+NBA_STAT_COLUMNS = ("GP", "W", "L", "MIN", "FGM", "FGA", "FG3M", "FG3A", "FTM", "FTA",
+                    "OREB", "DREB", "REB", "AST", "TOV", "STL", "BLK", "PF", "PTS", "PLUS_MINUS")
+
+
+def nba_frame(n_players=550, seed=0):
+    """A frame with the shape of LeagueDashPlayerStats for one season."""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "PLAYER_ID": np.arange(200000, 200000 + n_players),
+        "PLAYER_NAME": [f"NBA Player {i}" for i in range(n_players)],
+        "NICKNAME": [f"P{i}" for i in range(n_players)],
+        "TEAM_ID": rng.integers(1610612737, 1610612767, n_players),
+        "TEAM_ABBREVIATION": rng.choice(["BOS", "LAL", "GSW", "MIA", "NYK", "DEN"], n_players),
+        "AGE": rng.integers(19, 40, n_players).astype(float),
+    })
+    for column in NBA_STAT_COLUMNS:
+        frame[column] = rng.integers(0, 2000, n_players) if column != "MIN" else rng.random(n_players) * 3000
+    frame["W_PCT"] = frame["W"] / np.maximum(frame["GP"], 1)
+    frame["FG_PCT"] = frame["FGM"] / np.maximum(frame["FGA"], 1)
+    return frame
+
+
+def feature_frame(n_rows, seed=0):
+    """Model features in the layout XGBoostStrategy trains on, with a learnable target."""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "odds_diff": rng.normal(0.1, 0.5, n_rows),
+        "player_form": rng.normal(0.0, 0.5, n_rows),
+        "head_to_head": rng.normal(0.0, 0.3, n_rows),
+    })
+    y = ((X["odds_diff"] > 0.2) & (X["player_form"] > 0)).astype(int)
+    return X, y
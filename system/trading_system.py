@@ -1,3 +1,13 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import BacktestEngine, MarketHistory
+from metrics import timed
+from portfolio import KellyOptimizer
+
 class TradingSystem:
     def __init__(self, strategies):
         """
@@ -5,10 +15,145 @@ class TradingSystem:
         """
         self.strategies = strategies
 
-    def backtest(self):
+    @timed("backtest")
+    def backtest(self, history=None, capital=None, **engine_options):
+        """
+        Backtest every strategy.
+
+        :param history: backtest.MarketHistory to replay. Without it each
+            strategy runs its own simulate() as before.
+        :param capital: Total bankroll; each strategy is given its proportion.
+        :param engine_options: Passed through to backtest.BacktestEngine.
+        """
         results = []
         for proportion, strategy in self.strategies:
             print(f"Backtesting strategy with proportion: {proportion}")
-            result = strategy.simulate()  # each strategy must implement simulate()
+            if history is None:
+                result = strategy.simulate()  # each strategy must implement simulate()
+            else:
+                bankroll = proportion * (capital if capital is not None else strategy.capital)
+                engine = BacktestEngine(initial_bankroll=bankroll, **engine_options)
+                result = engine.run(history, strategy)
             results.append((proportion, result))
         return results
+
+    @timed("backtest_parallel")
+    def backtest_parallel(self, history, capital, variants=None, max_workers=None):
+        """
+        Backtest every (strategy, variant) pair across a process pool.
+
+        The history is written once as .npy files and every worker opens it
+        memory-mapped, so the arrays are shared through the page cache rather
+        than pickled per task. Strategies are shipped once per worker.
+
+        :param history: backtest.MarketHistory to replay.
+        :param capital: Total bankroll, split across strategies by proportion.
+        :param variants: List of BacktestEngine option dicts (e.g. staking,
+            stake_fraction, signal_options) to sweep; defaults to one run
+            with the engine defaults.
+        :param max_workers: Pool size; defaults to the number of cores.
+        :return: One dict per variant with the per-strategy results and the
+            combined, proportion-weighted portfolio view.
+        """
+        variants = variants or [{}]
+        tasks = [(s, v) for v in range(len(variants)) for s in range(len(self.strategies))]
+        strategies = [strategy for _, strategy in self.strategies]
+        bankrolls = [proportion * capital for proportion, _ in self.strategies]
+        max_workers = max_workers or os.cpu_count() or 1
+
+        with tempfile.TemporaryDirectory(prefix="backtest_history_") as history_dir:
+            history.save(history_dir)
+            print(f"Backtesting {len(tasks)} strategy/variant runs on {max_workers} workers...")
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(history_dir, strategies)) as pool:
+                outputs = list(pool.map(_run_task, [
+                    (s, bankrolls[s], variants[v]) for s, v in tasks
+                ]))
+
+        by_variant = [[] for _ in variants]
+        for (s, v), result in zip(tasks, outputs):
+            by_variant[v].append((self.strategies[s][0], result))
+        return [
+            {"variant": variant, "strategies": results, "portfolio": combine_results(results, capital)}
+            for variant, results in zip(variants, by_variant)
+        ]
+
+    def allocate(self, signals, bankroll, optimizer=None):
+        """
+        Size the open opportunities together instead of one bet at a time.
+
+        :param signals: Signal dicts as emitted by event_bus.SignalSubscriber
+            (strategy, proportion, event_id, side, probability, price).
+        :param bankroll: Current bankroll.
+        :param optimizer: portfolio.KellyOptimizer; defaults to half Kelly
+            with the optimizer's default caps.
+        :return: One dict per staked bet with event_id, side, probability,
+            price and stake (in bankroll units).
+
+        Signals for the same event and side are merged: the probability is
+        the proportion-weighted mean across strategies and the price the
+        best quoted. Only the side with the larger edge of each event is
+        kept, and each event is its own exposure group.
+        """
+        merged = {}
+        for signal in signals:
+            key = (signal["event_id"], signal["side"])
+            weight, weighted, price = merged.get(key, (0.0, 0.0, 0.0))
+            merged[key] = (weight + signal["proportion"], weighted + signal["proportion"] * signal["probability"],
+                           max(price, signal["price"]))
+        best = {}
+        for (event_id, side), (weight, weighted, price) in merged.items():
+            if weight <= 0:
+                continue
+            prob = weighted / weight
+            if event_id not in best or prob * price > best[event_id][1] * best[event_id][2]:
+                best[event_id] = (side, prob, price)
+        if not best:
+            return []
+
+        event_ids = list(best)
+        prob = np.array([best[e][1] for e in event_ids])
+        price = np.array([best[e][2] for e in event_ids])
+        stakes = (optimizer or KellyOptimizer()).solve(prob, price, event_ids) * bankroll
+        return [{"event_id": event_id, "side": best[event_id][0], "probability": float(prob[i]),
+                 "price": float(price[i]), "stake": float(stakes[i])}
+                for i, event_id in enumerate(event_ids) if stakes[i] > 0]
+
+def combine_results(results, capital):
+    """
+    Merge per-strategy backtest results into one portfolio: every bet's P&L
+    in start-time order against the total capital.
+    """
+    pnl = np.concatenate([result["pnl"] for _, result in results]) if results else np.array([])
+    commence = np.concatenate([result["commence"] for _, result in results]) if results else np.array([])
+    order = np.argsort(commence, kind="stable")
+    equity = capital + np.cumsum(pnl[order])
+    curve = np.r_[capital, equity]
+    peaks = np.maximum.accumulate(curve)
+    return {
+        "equity": equity,
+        "commence": commence[order],
+        "summary": {
+            "total_trades": int(len(pnl)),
+            "total_profit": float(pnl.sum()),
+            "final_bankroll": float(curve[-1]),
+            "max_drawdown": float(((peaks - curve) / peaks).max()),
+            "strategy_profits": [float(result["pnl"].sum()) for _, result in results],
+        },
+    }
+
+# -------------------------------------------------------------------
+# Worker process state for backtest_parallel.
+# -------------------------------------------------------------------
+_worker_history = None
+_worker_strategies = None
+
+def _init_worker(history_dir, strategies):
+    global _worker_history, _worker_strategies
+    _worker_history = MarketHistory.open_mmap(history_dir)
+    _worker_strategies = strategies
+
+def _run_task(task):
+    strategy_index, bankroll, options = task
+    engine = BacktestEngine(initial_bankroll=bankroll, **options)
+    return engine.run(_worker_history, _worker_strategies[strategy_index])
@@ -0,0 +1,161 @@
+import json
+import math
+import os
+import sqlite3
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from xgboost import XGBClassifier
+
+from model_registry import fingerprint
+
+TUNING_CREATE_QUERY = '''
+CREATE TABLE IF NOT EXISTS tuning_results (
+    data_key TEXT,
+    params TEXT,
+    resource INTEGER,
+    fold INTEGER,
+    score REAL,
+    fit_seconds REAL,
+    PRIMARY KEY (data_key, params, resource, fold)
+)
+'''
+
+
+class TuningStore:
+    """
+    Persists every (candidate, fold, resource) score so a search can be
+    resumed after an interruption, or extended with new grid points, without
+    recomputing anything already evaluated on the same data.
+    """
+    def __init__(self, db_name="tuning.db"):
+        self.conn = sqlite3.connect(db_name)
+        self.conn.execute(TUNING_CREATE_QUERY)
+        self.conn.commit()
+
+    def scores(self, data_key):
+        rows = self.conn.execute(
+            "SELECT params, resource, fold, score FROM tuning_results WHERE data_key = ?", (data_key,))
+        return {(params, resource, fold): score for params, resource, fold, score in rows}
+
+    def save(self, data_key, results):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tuning_results VALUES (?, ?, ?, ?, ?, ?)",
+            [(data_key, params, resource, fold, score, seconds)
+             for params, resource, fold, score, seconds in results])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def plan_workers(n_jobs=None):
+    """
+    Split the machine between worker processes and XGBoost threads so the
+    two never add up to more than the number of cores.
+    Returns (n_workers, threads_per_fit).
+    """
+    cores = os.cpu_count() or 1
+    n_workers = cores if n_jobs is None or n_jobs < 1 else min(n_jobs, cores)
+    return n_workers, max(1, cores // n_workers)
+
+
+def _fit_and_score(X, y, train_idx, test_idx, params, base_params, n_threads, resource, seed):
+    # `resource` caps the number of training rows; successive halving uses
+    # it to evaluate many candidates cheaply before committing to full fits.
+    # The rows are a random sample (the fold indices are in row order, so a
+    # prefix would be the oldest matches), seeded by (seed, resource) so every
+    # candidate on a fold sees the same rows and stored scores stay valid.
+    started = time.perf_counter()
+    if resource and resource < len(train_idx):
+        rng = np.random.default_rng([seed, resource])
+        train_idx = np.sort(rng.choice(train_idx, size=resource, replace=False))
+    model = XGBClassifier(**base_params, **params, n_jobs=n_threads)
+    model.fit(X[train_idx], y[train_idx])
+    score = accuracy_score(y[test_idx], model.predict(X[test_idx]))
+    return score, time.perf_counter() - started
+
+
+class Tuner:
+    """
+    Cross-validated hyperparameter search for XGBClassifier.
+
+    Candidate/fold fits run across a process pool (joblib's loky backend),
+    with XGBoost's own thread count set so the pool does not oversubscribe
+    the cores. Every score lands in a TuningStore, keyed by a fingerprint of
+    the data and CV setup, and is reused on later runs.
+    """
+    def __init__(self, base_params=None, cv=5, n_jobs=None, store=None, seed=0):
+        self.base_params = base_params or {}
+        self.cv = cv
+        self.seed = seed
+        self.n_workers, self.n_threads = plan_workers(n_jobs)
+        self.store = store if store is not None else TuningStore()
+
+    def grid_search(self, X, y, param_grid):
+        """Exhaustive search. Returns (best_params, best_score, results)."""
+        candidates = list(ParameterGrid(param_grid))
+        X_arr, y_arr, folds, data_key = self._prepare(X, y)
+        means = self._evaluate(X_arr, y_arr, folds, data_key, candidates, resource=0)
+        return self._best(candidates, means)
+
+    def halving_search(self, X, y, param_grid, factor=3, min_resource=None):
+        """
+        Successive halving: evaluate every candidate on a small slice of the
+        training rows, keep the best 1/factor, multiply the slice by factor,
+        and repeat until the survivors are scored on the full training folds.
+        Returns (best_params, best_score, results).
+        """
+        candidates = list(ParameterGrid(param_grid))
+        X_arr, y_arr, folds, data_key = self._prepare(X, y)
+        full = min(len(train) for train, _ in folds)
+        n_rounds = max(1, math.ceil(math.log(len(candidates), factor)))
+        resource = min_resource or max(50, full // factor ** (n_rounds - 1))
+
+        while True:
+            final = resource >= full or len(candidates) <= 1
+            means = self._evaluate(X_arr, y_arr, folds, data_key, candidates,
+                                   resource=0 if final else resource)
+            if final:
+                return self._best(candidates, means)
+            keep = max(1, len(candidates) // factor)
+            ranked = sorted(range(len(candidates)), key=lambda i: means[i], reverse=True)
+            candidates = [candidates[i] for i in ranked[:keep]]
+            resource *= factor
+
+    def _prepare(self, X, y):
+        folds = list(StratifiedKFold(n_splits=self.cv).split(X, y))
+        setup = {"cv": self.cv, "base_params": self.base_params, "scoring": "accuracy", "seed": self.seed}
+        data_key = fingerprint(X, y, setup)
+        return np.asarray(X), np.asarray(y), folds, data_key
+
+    def _evaluate(self, X, y, folds, data_key, candidates, resource):
+        """Mean CV score per candidate, fitting only the (candidate, fold) pairs not stored yet."""
+        keys = [json.dumps(params, sort_keys=True) for params in candidates]
+        known = self.store.scores(data_key)
+        todo = [(key, params, fold) for key, params in zip(keys, candidates)
+                for fold in range(len(folds)) if (key, resource, fold) not in known]
+
+        if todo:
+            print(f"Tuning: fitting {len(todo)} of {len(keys) * len(folds)} candidate/fold pairs "
+                  f"on {self.n_workers} workers x {self.n_threads} threads"
+                  f"{f' (resource {resource} rows)' if resource else ''}...")
+            scored = Parallel(n_jobs=self.n_workers)(
+                delayed(_fit_and_score)(X, y, folds[fold][0], folds[fold][1], params,
+                                        self.base_params, self.n_threads, resource, self.seed)
+                for _, params, fold in todo)
+            results = [(key, resource, fold, score, seconds)
+                       for (key, _, fold), (score, seconds) in zip(todo, scored)]
+            self.store.save(data_key, results)
+            known.update({(key, resource, fold): score for key, resource, fold, score, _ in results})
+
+        return [float(np.mean([known[(key, resource, fold)] for fold in range(len(folds))])) for key in keys]
+
+    @staticmethod
+    def _best(candidates, means):
+        best = int(np.argmax(means))
+        results = sorted(zip(means, candidates), key=lambda r: r[0], reverse=True)
+        return candidates[best], means[best], results
@@ -0,0 +1,114 @@
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import accuracy_score, log_loss
+
+
+class WalkForward:
+    """
+    Walk-forward evaluation of an XGBoost model over time-ordered data.
+
+    The data is cut into consecutive chunks of `step` rows. The first model is
+    fit on the first `initial_size` rows; each later window adds the next
+    chunk and is scored on the chunk after it, so every prediction is made
+    strictly out of sample.
+
+    Instead of refitting from zero per window, the booster is carried
+    forward with XGBoost's continued training (`xgb_model=`): each window
+    only adds `rounds_per_update` trees fit on the newly arrived chunk.
+    With window="rolling", the booster is rebuilt from scratch on the last
+    `initial_size` rows every `refit_every` windows so old data can age out;
+    refit_every is required in that mode. The DMatrix for each chunk is
+    built once and reused, both as the test set of one window and as the
+    training increment of the next, then dropped once the booster has
+    absorbed it.
+    """
+    def __init__(self, params=None, initial_size=500, step=100, initial_rounds=100,
+                 rounds_per_update=10, window="expanding", refit_every=None):
+        if window not in ("expanding", "rolling"):
+            raise ValueError(f"Unknown window {window!r}; expected 'expanding' or 'rolling'")
+        if window == "rolling" and not refit_every:
+            raise ValueError("window='rolling' needs refit_every, or old rows never leave the model")
+        self.params = {"objective": "binary:logistic", "eval_metric": "logloss", **(params or {})}
+        self.initial_size = initial_size
+        self.step = step
+        self.initial_rounds = initial_rounds
+        self.rounds_per_update = rounds_per_update
+        self.window = window
+        self.refit_every = refit_every if window == "rolling" else None
+        self._matrices = {}
+
+    def _matrix(self, X, y, start, stop):
+        # Per-window feature matrices are cached by row range.
+        key = (start, stop)
+        if key not in self._matrices:
+            self._matrices[key] = xgb.DMatrix(X[start:stop], label=y[start:stop])
+        return self._matrices[key]
+
+    def _evict(self, trained_until):
+        # Rows before trained_until are in the booster and are never read
+        # again: refits build their own matrix over the rows they keep.
+        for key in [key for key in self._matrices if key[1] <= trained_until]:
+            del self._matrices[key]
+
+    def run(self, X, y):
+        """
+        :param X: Feature matrix, rows in chronological order.
+        :param y: Binary labels aligned with X.
+        :return: dict with out-of-sample probabilities per row (NaN for rows
+            only ever used for training), per-window metrics and the final booster.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y)
+        n = len(y)
+        if n <= self.initial_size:
+            raise ValueError(f"Walk-forward needs more than initial_size={self.initial_size} rows, got {n}")
+        self._matrices = {}
+        predictions = np.full(n, np.nan)
+        windows = []
+
+        booster = xgb.train(self.params, self._matrix(X, y, 0, self.initial_size),
+                            num_boost_round=self.initial_rounds)
+        trained_until = self.initial_size
+        window_index = 0
+
+        while trained_until < n:
+            test_stop = min(trained_until + self.step, n)
+            dtest = self._matrix(X, y, trained_until, test_stop)
+            prob = booster.predict(dtest)
+            predictions[trained_until:test_stop] = prob
+
+            y_test = y[trained_until:test_stop]
+            windows.append({
+                "train_rows": trained_until,
+                "test_start": trained_until,
+                "test_stop": test_stop,
+                "trees": booster.num_boosted_rounds(),
+                "accuracy": float(accuracy_score(y_test, prob > 0.5)),
+                "logloss": float(log_loss(y_test, prob, labels=[0, 1])),
+            })
+
+            # Fold the chunk we just scored into the model before moving on.
+            window_index += 1
+            if self.refit_every and window_index % self.refit_every == 0:
+                start = max(0, test_stop - self.initial_size)
+                booster = xgb.train(self.params, self._matrix(X, y, start, test_stop),
+                                    num_boost_round=self.initial_rounds)
+            else:
+                booster = xgb.train(self.params, dtest, num_boost_round=self.rounds_per_update,
+                                    xgb_model=booster)
+            trained_until = test_stop
+            self._evict(trained_until)
+
+        scored = ~np.isnan(predictions)
+        return {
+            "predictions": predictions,
+            "windows": windows,
+            "booster": booster,
+            "summary": {
+                "windows": len(windows),
+                "scored_rows": int(scored.sum()),
+                "accuracy": float(accuracy_score(y[scored], predictions[scored] > 0.5)),
+                "logloss": float(log_loss(y[scored], predictions[scored], labels=[0, 1])),
+                "final_trees": booster.num_boosted_rounds(),
+            },
+        }
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The modules in system/ import each other by bare name.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "system"))
+
+from database import Database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "test.db"))
+    database.initialize()
+    yield database
+    database.close()
+
+
+def insert_match(db, match_id, home, away, start, status="finished", home_score=None, away_score=None,
+                 ground_type="clay", **columns):
+    """Insert a bare matches row; only the columns the tests care about are set."""
+    values = dict(id=match_id, home_team_id=home, away_team_id=away, start_time=start, status_type=status,
+                  home_team_score_current=home_score, away_team_score_current=away_score,
+                  ground_type=ground_type, **columns)
+    db.connection().execute(
+        f"INSERT INTO matches ({', '.join(values)}) VALUES ({', '.join('?' for _ in values)})",
+        tuple(values.values()))
+    db.connection().commit()
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+from arbitrage import ArbitrageScanner
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def _event(event_id, books, commence="2024-06-02T12:00:00Z"):
+    return {"id": event_id, "commence_time": commence, "home_team": "A", "away_team": "B",
+            "bookmakers": [{"title": title, "markets": [{"key": "h2h", "outcomes": [
+                {"name": name, "price": price} for name, price in prices.items()]}]}
+                for title, prices in books.items()]}
+
+
+def test_detects_cross_book_arbitrage():
+    scanner = ArbitrageScanner()
+    [opportunity] = scanner.process_payload([_event("e1", {"X": {"A": 2.1, "B": 1.8}, "Y": {"A": 1.7, "B": 2.2}})],
+                                            now=NOW)
+    legs = {leg["outcome"]: (leg["bookmaker"], leg["price"]) for leg in opportunity["legs"]}
+    assert legs == {"A": ("X", 2.1), "B": ("Y", 2.2)}
+    assert abs(sum(leg["stake_fraction"] for leg in opportunity["legs"]) - 1.0) < 1e-12
+
+
+def test_no_opportunity_without_edge():
+    scanner = ArbitrageScanner()
+    assert scanner.process_payload([_event("e1", {"X": {"A": 1.9, "B": 1.9}})], now=NOW) == []
+
+
+def test_bookmaker_missing_from_newer_snapshot_is_dropped():
+    scanner = ArbitrageScanner()
+    scanner.process_payload([_event("e1", {"X": {"A": 2.1, "B": 1.8}, "Y": {"A": 1.7, "B": 2.2}})], now=NOW)
+    assert scanner.process_payload([_event("e1", {"X": {"A": 2.1, "B": 1.8}})], now=NOW) == []
+    assert scanner.best("e1", "h2h", "B") == (1.8, "X")
+
+
+def test_outcome_missing_from_newer_snapshot_is_dropped():
+    scanner = ArbitrageScanner()
+    scanner.process_payload([_event("e1", {"X": {"A": 2.0, "B": 2.0, "Draw": 9.0}})], now=NOW)
+    scanner.process_payload([_event("e1", {"X": {"A": 2.0, "B": 2.0}})], now=NOW)
+    assert scanner.outcomes[("e1", "h2h")] == {"A", "B"}
+    assert scanner.best("e1", "h2h", "Draw") is None
+
+
+def test_unlisted_and_started_events_are_evicted():
+    scanner = ArbitrageScanner()
+    scanner.process_payload([_event("e1", {"X": {"A": 2.0, "B": 2.0}}),
+                             _event("e2", {"X": {"A": 2.0, "B": 2.0}})], now=NOW)
+    scanner.process_payload([_event("e2", {"X": {"A": 2.0, "B": 2.0}}, commence="2024-05-31T12:00:00Z")],
+                            now=NOW)
+    assert scanner.quotes == {} and scanner.heaps == {} and scanner.outcomes == {}
+    assert scanner.markets == {} and scanner.names == {}
+
+
+def test_update_skips_superseded_prices():
+    scanner = ArbitrageScanner()
+    scanner.update("e1", "h2h", "X", "A", 2.5, check=False)
+    scanner.update("e1", "h2h", "Y", "A", 2.2, check=False)
+    scanner.update("e1", "h2h", "X", "A", 2.0, check=False)
+    assert scanner.best("e1", "h2h", "A") == (2.2, "Y")
+    scanner.update("e1", "h2h", "Y", "A", None, check=False)
+    assert scanner.best("e1", "h2h", "A") == (2.0, "X")
@@ -0,0 +1,29 @@
+import pytest
+
+from data_fetcher import TennisFetcher
+
+
+class _Response:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.text = str(payload)
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class _Client:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, params=None):
+        return self.response
+
+
+@pytest.mark.parametrize("response", [_Response(500, "boom"), _Response(200, [])])
+def test_get_matches_raises_instead_of_exiting(db, response):
+    fetcher = TennisFetcher("key", cache=False, db=db)
+    fetcher.client = _Client(response)
+    with pytest.raises(RuntimeError):
+        fetcher.get_matches()
@@ -0,0 +1,23 @@
+from data_pipeline import _odds_records
+
+
+def _event(**names):
+    return {"id": "e1", "sport_key": "tennis_atp", "commence_time": "2024-06-01T12:00:00Z", **names,
+            "bookmakers": [{"title": "Book", "markets": [{"key": "h2h", "outcomes": [
+                {"name": "Novak Djokovic", "price": 2.1}, {"name": "Rafael Nadal", "price": 1.8}]}]}]}
+
+
+def test_home_and_away_team_name_the_event():
+    (row,) = _odds_records([_event(home_team="Rafael Nadal", away_team="Novak Djokovic")], "now")
+    assert row[2] == "Rafael Nadal vs Novak Djokovic"
+
+
+def test_prices_follow_outcome_names_not_position():
+    (row,) = _odds_records([_event(teams=["Rafael Nadal", "Novak Djokovic"])], "now")
+    assert (row[5], row[6]) == (1.8, 2.1)
+
+
+def test_unnamed_events_keep_positional_prices():
+    (row,) = _odds_records([_event()], "now")
+    assert row[2] == "Unknown vs Unknown"
+    assert (row[5], row[6]) == (2.1, 1.8)
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from conftest import insert_match  # noqa: E402
+from datasets import DatasetExporter, load_dataset  # noqa: E402
+from data_fetcher import MATCHES_INSERT_QUERY  # noqa: E402
+from schema import MATCH_NORMALIZER  # noqa: E402
+
+
+def _upsert(db, **fields):
+    match = {"id": 1, "start_time": "2024-06-01T12:00:00+00:00", "status_type": "notstarted",
+             "home_team_name": "A", "away_team_name": "B", "ground_type": "clay", **fields}
+    conn = db.connection()
+    conn.execute(MATCHES_INSERT_QUERY, MATCH_NORMALIZER.row(match))
+    conn.commit()
+
+
+def test_in_place_upsert_rewrites_the_partition(db, tmp_path):
+    _upsert(db)
+    exporter = DatasetExporter(db, root=str(tmp_path / "ds"))
+    assert exporter.export(["matches"]) == {"matches": 1}
+    assert exporter.export(["matches"]) == {"matches": 0}
+    _upsert(db, ground_type="grass")  # same row count, rowid and scores
+    assert exporter.export(["matches"]) == {"matches": 1}
+    table = load_dataset(str(tmp_path / "ds"), "matches", columns=["ground_type"])
+    assert table.column("ground_type").to_pylist() == ["grass"]
+
+
+def test_partitions_by_season(db, tmp_path):
+    insert_match(db, 1, 1, 2, "2023-06-01T12:00:00+00:00")
+    insert_match(db, 2, 1, 2, "2024-06-01T12:00:00+00:00")
+    exporter = DatasetExporter(db, root=str(tmp_path / "ds"))
+    assert exporter.export(["matches"]) == {"matches": 2}
+    insert_match(db, 3, 1, 2, "2024-07-01T12:00:00+00:00")
+    assert exporter.export(["matches"]) == {"matches": 1}
+    assert load_dataset(str(tmp_path / "ds"), "matches", seasons=["2024"]).num_rows == 2
+
+
+def test_odds_bars_survive_retention(db, tmp_path):
+    from data_pipeline import insert_tennis_odds
+    from odds_retention import OddsCompactor
+
+    payload = [{"id": "e1", "sport_key": "tennis", "commence_time": "2024-04-01T12:00:00+00:00",
+                "teams": ["A", "B"], "bookmakers": [{"title": "Book", "markets": [{"key": "h2h", "outcomes": [
+                    {"name": "A", "price": 1.8}, {"name": "B", "price": 2.0}]}]}]}]
+    insert_tennis_odds(payload, db=db, captured_at="2024-04-01T10:00:00+00:00")
+    OddsCompactor(db, retention_days=30, pause=0).compact(datetime(2024, 6, 1, tzinfo=timezone.utc))
+    root = str(tmp_path / "ds")
+    assert DatasetExporter(db, root=root).export(["odds", "odds_bars"]) == {"odds": 0, "odds_bars": 1}
+    assert load_dataset(root, "odds_bars", seasons=["2024"]).num_rows > 0
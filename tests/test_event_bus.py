@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+import pytest
+
+from event_bus import (CoalescingQueue, EventBus, MatchStatusChange, MatchTracker, MatchUpdated, OddsUpdate,
+                       ScoreChange, SignalSubscriber, SqliteSink)
+
+
+def _match(status="notstarted", start="2024-06-01T12:00:00+00:00", home_score=None):
+    return {"id": 1, "status_type": status, "start_time": start, "home_team_name": "A", "away_team_name": "B",
+            "home_team_score": {"current": home_score} if home_score is not None else None,
+            "away_team_score": {"current": 0} if home_score is not None else None}
+
+
+def _quote(bookmaker, price1, price2, event_id="e1"):
+    return OddsUpdate("tennis", event_id, "A vs B", bookmaker, "h2h", price1, price2, "eu",
+                      "2024-06-01T12:00:00+00:00", "2024-06-01T10:00:00+00:00")
+
+
+def test_tracker_emits_every_content_change():
+    tracker = MatchTracker()
+    assert [type(e) for e in tracker.events([_match()])] == [MatchStatusChange]
+    assert list(tracker.events([_match()])) == []
+    moved = list(tracker.events([_match(start="2024-06-02T12:00:00+00:00")]))
+    assert [type(e) for e in moved] == [MatchUpdated]
+    settled = list(tracker.events([_match("finished", "2024-06-02T12:00:00+00:00", home_score=2)]))
+    assert [type(e) for e in settled] == [MatchStatusChange, ScoreChange]
+
+
+def test_coalescing_queue_keeps_newest_per_key_in_order():
+    async def run():
+        queue = CoalescingQueue(maxsize=2)
+        assert queue.offer(_quote("X", 1.5, 2.5))
+        assert queue.offer(_quote("Y", 1.6, 2.4))
+        assert queue.offer(_quote("X", 1.7, 2.3))  # replaces in place, no extra slot
+        assert not queue.offer(_quote("Z", 1.8, 2.2))
+        batch = await queue.get_batch(10)
+        assert [(e.bookmaker, e.price1) for e in batch] == [("X", 1.7), ("Y", 1.6)]
+    asyncio.run(run())
+
+
+def test_sqlite_sink_persists_from_worker_threads(db):
+    async def run():
+        bus = EventBus()
+        sink = SqliteSink(db)
+        bus.subscribe(sink, coalesce=False, threaded=True, required=True, max_batch=3)
+        bus.start()
+        await bus.publish_many([_quote("X", 1.5 + i / 100, 2.5) for i in range(10)])
+        await bus.publish_many(MatchTracker().events([_match()]))
+        await bus.stop()
+        sink.close()
+    asyncio.run(run())
+    conn = db.connection()
+    assert conn.execute("SELECT COUNT(*) FROM odds").fetchone()[0] == 10
+    assert conn.execute("SELECT status_type FROM matches WHERE id = 1").fetchone()[0] == "notstarted"
+
+
+def test_required_subscriber_failure_is_raised():
+    calls = []
+
+    def broken(batch):
+        calls.append(threading.current_thread())
+        raise ValueError("disk full")
+
+    async def run():
+        bus = EventBus()
+        bus.subscribe(broken, required=True)
+        bus.start()
+        await bus.publish(_quote("X", 1.5, 2.5))
+        with pytest.raises(RuntimeError, match="broken"):
+            await bus.drain()
+        with pytest.raises(RuntimeError):
+            await bus.publish(_quote("X", 1.6, 2.5))
+        for task in bus._tasks:
+            task.cancel()
+    asyncio.run(run())
+    assert calls
+
+
+def test_signal_subscriber_forgets_pulled_prices():
+    seen = []
+
+    class Echo:
+        def signals(self, snapshot):
+            seen.append((float(snapshot["price1"][0]), float(snapshot["price2"][0])))
+            return [0] * len(snapshot["event"]), [0.0] * len(snapshot["event"])
+
+    subscriber = SignalSubscriber([(1.0, Echo())])
+    subscriber([_quote("X", 2.2, 1.7), _quote("Y", 2.0, 1.8)])
+    subscriber([_quote("X", None, None)])
+    assert seen == [(2.2, 1.8), (2.0, 1.8)]
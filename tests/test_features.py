@@ -0,0 +1,61 @@
+from bulk_writer import BulkWriter
+from conftest import insert_match
+from data_fetcher import PLAYER_STATS_INSERT_QUERY, TennisFetcher
+from features import PlayerFeatureStore
+
+
+def _players(db, rows):
+    conn = db.connection()
+    conn.executemany("INSERT INTO player_stats (player_id, team_id, player_name) VALUES (?, ?, ?)", rows)
+    conn.commit()
+
+
+def _rates(db):
+    return {player_id: (win_rate, court) for player_id, win_rate, court in db.connection().execute(
+        "SELECT player_id, win_rate, court_win_rate FROM player_stats")}
+
+
+def test_rates_are_written_to_the_player_of_each_team(db):
+    # player_id and team_id deliberately differ and overlap.
+    _players(db, [(10, 1, "A"), (20, 2, "B"), (1, 10, "C")])
+    insert_match(db, 1, 1, 2, "2024-01-01T10:00:00+00:00", home_score=2, away_score=0)
+    assert PlayerFeatureStore(db).update() == 1
+    rates = _rates(db)
+    assert rates[10] == (1.0, 1.0)
+    assert rates[20] == (0.0, 0.0)
+    assert rates[1] == (None, None)
+
+
+def test_player_refresh_keeps_feature_rates(db):
+    _players(db, [(10, 1, "A")])
+    insert_match(db, 1, 1, 2, "2024-01-01T10:00:00+00:00", home_score=2, away_score=1)
+    PlayerFeatureStore(db).update()
+    payload = [{"team_id": 1, "team_name": "A", "players": [{"id": 10, "name": "A renamed"}]}]
+    with BulkWriter(db, label="test") as writer:
+        writer.write(PLAYER_STATS_INSERT_QUERY, TennisFetcher("key", cache=False, db=db)._player_records(payload))
+    name, win_rate = db.connection().execute(
+        "SELECT player_name, win_rate FROM player_stats WHERE player_id = 10").fetchone()
+    assert (name, win_rate) == ("A renamed", 1.0)
+
+
+def test_match_settled_before_its_scores_is_applied_once_they_arrive(db):
+    insert_match(db, 1, 1, 2, "2024-01-01T10:00:00+00:00")
+    store = PlayerFeatureStore(db)
+    assert store.update() == 0
+    conn = db.connection()
+    conn.execute("UPDATE matches SET home_team_score_current = 0, away_team_score_current = 2 WHERE id = 1")
+    conn.commit()
+    assert store.update() == 1
+    assert store.win_rate(2) == 1.0
+    assert store.update() == 0
+
+
+def test_every_match_is_counted_once(db):
+    for i in range(5):
+        insert_match(db, i, 1, 2, f"2024-01-0{i + 1}T10:00:00+00:00", home_score=2, away_score=i % 2 * 3)
+    store = PlayerFeatureStore(db)
+    store.update(batch_size=2)
+    reloaded = PlayerFeatureStore(db)
+    reloaded.load()
+    assert reloaded.players[1][:2] == [5, 3]
+    assert reloaded.head_to_head(1, 2) == (5, 0.6)
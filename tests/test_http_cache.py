@@ -0,0 +1,19 @@
+from requests.structures import CaseInsensitiveDict
+
+from http_cache import ResponseCache
+
+
+class _Response:
+    status_code = 200
+    content = b"{}"
+
+    def __init__(self, headers):
+        self.headers = CaseInsensitiveDict(headers)
+
+
+def test_validators_survive_lowercase_headers(tmp_path):
+    cache = ResponseCache(str(tmp_path / "http_cache.db"))
+    cache.store("k", "https://api.example/odds", _Response({"etag": '"v1"', "last-modified": "Sat, 01 Jun 2024"}))
+    assert cache.conn.execute("SELECT etag, last_modified FROM http_cache").fetchone() == ('"v1"', "Sat, 01 Jun 2024")
+    response, _ = cache.lookup("k")
+    assert cache.validators(response) == {"If-None-Match": '"v1"', "If-Modified-Since": "Sat, 01 Jun 2024"}
@@ -0,0 +1,69 @@
+import sqlite3
+
+from conftest import insert_match
+from database import MATCH_SUMMARY_COLUMNS, MIGRATIONS, Database
+from schema import MATCH_SCHEMA, column_names
+
+
+def _legacy_file(path, version, setup):
+    # A database left by an older release: the first `version` migrations
+    # applied, then whatever `setup` adds.
+    conn = sqlite3.connect(path, isolation_level=None)
+    for migration in MIGRATIONS[:version]:
+        migration(conn)
+    conn.execute(f"PRAGMA user_version={version}")
+    setup(conn)
+    conn.close()
+
+
+def test_fresh_database_reaches_the_latest_version(db):
+    assert db.schema_version() == len(MIGRATIONS)
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"matches", "odds", "odds_latest", "feature_log", "event_matches", "odds_bars"} <= tables
+
+
+def test_frozen_schema_matches_the_current_mappings(db):
+    assert tuple(row[1] for row in db.execute("PRAGMA table_info(matches)")) == column_names(MATCH_SCHEMA)
+    indexed = {row[2] for row in db.execute("PRAGMA index_info(idx_matches_start_time)")}
+    assert set(MATCH_SUMMARY_COLUMNS) <= indexed
+
+
+def test_pre_migration_database_is_upgraded(tmp_path):
+    path = str(tmp_path / "old.db")
+
+    def setup(conn):
+        conn.execute("CREATE TABLE matches (match_id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TABLE odds (odds_id INTEGER PRIMARY KEY AUTOINCREMENT, sport_key TEXT, "
+                     "event_id TEXT, event_name TEXT, bookmaker TEXT, market TEXT, odds_player1 REAL, "
+                     "odds_player2 REAL, region TEXT, timestamp TEXT)")
+        conn.executemany("INSERT INTO odds (event_id, bookmaker, market, odds_player1, odds_player2) "
+                         "VALUES ('e1', 'Book', 'h2h', ?, ?)", [(1.8, 2.0), (1.7, 2.1)])
+
+    _legacy_file(path, 0, setup)
+    db = Database(path)
+    assert db.schema_version() == len(MIGRATIONS)
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "legacy_matches" in tables
+    assert "captured_at" in {row[1] for row in db.execute("PRAGMA table_info(odds)")}
+    assert db.execute("SELECT odds_player1, odds_player2, odds_id FROM odds_latest").fetchall() == [(1.7, 2.1, 2)]
+    db.close()
+
+
+def test_matches_applied_without_scores_are_requeued(tmp_path):
+    path = str(tmp_path / "v6.db")
+
+    def setup(conn):
+        # Migration 3's trigger queued settled matches before their scores arrived.
+        conn.execute("INSERT INTO matches (id, status_type) VALUES (1, 'finished')")
+        conn.execute("INSERT INTO matches (id, status_type, home_team_score_current, away_team_score_current) "
+                     "VALUES (2, 'finished', 2, 0)")
+        conn.execute("UPDATE feature_log SET applied_at = '2024-01-01'")
+
+    _legacy_file(path, 6, setup)
+    db = Database(path)
+    assert db.execute("SELECT match_id, applied_at FROM feature_log ORDER BY match_id").fetchall() == \
+        [(2, "2024-01-01")]
+    db.execute("UPDATE matches SET home_team_score_current = 2, away_team_score_current = 1 WHERE id = 1")
+    insert_match(db, 3, 10, 11, "2024-06-01T12:00:00+00:00", home_score=None, away_score=None)
+    assert db.execute("SELECT match_id FROM feature_log WHERE applied_at IS NULL").fetchall() == [(1,)]
+    db.close()
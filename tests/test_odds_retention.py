@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from data_pipeline import insert_tennis_odds
+from odds_retention import OddsCompactor, rollup_watermark
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def _payload(price1, price2, commence="2024-04-01T12:00:00+00:00"):
+    return [{"id": "e1", "sport_key": "tennis", "commence_time": commence, "teams": ["A", "B"],
+             "bookmakers": [{"title": "Book", "markets": [{"key": "h2h", "outcomes": [
+                 {"name": "A", "price": price1}, {"name": "B", "price": price2}]}]}]}]
+
+
+def _at(minutes):
+    return (datetime(2024, 4, 1, 10, tzinfo=timezone.utc) + timedelta(minutes=minutes)).isoformat(timespec="seconds")
+
+
+@pytest.fixture
+def history(db):
+    # Quotes every 20 minutes before the 12:00 start, one after it.
+    for i, (p1, p2) in enumerate([(1.8, 2.0), (1.7, 2.1), (1.9, 1.9), (1.6, 2.3), (1.5, 2.5), (1.4, 2.9),
+                                  (1.3, 3.2)]):
+        insert_tennis_odds(_payload(p1, p2), db=db, captured_at=_at(20 * i))
+    return db
+
+
+def test_compact_rolls_up_and_expires(history):
+    compactor = OddsCompactor(history, retention_days=30, pause=0)
+    rolled, deleted = compactor.compact(NOW)
+    assert (rolled, deleted) == (7, 7)
+    conn = history.connection()
+    assert conn.execute("SELECT COUNT(*) FROM odds").fetchone()[0] == 0
+    hourly = conn.execute(
+        "SELECT bar_start, in_play, open1, high1, low1, close1, quotes FROM odds_bars "
+        "WHERE granularity = 3600 ORDER BY bar_start, in_play").fetchall()
+    assert hourly == [("2024-04-01T10:00:00+00:00", 0, 1.8, 1.9, 1.7, 1.9, 3),
+                      ("2024-04-01T11:00:00+00:00", 0, 1.6, 1.6, 1.4, 1.4, 3),
+                      ("2024-04-01T12:00:00+00:00", 0, 1.3, 1.3, 1.3, 1.3, 1)]
+    # Running again finds nothing new.
+    assert compactor.compact(NOW) == (0, 0)
+
+
+def test_chunked_rollup_matches_single_pass(history, tmp_path):
+    OddsCompactor(history, chunk_size=2, pause=0).rollup(NOW)
+    chunked = history.connection().execute(
+        "SELECT * FROM odds_bars ORDER BY granularity, bar_start, in_play").fetchall()
+    history.connection().execute("DELETE FROM odds_bars")
+    history.connection().execute("DELETE FROM sync_state")
+    OddsCompactor(history, chunk_size=1000, pause=0).rollup(NOW)
+    single = history.connection().execute(
+        "SELECT * FROM odds_bars ORDER BY granularity, bar_start, in_play").fetchall()
+    assert chunked == single
+
+
+def test_recent_quotes_are_kept(history):
+    insert_tennis_odds(_payload(1.2, 4.0, commence="2024-06-02T12:00:00+00:00"), db=history,
+                       captured_at="2024-05-31T12:00:00+00:00")
+    rolled, _ = OddsCompactor(history, pause=0).compact(NOW)
+    assert rolled == 7
+    assert history.connection().execute("SELECT COUNT(*) FROM odds").fetchone()[0] == 1
+
+
+def test_backdated_insert_is_rejected(history):
+    with pytest.raises(ValueError, match="capture order"):
+        insert_tennis_odds(_payload(2.0, 1.8), db=history, captured_at=_at(-60))
+
+
+def test_rollup_refuses_out_of_order_rows(history):
+    conn = history.connection()
+    # An old quote written after newer ones, below the cutoff.
+    conn.execute("INSERT INTO odds (event_id, bookmaker, market, odds_player1, odds_player2, timestamp, "
+                 "captured_at) VALUES ('e3', 'Book', 'h2h', 1.5, 2.5, '2024-04-05', '2024-03-01T00:00:00+00:00')")
+    conn.commit()
+    with pytest.raises(RuntimeError, match="out of capture order"):
+        OddsCompactor(history, chunk_size=100, pause=0).rollup(NOW)
+    assert rollup_watermark(conn) == 0
+    assert conn.execute("SELECT COUNT(*) FROM odds_bars").fetchone()[0] == 0
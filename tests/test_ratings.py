@@ -0,0 +1,57 @@
+from conftest import insert_match
+from ratings import EloRatings
+
+
+def _day(i):
+    return f"2024-01-{i + 1:02d}T10:00:00+00:00"
+
+
+def _load(db, n, skip=()):
+    for i in range(n):
+        if i not in skip:
+            insert_match(db, i, i % 3, 3 + i % 2, _day(i), home_score=2, away_score=i % 4)
+
+
+def test_incremental_replay_matches_full_replay(db):
+    _load(db, 10, skip=(2,))
+    incremental = EloRatings(checkpoint_every=2)
+    incremental.replay(db)
+    # Match 2 settles after later matches were applied.
+    insert_match(db, 2, 2, 3, _day(2), home_score=0, away_score=2)
+    incremental.replay(db)
+    full = EloRatings(checkpoint_every=2)
+    full.replay(db)
+    assert incremental.table() == full.table()
+    assert incremental.applied == full.applied == 10
+
+
+def test_late_scores_are_rated(db):
+    _load(db, 6)
+    insert_match(db, 99, 1, 4, _day(1), status="finished")
+    ratings = EloRatings(checkpoint_every=2)
+    ratings.replay(db)
+    conn = db.connection()
+    conn.execute("UPDATE matches SET home_team_score_current = 2, away_team_score_current = 0 WHERE id = 99")
+    conn.commit()
+    ratings.replay(db)
+    full = EloRatings()
+    full.replay(db)
+    assert ratings.table() == full.table()
+
+
+def test_replay_without_new_results_changes_nothing(db):
+    _load(db, 8)
+    ratings = EloRatings(checkpoint_every=3)
+    ratings.replay(db)
+    before = ratings.table()
+    assert ratings.replay(db) == 0
+    assert ratings.table() == before
+
+
+def test_ratings_at_matches_a_replay_up_to_that_time(db):
+    _load(db, 12)
+    ratings = EloRatings(checkpoint_every=4)
+    ratings.replay(db)
+    partial = EloRatings()
+    partial.replay(db, until=_day(7))
+    assert ratings.ratings_at(_day(7), db).table() == partial.table()
@@ -0,0 +1,62 @@
+import pytest
+
+from conftest import insert_match
+from resolution import EntityResolver, normalize_name
+
+
+@pytest.fixture
+def resolver(db):
+    players = [(1, "Nadal R."), (2, "Djokovic N."), (3, "De Minaur A."), (4, "Andy Murray"), (5, "Jamie Murray"),
+               (6, "Müller, Jan-Lennard")]
+    db.connection().executemany("INSERT INTO player_stats (player_id, team_id, player_name) VALUES (?, ?, ?)",
+                                [(100 + team_id, team_id, name) for team_id, name in players])
+    db.connection().commit()
+    insert_match(db, 500, 1, 2, "2024-06-01T12:00:00+00:00", status="notstarted")
+    insert_match(db, 501, 2, 3, "2024-06-02T12:00:00+00:00", status="notstarted")
+    return EntityResolver(db)
+
+
+def test_normalize_name():
+    assert normalize_name("Müller, Jan-Lennard") == "jan lennard muller"
+    assert normalize_name("  R. NADAL ") == "r nadal"
+
+
+@pytest.mark.parametrize("name, team_id", [
+    ("Rafael Nadal", 1),     # full name against stored initial
+    ("R. Nadal", 1),
+    ("Nadal", 1),            # surname only
+    ("Alex de Minaur", 3),   # multi-part surname
+    ("de Minaur", 3),
+    ("Jan-Lennard Muller", 6),
+])
+def test_name_variants_resolve(resolver, name, team_id):
+    assert resolver.resolve_name(name)[0] == team_id
+
+
+@pytest.mark.parametrize("name", ["Murray", "Roger Federer", "A"])
+def test_ambiguous_or_unknown_names_do_not_resolve(resolver, name):
+    assert resolver.resolve_name(name) is None
+
+
+def test_resolve_events_and_cache(resolver, db):
+    events = [
+        {"id": "e1", "home_team": "Novak Djokovic", "away_team": "Rafael Nadal",
+         "commence_time": "2024-06-01T13:00:00Z"},
+        {"id": "e2", "teams": ["Alex de Minaur", "Novak Djokovic"], "commence_time": "2024-06-02T11:30:00Z"},
+        {"id": "e3", "teams": ["Rafael Nadal", "Alex de Minaur"], "commence_time": "2024-06-02T12:00:00Z"},
+    ]
+    assert resolver.resolve(events) == {"e1": (500, False), "e2": (501, False)}
+    stored = dict(db.connection().execute("SELECT event_id, match_id FROM event_matches"))
+    assert stored == {"e1": 500, "e2": 501}
+    assert EntityResolver(db).resolve(events[:2]) == {"e1": (500, False), "e2": (501, False)}
+
+
+def test_resolve_stored_skips_mapped_events(resolver, db):
+    from data_pipeline import insert_tennis_odds
+    odds = [{"id": "e1", "sport_key": "tennis", "commence_time": "2024-06-01T12:00:00Z",
+             "home_team": "Rafael Nadal", "away_team": "Novak Djokovic",
+             "bookmakers": [{"title": "Book", "markets": [{"key": "h2h", "outcomes": [
+                 {"name": "Rafael Nadal", "price": 1.8}, {"name": "Novak Djokovic", "price": 2.1}]}]}]}]
+    insert_tennis_odds(odds, db=db)
+    assert resolver.resolve_stored() == 1
+    assert resolver.resolve_stored() == 0
@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from scheduler import QuotaBudget
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("now, expected", [
+    (_utc(2024, 1, 15), _utc(2024, 1, 31)),
+    (_utc(2024, 1, 31, 12), _utc(2024, 2, 29)),  # leap year
+    (_utc(2023, 2, 10), _utc(2023, 2, 28)),
+    (_utc(2024, 4, 30, 1), _utc(2024, 5, 31)),
+    (_utc(2024, 12, 31, 1), _utc(2025, 1, 31)),
+])
+def test_reset_day_is_clamped_to_short_months(now, expected):
+    assert QuotaBudget(quota=None, reset_day=31).next_reset(now) == expected
+
+
+def test_reset_rolls_over_the_year():
+    assert QuotaBudget(quota=None, reset_day=1).next_reset(_utc(2024, 12, 5)) == _utc(2025, 1, 1)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("xgboost")
+
+from tuning import Tuner, TuningStore  # noqa: E402
+
+
+def _data(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 3)), columns=["a", "b", "c"])
+    return X, (X["a"] > 0).astype(int)
+
+
+def test_halving_search_is_reproducible_and_cached(tmp_path):
+    X, y = _data()
+    grid = {"max_depth": [1, 2, 3], "n_estimators": [5]}
+    store = TuningStore(str(tmp_path / "tuning.db"))
+    first = Tuner(cv=3, n_jobs=1, store=store).halving_search(X, y, grid, min_resource=20)
+    stored = store.scores(next(iter(_keys(store))))
+    again = Tuner(cv=3, n_jobs=1, store=TuningStore(str(tmp_path / "fresh.db"))).halving_search(
+        X, y, grid, min_resource=20)
+    assert first[:2] == again[:2]
+    assert any(resource == 20 for _, resource, _ in stored)
+
+
+def test_seed_is_part_of_the_cache_key(tmp_path):
+    X, y = _data()
+    store = TuningStore(str(tmp_path / "tuning.db"))
+    Tuner(cv=3, n_jobs=1, store=store, seed=0).grid_search(X, y, {"max_depth": [1]})
+    Tuner(cv=3, n_jobs=1, store=store, seed=1).grid_search(X, y, {"max_depth": [1]})
+    assert len(set(_keys(store))) == 2
+
+
+def _keys(store):
+    return [row[0] for row in store.conn.execute("SELECT DISTINCT data_key FROM tuning_results")]
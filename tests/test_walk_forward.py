@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("xgboost")
+
+from walk_forward import WalkForward  # noqa: E402
+
+
+def _data(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 3))
+    y = (X[:, 0] + 0.5 * rng.normal(size=n) > 0).astype(int)
+    return X, y
+
+
+def test_every_row_after_the_first_window_is_scored():
+    X, y = _data()
+    result = WalkForward(params={"seed": 1}, initial_size=100, step=50, initial_rounds=5,
+                         rounds_per_update=2).run(X, y)
+    assert result["summary"]["windows"] == 4
+    assert result["summary"]["scored_rows"] == 200
+    assert np.isnan(result["predictions"][:100]).all()
+
+
+def test_cache_only_holds_chunks_still_in_use():
+    X, y = _data()
+    walk = WalkForward(initial_size=100, step=50, initial_rounds=5, rounds_per_update=2,
+                       window="rolling", refit_every=2)
+    walk.run(X, y)
+    assert walk._matrices == {}
+
+
+def test_rolling_window_requires_refit_every():
+    with pytest.raises(ValueError):
+        WalkForward(window="rolling")
+
+
+def test_too_few_rows_is_an_error():
+    X, y = _data(n=100)
+    with pytest.raises(ValueError):
+        WalkForward(initial_size=100).run(X, y)